@@ -0,0 +1,219 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.framenet_store as fn
+import framenet_connotationframes_mapping as map
+import role_counts
+import profiling
+from collections import Counter
+import argparse
+import json
+import random
+
+
+ORDERS = ('shuffled', 'stratified', 'original')
+
+
+def sample_order(examples: list, order: str = 'stratified', seed: int = 0) -> list:
+    """Returns the order in which the exemplars of an LU are processed.
+
+    'shuffled' is a random order. 'stratified' groups the exemplars by the set of annotated Frame Elements and takes
+    them from the groups in turns (each group shuffled), so that all annotated constructions appear early.
+    'original' keeps the FrameNet order.
+
+    :param examples: List. The exemplars of the LU.
+    :param order: String. 'shuffled', 'stratified' or 'original'.
+    :param seed: Integer. Seed of the random order (the same for every LU, so the results are reproducible).
+    :return: List. The indices of the exemplars in processing order.
+    """
+    indices = list(range(len(examples)))
+    if order == 'original':
+        return indices
+    rng = random.Random(seed)
+    if order == 'shuffled':
+        rng.shuffle(indices)
+        return indices
+    if order != 'stratified':
+        raise ValueError("Unknown order '{}'. Use one of {}".format(order, ORDERS))
+
+    groups = {}
+    for index in indices:
+        groups.setdefault(tuple(sorted({fe[2] for fe in examples[index].frameAnnotation.FE[0]})), []).append(index)
+    groups = [groups[key] for key in sorted(groups)]
+    for group in groups:
+        rng.shuffle(group)
+    return [group[turn] for turn in range(max(len(group) for group in groups)) for group in groups
+            if turn < len(group)]
+
+
+def distribution(agent_counts: Counter, theme_counts: Counter, hits: int) -> dict:
+    """Share of the hits in which each Frame Element was mapped to the agent and the theme role."""
+    hits = max(hits, 1)
+    shares = {('agent', fe): count / hits for fe, count in agent_counts.items()}
+    shares.update({('theme', fe): count / hits for fe, count in theme_counts.items()})
+    return shares
+
+
+def has_changed(previous: dict, current: dict, tolerance: float = None) -> bool:
+    """Convergence criterion: the mapping changed if a Frame Element was mapped to a role for the first time or (if a
+    tolerance is given) if the share of any Frame Element changed by more than the tolerance.
+
+    :param previous: Dictionary. Distribution at the last check (see distribution).
+    :param current: Dictionary. Distribution now.
+    :param tolerance: Float. Maximal absolute change of a share. None: only the mapped sets are compared.
+    :return: Boolean. True if the mapping is not stable yet.
+    """
+    if set(previous) != set(current):
+        return True
+    return tolerance is not None and any(abs(current[key] - previous[key]) > tolerance for key in current)
+
+
+def map_lu_adaptive(nlp: object, lu_text: str, lu_id: int, cf: object, approach: str = 'short',
+                    order: str = 'stratified', seed: int = 0, min_sentences: int = 20, check_every: int = 10,
+                    patience: int = 2, tolerance: float = 0.05, detectors: tuple = None) -> list:
+    """Role mapping of one LU which stops processing exemplars once the mapping is stable.
+
+    The exemplars are parsed in chunks of check_every sentences (in the order of sample_order). After at least
+    min_sentences sentences, the mapping counts as stable once it has not changed (see has_changed) for `patience`
+    checks in a row; the remaining exemplars are not parsed.
+
+    The entry has the same format as the ones of the role mapping methods. Its counts (index 7, see
+    role_counts.count_information) additionally contain 'exemplars' (all exemplars of the LU) and 'converged'
+    (False if all exemplars were processed without the mapping becoming stable); 'sentences' are the processed
+    sentences.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_text: String. The verb.
+    :param lu_id: Integer. The LU ID.
+    :param cf: The Connotation Frame of the verb.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param order: String. Processing order of the exemplars (see sample_order).
+    :param seed: Integer. Seed of the processing order.
+    :param min_sentences: Integer. Minimal amount of processed sentences.
+    :param check_every: Integer. Amount of sentences between two checks (and parsed together).
+    :param patience: Integer. Amount of checks in a row without change.
+    :param tolerance: Float. Maximal change of the share of a Frame Element (see has_changed).
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :return: List. The role mapping entry of the LU.
+    """
+    with profiling.stage('framenet_lookup'):
+        lu_object = fn.lu(lu_id)
+        examples = lu_object.exemplars
+
+    if len(examples) == 0:
+        return [lu_text, lu_id, 'No examples found. No Mapping possible']
+
+    ordered = [examples[index] for index in sample_order(examples, order, seed)]
+    agent_mapping = ['CF_Agent']
+    theme_mapping = ['CF_Theme']
+    hit_count = 0
+    passive_count = 0
+    processed = 0
+    stable_checks = 0
+    previous = None
+
+    while processed < len(ordered) and stable_checks < patience:
+        chunk = ordered[processed:processed + check_every]
+        with profiling.stage('parsing'):
+            docs = list(nlp.pipe([example.text for example in chunk], batch_size=check_every))
+
+        hits, passive = map.align_docs(nlp, lu_text, chunk, docs, agent_mapping, theme_mapping, approach, detectors)
+        hit_count += hits
+        passive_count += passive
+        processed += len(chunk)
+
+        current = distribution(Counter(agent_mapping[1:]), Counter(theme_mapping[1:]), hit_count)
+        if previous is not None and processed >= min_sentences and not has_changed(previous, current, tolerance):
+            stable_checks += 1
+        else:
+            stable_checks = 0
+        previous = current
+
+    counts = role_counts.count_information(agent_mapping, theme_mapping, processed, hit_count, passive_count)
+    counts.update(exemplars=len(examples), converged=stable_checks >= patience)
+    return [lu_text, lu_id, set(agent_mapping), set(theme_mapping), lu_object.frame.name, passive_count, cf, counts]
+
+
+def map_cf_roles_and_fes_adaptive(nlp: object, mapping_verb_lu_cfs: dict, approach: str = 'short', **options) -> dict:
+    """Role mapping of one approach with adaptive early stopping per LU (see map_lu_adaptive for the options).
+
+    :param nlp: Object. Preloaded Language Model.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and counts in a list.
+    """
+    return {lu_id: map_lu_adaptive(nlp, lu_text, lu_id, cf, approach, **options)
+            for (lu_text, lu_id), cf in mapping_verb_lu_cfs.items()}
+
+
+def compare_with_exhaustive(adaptive: dict, exhaustive: dict) -> dict:
+    """Compares an adaptive role mapping with the exhaustive one (all exemplars).
+
+    The returned dictionary looks like this:
+    {'lus': 120, 'identical': 0.95, 'sentences': 3000, 'exemplars': 12000, 'saved': 0.75, 'converged': 110,
+     'differences': [{'lu_id': 123, 'verb': 'hate', 'sentences': 40, 'exemplars': 300,
+                      'agent_missing': ['FE'], 'agent_extra': [], 'theme_missing': [], 'theme_extra': []}]}
+    'identical' is the share of LUs with the same agent and theme sets, 'saved' the share of exemplars which were not
+    parsed. Only LUs with a mapping in both are compared.
+
+    :param adaptive: Dictionary. Output of map_cf_roles_and_fes_adaptive.
+    :param exhaustive: Dictionary. A role mapping of the same approach with all exemplars (e.g. the saved one).
+    :return: Dictionary. The summary and the LUs whose mappings differ.
+    """
+    compared = [lu_id for lu_id, entry in adaptive.items()
+                if len(entry) > 7 and lu_id in exhaustive and len(exhaustive[lu_id]) > 3]
+    differences = []
+    for lu_id in compared:
+        entry, reference = adaptive[lu_id], exhaustive[lu_id]
+        difference = {'agent_missing': sorted(reference[2] - entry[2]), 'agent_extra': sorted(entry[2] - reference[2]),
+                      'theme_missing': sorted(reference[3] - entry[3]), 'theme_extra': sorted(entry[3] - reference[3])}
+        if any(len(fes) > 0 for fes in difference.values()):
+            differences.append(dict({'lu_id': lu_id, 'verb': entry[0], 'sentences': entry[7]['sentences'],
+                                     'exemplars': entry[7]['exemplars']}, **difference))
+
+    sentences = sum(adaptive[lu_id][7]['sentences'] for lu_id in compared)
+    exemplars = sum(adaptive[lu_id][7]['exemplars'] for lu_id in compared)
+    return {'lus': len(compared),
+            'identical': 1 - len(differences) / len(compared) if len(compared) > 0 else None,
+            'sentences': sentences,
+            'exemplars': exemplars,
+            'saved': 1 - sentences / exemplars if exemplars > 0 else None,
+            'converged': sum(adaptive[lu_id][7]['converged'] for lu_id in compared),
+            'differences': differences}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Role mapping with adaptive early stopping per LU, compared with the '
+                                                 'exhaustive role mapping.')
+    parser.add_argument('--approach', default='short', choices=sorted(map.DETECTORS))
+    parser.add_argument('--order', default='stratified', choices=ORDERS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-sentences', type=int, default=20)
+    parser.add_argument('--check-every', type=int, default=10)
+    parser.add_argument('--patience', type=int, default=2)
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='Maximal change of the share of a Frame Element; negative: only the sets are compared')
+    parser.add_argument('--lus', nargs='+', type=int, help='LU IDs (default: all)')
+    parser.add_argument('--recompute', action='store_true', help='Computes the exhaustive role mapping instead of '
+                                                                 'using the saved one (obj/)')
+    parser.add_argument('--report', default='adaptive_report.json')
+    args = parser.parse_args()
+
+    profiling.start('adaptive_sampling')
+    import en_core_web_sm
+    nlp = en_core_web_sm.load()
+    mapping = {key: value for key, value in load_obj('mapping_verb_lu_cfs').items()
+               if args.lus is None or key[1] in args.lus}
+    adaptive_mapping = map_cf_roles_and_fes_adaptive(nlp, mapping, args.approach, order=args.order, seed=args.seed,
+                                                     min_sentences=args.min_sentences, check_every=args.check_every,
+                                                     patience=args.patience,
+                                                     tolerance=args.tolerance if args.tolerance >= 0 else None)
+    exhaustive_mapping = map.map_cf_roles_and_fes_batched(nlp, mapping, args.approach) if args.recompute \
+        else load_obj(ROLE_MAPPING_FILES[args.approach])
+
+    comparison = compare_with_exhaustive(adaptive_mapping, exhaustive_mapping)
+    with open(args.report, 'w', encoding='UTF-8') as report:
+        json.dump(comparison, report, indent=1)
+    print('{} LUs: {} of {} exemplars parsed ({:.1%} saved), {} converged, identical mapping for {:.1%}'.format(
+        comparison['lus'], comparison['sentences'], comparison['exemplars'], comparison['saved'] or 0,
+        comparison['converged'], comparison['identical'] or 0))
+    print('Differences written to', args.report)
@@ -0,0 +1,199 @@
+from spacy.matcher import DependencyMatcher
+import framenet_connotationframes_mapping as map
+
+
+# Declarative rules for the arguments of a verb, compiled into one DependencyMatcher (see compile_rules).
+# 'dep' is a regular expression for the dependency label of the argument. 'via' are the token attributes of the token
+# between verb and argument; rules without 'via' match children of the verb, rules with 'via' grandchildren.
+# If a token matches several rules, the first one is used.
+RULES = [
+    {'name': 'active_subject', 'role': 'subject', 'dep': '^(?!.*subjpass).*subj', 'passive': 0},
+    {'name': 'passive_subject', 'role': 'subject', 'dep': 'subjpass', 'passive': 1},
+    {'name': 'direct_object', 'role': 'object', 'dep': 'obj', 'passive': 0},
+    {'name': 'by_agent', 'role': 'object', 'dep': 'obj', 'via': {'DEP': 'agent', 'LOWER': 'by'}, 'passive': 0},
+    {'name': 'prepositional_object', 'role': 'object', 'dep': 'obj', 'via': {'DEP': 'prep'}, 'passive': 0},
+    {'name': 'grandchild_object', 'role': 'object', 'dep': 'obj', 'via': {}, 'passive': 0},
+]
+
+
+def span_token(token: object) -> tuple:
+    """The argument token only."""
+    return token.idx, token.idx + len(token.text)
+
+
+def span_children(token: object) -> tuple:
+    """The argument token and its children."""
+    tokens = [token] + list(token.children)
+    left = min(tokens, key=lambda t: t.i)
+    right = max(tokens, key=lambda t: t.i)
+    return left.idx, right.idx + len(right.text)
+
+
+def span_subtree(token: object) -> tuple:
+    """The argument token and its subtree, from its leftmost to its rightmost token. As computed by
+    detect_object_long_phrase, the end is the start of the rightmost token plus the length of the last token of the
+    subtree (the same token unless the parse is non-projective)."""
+    subtree = list(token.subtree)
+    return min(t.idx for t in subtree), max(t.idx for t in subtree) + len(subtree[-1].text)
+
+
+def span_subtree_subject(token: object) -> tuple:
+    """Subtree as computed by detect_subject_long_phrase: it ends at the start of the argument token plus the length of
+    the last token of the subtree."""
+    subtree = list(token.subtree)
+    return subtree[0].idx, token.idx + len(subtree[-1].text)
+
+
+def span_subtree_grandchild_object(token: object) -> tuple:
+    """Subtree as computed by detect_object_long_phrase for grandchildren: it ends at the start of the rightmost token
+    of the subtree plus the length of the argument token."""
+    subtree = list(token.subtree)
+    return min(t.idx for t in subtree), max(t.idx for t in subtree) + len(token.text)
+
+
+# The span expansion policy of each approach per (role, 'child' or 'grandchild'). The long phrase policies reproduce
+# the offsets of the legacy detection methods, so that the role mappings stay the same.
+EXPANSIONS = {
+    'naive': {('subject', 'child'): span_token, ('object', 'child'): span_token,
+              ('object', 'grandchild'): span_token},
+    'short': {('subject', 'child'): span_children, ('object', 'child'): span_children,
+              ('object', 'grandchild'): span_children},
+    'long': {('subject', 'child'): span_subtree_subject, ('object', 'child'): span_subtree,
+             ('object', 'grandchild'): span_subtree_grandchild_object},
+}
+
+_matchers = {}  # {id of the vocab: (vocab, DependencyMatcher)}
+_last = {'doc': None, 'lu': None, 'arguments': None}  # Subject and object detection share the matches of one Doc
+
+
+def compile_rules(vocab: object, rules: list = None) -> DependencyMatcher:
+    """Compiles the rules into one DependencyMatcher. The verb is matched by any token and filtered afterwards, so the
+    matcher does not depend on the LU.
+
+    :param vocab: Object. The vocab of the Language Model.
+    :param rules: List. The rules (see RULES). Default: RULES.
+    :return: Object. The DependencyMatcher; the match IDs are the rule names.
+    """
+    matcher = DependencyMatcher(vocab)
+    for rule in rules if rules is not None else RULES:
+        pattern = [{'RIGHT_ID': 'verb', 'RIGHT_ATTRS': {}}]
+        parent = 'verb'
+        if 'via' in rule:
+            pattern.append({'LEFT_ID': 'verb', 'REL_OP': '>', 'RIGHT_ID': 'via', 'RIGHT_ATTRS': rule['via']})
+            parent = 'via'
+        pattern.append({'LEFT_ID': parent, 'REL_OP': '>', 'RIGHT_ID': 'argument',
+                        'RIGHT_ATTRS': {'DEP': {'REGEX': rule['dep']}}})
+        matcher.add(rule['name'], [pattern])
+    return matcher
+
+
+def matcher_for(vocab: object) -> DependencyMatcher:
+    """Returns the compiled rules for a vocab, compiling them on first use."""
+    if id(vocab) not in _matchers:
+        _matchers[id(vocab)] = (vocab, compile_rules(vocab))
+    return _matchers[id(vocab)][1]
+
+
+def find_arguments(doc: object, lu: str) -> dict:
+    """Finds the subjects and objects of the LU in a parsed sentence with one run of the DependencyMatcher.
+
+    :param doc: Object. The parsed spaCy Doc.
+    :param lu: String. The lemma of the Lexical Unit.
+    :return: Dictionary. {'subject': [(token, rule)], 'object': [(token, rule)]}, both in the order of the sentence.
+    """
+    return collect_arguments(doc, lambda verb: doc[verb].lemma_ == lu)
+
+
+def find_arguments_of_token(doc: object, verb: int) -> dict:
+    """Finds the subjects and objects of one verb token (e.g. a target found by lemma_trie.find_targets), so that
+    other occurrences of the same lemma are left out.
+
+    :param doc: Object. The parsed spaCy Doc.
+    :param verb: Integer. Index of the verb token in the Doc.
+    :return: Dictionary. {'subject': [(token, rule)], 'object': [(token, rule)]} (see find_arguments).
+    """
+    return collect_arguments(doc, lambda token: token == verb)
+
+
+def collect_arguments(doc: object, is_verb: object) -> dict:
+    """Runs the DependencyMatcher and keeps the matches whose verb fulfils is_verb (called with the token index). If
+    a token matches several rules, the first one of RULES is used."""
+    rules = {rule['name']: (priority, rule) for priority, rule in enumerate(RULES)}
+    found = {}
+    for match_id, token_ids in matcher_for(doc.vocab)(doc):
+        if not is_verb(token_ids[0]):
+            continue
+        priority, rule = rules[doc.vocab.strings[match_id]]
+        argument = token_ids[-1]
+        if argument not in found or priority < found[argument][0]:
+            found[argument] = (priority, rule)
+
+    arguments = {'subject': [], 'object': []}
+    for argument in sorted(found):
+        rule = found[argument][1]
+        arguments[rule['role']].append((doc[argument], rule))
+    return arguments
+
+
+def detection_format(arguments: dict, approach: str, role: str) -> list:
+    """Converts found arguments (see find_arguments) into the output format of the detection methods:
+    ["subject head", (position start, position end), "head", 0] (four values per subject/object, 0 means active)"""
+    detection = []
+    for token, rule in arguments[role]:
+        expand = EXPANSIONS[approach][(role, 'grandchild' if 'via' in rule else 'child')]
+        detection.extend([token.text, expand(token), token.head.text, rule['passive']])
+    return detection
+
+
+def detect_arguments(nlp: object, sentence, lu: str, approach: str, role: str) -> list:
+    """Detects the subjects or objects of the LU like the detection methods of the approach (e.g.
+    detect_subject_short_phrase) and returns them in the same format:
+    ["subject head", (position start, position end), "head", 0] (four values per subject/object, 0 means active)
+
+    :param nlp: Object. Preloaded Language Model.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
+    :param lu: String. The Lexical Unit.
+    :param approach: String. 'naive', 'short' or 'long' (the span expansion policy).
+    :param role: String. 'subject' or 'object'.
+    :return: List. Text, span, head text and passive indicator of each detected argument.
+    """
+    doc = map.parse(nlp, sentence)
+    if _last['doc'] is not doc or _last['lu'] != lu:
+        _last.update(doc=doc, lu=lu, arguments=find_arguments(doc, lu))
+    return detection_format(_last['arguments'], approach, role)
+
+
+def detect_subject_naive(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_subject."""
+    return detect_arguments(nlp, sentence, lu, 'naive', 'subject')
+
+
+def detect_object_naive(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_object."""
+    return detect_arguments(nlp, sentence, lu, 'naive', 'object')
+
+
+def detect_subject_short(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_subject_short_phrase."""
+    return detect_arguments(nlp, sentence, lu, 'short', 'subject')
+
+
+def detect_object_short(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_object_short_phrase."""
+    return detect_arguments(nlp, sentence, lu, 'short', 'object')
+
+
+def detect_subject_long(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_subject_long_phrase."""
+    return detect_arguments(nlp, sentence, lu, 'long', 'subject')
+
+
+def detect_object_long(nlp: object, sentence, lu: str) -> list:
+    """Rule-based version of detect_object_long_phrase."""
+    return detect_arguments(nlp, sentence, lu, 'long', 'object')
+
+
+# The rule-based subject and object detection methods of each approach (same format as DETECTORS)
+RULE_DETECTORS = {'naive': (detect_subject_naive, detect_object_naive),
+                  'short': (detect_subject_short, detect_object_short),
+                  'long': (detect_subject_long, detect_object_long)}
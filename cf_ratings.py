@@ -0,0 +1,212 @@
+import numpy as np
+import warnings
+
+
+# The kappa values of the thesis divide the sum of the products of the marginals by these constants instead of the
+# squared amount of ratings to get the agreement expected by chance (see kappa). They are the default, so the published
+# values are reproduced; corrected=True computes the chance agreement from the marginals.
+LEGACY_CHANCE_DENOMINATORS = {'annotators': 78 ** 6, 'original': 26 ** 3}
+
+
+def load_ratings(evals: list, features: list = None, lu_ids: list = None) -> dict:
+    """Converts Connotation Frame evaluations (the *_cf_eval.pkl files) into a dense ratings tensor.
+
+    The tensor has the shape LU x CF feature x condition x annotator. The conditions are the rating without context
+    followed by the ratings in each sentence. Ratings of '?' (no connotation) are marked in the 'unknown' mask and are
+    NaN in 'ratings' like ratings which do not exist (e.g. an LU that one annotator did not evaluate). The returned
+    dictionary looks like this:
+    {'ratings': array, 'unknown': bool array, 'answered': bool array, 'original': array (LU x feature),
+     'lu_ids': [655, ...], 'features': ['Perspective(writer->agent)', ...],
+     'conditions': ['no_context', 'sentence 1', ...]}
+
+    :param evals: List. The evaluations of all annotators as written by cf_evaluation (one list per annotator).
+    :param features: List. The CF features to be loaded. Default: all evaluated features.
+    :param lu_ids: List. The LUs to be loaded. Default: all LUs evaluated by at least one annotator.
+    :return: Dictionary. The ratings tensor, its masks and the labels of its axes.
+    """
+    annotations = [evaluation[1] for evaluation in evals]
+    if lu_ids is None:
+        lu_ids = list(dict.fromkeys(lu_id for annotation in annotations for lu_id in annotation))
+    if features is None:
+        features = list(dict.fromkeys(rating[0] for annotation in annotations for value in annotation.values()
+                                      for rating in value[3]))
+    condition_count = max([len(rating) - 2 for annotation in annotations for value in annotation.values()
+                           for rating in value[3]] + [1])
+
+    lu_index = {lu_id: row for row, lu_id in enumerate(lu_ids)}
+    feature_index = {feature: column for column, feature in enumerate(features)}
+    shape = (len(lu_ids), len(features), condition_count, len(annotations))
+    ratings = np.full(shape, np.nan)
+    unknown = np.zeros(shape, dtype=bool)
+    original = np.full(shape[:2], np.nan)
+
+    for annotator, annotation in enumerate(annotations):
+        for lu_id, value in annotation.items():
+            if lu_id not in lu_index:
+                continue
+            for rating in value[3]:
+                if rating[0] not in feature_index:
+                    continue
+                row, column = lu_index[lu_id], feature_index[rating[0]]
+                original[row, column] = float(rating[1])
+                for condition, answer in enumerate(rating[2:]):
+                    if answer == '?':
+                        unknown[row, column, condition, annotator] = True
+                    else:
+                        ratings[row, column, condition, annotator] = float(answer)
+
+    return {'ratings': ratings, 'unknown': unknown, 'answered': unknown | ~np.isnan(ratings), 'original': original,
+            'lu_ids': list(lu_ids), 'features': list(features),
+            'conditions': ['no_context'] + ['sentence {}'.format(number) for number in range(1, condition_count)]}
+
+
+def condition_slice(tensor: dict, conditions: str) -> object:
+    """Returns the condition axis indices for 'context_free' (without context), 'context' (in the sentences) or 'all'.
+    """
+    if conditions == 'context_free':
+        return slice(0, 1)
+    if conditions == 'context':
+        return slice(1, len(tensor['conditions']))
+    if conditions == 'all':
+        return slice(0, len(tensor['conditions']))
+    raise ValueError("Unknown conditions '{}'. Use 'context_free', 'context' or 'all'".format(conditions))
+
+
+def values(tensor: dict, unknown_as_zero: bool = True) -> object:
+    """Returns the ratings as floats. '?' counts as 0 (neutral) if unknown_as_zero is True, otherwise it stays NaN."""
+    return np.where(tensor['unknown'], 0.0, tensor['ratings']) if unknown_as_zero else tensor['ratings']
+
+
+def mean_ratings(tensor: dict, conditions: str = 'all', unknown_as_zero: bool = True) -> object:
+    """Averages the ratings over the selected conditions and all annotators.
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :param conditions: String. 'context_free', 'context' or 'all'.
+    :param unknown_as_zero: Boolean. Whether '?' counts as 0 or is left out.
+    :return: Array. Mean ratings (LU x feature), NaN where no rating exists.
+    """
+    selected = values(tensor, unknown_as_zero)[:, :, condition_slice(tensor, conditions), :]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # LU features without any rating stay NaN
+        return np.nanmean(selected.reshape(selected.shape[0], selected.shape[1], -1), axis=2)
+
+
+def agreement_with_original(tensor: dict, conditions: str = 'all', tolerance: float = 0.2) -> dict:
+    """Counts the LU features whose mean rating agrees with the value of the original lexicon.
+
+    The mean rating (-2 to 2) is scaled to the range of the lexicon (-1 to 1); it agrees if it deviates by at most
+    tolerance from the original value.
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :param conditions: String. 'context_free', 'context' or 'all'.
+    :param tolerance: Float. Maximum deviation.
+    :return: Dictionary. {'equal': 70, 'unequal': 60}
+    """
+    scaled = mean_ratings(tensor, conditions) / 2
+    valid = ~np.isnan(scaled) & ~np.isnan(tensor['original'])
+    with np.errstate(invalid='ignore'):
+        equal = (tensor['original'] - tolerance <= scaled) & (scaled <= tensor['original'] + tolerance)
+    return {'equal': int((equal & valid).sum()), 'unequal': int((~equal & valid).sum())}
+
+
+def missing_connotations(tensor: dict) -> dict:
+    """Counts the ratings with no connotation ('?'), averaged over the annotators.
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :return: Dictionary. {'verbs': LUs with at least one '?', 'features': amount of '?', 'total': amount of ratings,
+    'per_feature': {feature: amount of '?'}}
+    """
+    annotators = tensor['ratings'].shape[3]
+    verbs = tensor['unknown'].any(axis=(1, 2)).sum() / annotators
+    per_feature = tensor['unknown'].sum(axis=(0, 2, 3)) / annotators
+    return {'verbs': float(verbs), 'features': float(tensor['unknown'].sum() / annotators),
+            'total': float(tensor['answered'].sum() / annotators),
+            'per_feature': {feature: float(count) for feature, count in zip(tensor['features'], per_feature)}}
+
+
+def context_shift(tensor: dict, unknown_as_zero: bool = True) -> dict:
+    """Measures how much the ratings in the sentences differ from the rating without context.
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :param unknown_as_zero: Boolean. Whether '?' counts as 0 or is left out.
+    :return: Dictionary. {'shift': array (LU x feature, mean in context minus without context),
+    'mean_absolute_shift': {feature: float}, 'changed_share': {feature: share of ratings that changed}}
+    """
+    ratings = values(tensor, unknown_as_zero)
+    difference = ratings[:, :, 1:, :] - ratings[:, :, :1, :]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        shift = np.nanmean(difference.reshape(difference.shape[0], difference.shape[1], -1), axis=2)
+        changed = np.nanmean(np.where(np.isnan(difference), np.nan, difference != 0).reshape(
+            difference.shape[0], difference.shape[1], -1), axis=2)
+        mean_absolute_shift = np.nanmean(np.abs(shift), axis=0)
+        changed_share = np.nanmean(changed, axis=0)
+    return {'shift': shift,
+            'mean_absolute_shift': {feature: float(value) for feature, value in zip(tensor['features'],
+                                                                                   mean_absolute_shift)},
+            'changed_share': {feature: float(value) for feature, value in zip(tensor['features'], changed_share)}}
+
+
+def bucket(values: object, threshold: float) -> object:
+    """Maps values to -1 (negative, <= -threshold), 0 (neutral) and 1 (positive, > threshold). NaN stays NaN."""
+    return np.where(np.isnan(values), np.nan, np.where(values <= -threshold, -1, np.where(values <= threshold, 0, 1)))
+
+
+def kappa(labels_1: object, labels_2: object, chance_denominator: float = None) -> tuple:
+    """Computes Cohen's Kappa between two label arrays. Positions where one of them is NaN are left out.
+
+    The agreement expected by chance is the sum of the products of both raters' label counts divided by the squared
+    amount of labels, or by chance_denominator if it is given (see LEGACY_CHANCE_DENOMINATORS).
+
+    :param labels_1: Array. Labels of rater 1 (numbers).
+    :param labels_2: Array. Labels of rater 2 (numbers).
+    :param chance_denominator: Float. Replaces the squared amount of labels. Default: None.
+    :return: Tuple. Kappa, amount of compared labels and amount of agreements.
+    """
+    labels_1, labels_2 = np.ravel(labels_1), np.ravel(labels_2)
+    valid = ~np.isnan(labels_1) & ~np.isnan(labels_2)
+    labels_1, labels_2 = labels_1[valid], labels_2[valid]
+    categories, codes = np.unique(np.concatenate([labels_1, labels_2]), return_inverse=True)
+    codes_1, codes_2 = codes[:len(labels_1)], codes[len(labels_1):]
+
+    total = len(labels_1)
+    agreements = int((codes_1 == codes_2).sum())
+    if total == 0:
+        return float('nan'), 0, 0
+    expected = (np.bincount(codes_1, minlength=len(categories)) *
+                np.bincount(codes_2, minlength=len(categories))).sum() / (chance_denominator or total ** 2)
+    observed = agreements / total
+    return float((observed - expected) / (1 - expected)) if expected < 1 else 1.0, total, agreements
+
+
+def annotator_kappa(tensor: dict, annotator_1: int = 0, annotator_2: int = 1, conditions: str = 'all',
+                    corrected: bool = False) -> tuple:
+    """Computes Cohen's Kappa between two annotators over all ratings (-2, -1, 0, 1, 2 and '?' as own category).
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :param annotator_1: Integer. Index of the first annotator.
+    :param annotator_2: Integer. Index of the second annotator.
+    :param conditions: String. 'context_free', 'context' or 'all'.
+    :param corrected: Boolean. Whether the chance agreement is computed from the marginals instead of the thesis'
+    constant (see LEGACY_CHANCE_DENOMINATORS). Default: False.
+    :return: Tuple. Kappa, amount of compared ratings and amount of agreements.
+    """
+    labels = np.where(tensor['unknown'], 3.0, tensor['ratings'])[:, :, condition_slice(tensor, conditions), :]
+    return kappa(labels[..., annotator_1], labels[..., annotator_2],
+                 None if corrected else LEGACY_CHANCE_DENOMINATORS['annotators'])
+
+
+def kappa_with_original(tensor: dict, conditions: str = 'all', corrected: bool = False) -> tuple:
+    """Computes Cohen's Kappa between the original lexicon and the mean ratings of the annotators.
+
+    Both are mapped to negative/neutral/positive: the original values (-1 to 1) with a threshold of 0.35, the mean
+    ratings (-2 to 2, '?' counts as 0) with a threshold of 0.65.
+
+    :param tensor: Dictionary. Output of load_ratings.
+    :param conditions: String. 'context_free', 'context' or 'all'.
+    :param corrected: Boolean. Whether the chance agreement is computed from the marginals instead of the thesis'
+    constant (see LEGACY_CHANCE_DENOMINATORS). Default: False.
+    :return: Tuple. Kappa, amount of compared ratings and amount of agreements.
+    """
+    return kappa(bucket(mean_ratings(tensor, conditions), 0.65), bucket(tensor['original'], 0.35),
+                 None if corrected else LEGACY_CHANCE_DENOMINATORS['original'])
@@ -0,0 +1,206 @@
+from preprocessing.serialization import load_obj
+import numpy as np
+import argparse
+import time
+
+
+def cf_matrix(cfs: dict) -> tuple:
+    """Converts the Connotation Frame lexicon into a dense float matrix with one row per verb.
+
+    The columns follow the order of the Connotation Frame features in the lexicon, e.g. 'Perspective(writer->theme)'.
+
+    :param cfs: Dictionary. Keys are verbs as strings, values are the Connotation Frames as nested dictionaries.
+    :return: Tuple. The matrix (verbs x features), the list of verbs (rows) and the list of features (columns).
+    """
+    verbs = list(cfs)
+    features = list(cfs[verbs[0]]) if len(verbs) > 0 else []
+    matrix = np.array([[float(cfs[verb][feature]) for feature in features] for verb in verbs], dtype=np.float64)
+    return matrix.reshape(len(verbs), len(features)), verbs, features
+
+
+def normalize_rows(matrix: object) -> object:
+    """Scales all rows to unit length, so the dot product of two rows is their cosine similarity.
+
+    :param matrix: Array. Matrix with one vector per row.
+    :return: Array. Row-normalized matrix (zero rows stay zero).
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def similarity_block(block: object, matrix: object, metric: str = 'cosine', squared_norms: object = None) -> object:
+    """Computes the similarities between the rows of a block and all rows of a matrix with one matrix product.
+
+    For 'cosine', both inputs have to be row-normalized (see normalize_rows). For 'euclidean', the negative Euclidean
+    distance is returned, so that for both metrics a higher value means more similar.
+
+    :param block: Array. Query vectors (one per row).
+    :param matrix: Array. Lexicon vectors (one per row).
+    :param metric: String. 'cosine' or 'euclidean'.
+    :param squared_norms: Array. Precomputed squared row norms of the matrix (only used for 'euclidean').
+    :return: Array. Similarities (block rows x matrix rows).
+    """
+    products = block @ matrix.T
+    if metric == 'cosine':
+        return products
+    if metric == 'euclidean':
+        if squared_norms is None:
+            squared_norms = (matrix ** 2).sum(axis=1)
+        squared = (block ** 2).sum(axis=1)[:, None] + squared_norms[None, :] - 2 * products
+        return -np.sqrt(np.maximum(squared, 0))
+    raise ValueError("Unknown metric '{}'. Use 'cosine' or 'euclidean'".format(metric))
+
+
+def top_k(similarities: object, k: int) -> tuple:
+    """Selects the k highest similarities per row without sorting the whole row.
+
+    :param similarities: Array. Similarities (queries x lexicon).
+    :param k: Integer. Amount of neighbours per row.
+    :return: Tuple. Indices and similarities of the k nearest neighbours per row, most similar first.
+    """
+    k = min(k, similarities.shape[1])
+    candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    candidate_similarities = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.argsort(-candidate_similarities, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_similarities, order, axis=1)
+
+
+def lexicon_index(matrix: object, verbs: list) -> dict:
+    """Precomputes everything that is needed for fast queries: the row-normalized matrix and the squared row norms.
+
+    :param matrix: Array. Connotation Frame matrix (see cf_matrix).
+    :param verbs: List. The verbs of the matrix rows.
+    :return: Dictionary. {'matrix': array, 'normalized': array, 'squared_norms': array, 'verbs': list, 'rows': dict}
+    """
+    return {'matrix': matrix, 'normalized': normalize_rows(matrix), 'squared_norms': (matrix ** 2).sum(axis=1),
+            'verbs': verbs, 'rows': {verb: row for row, verb in enumerate(verbs)}}
+
+
+def nearest_verbs(index: dict, query: object, k: int = 10, metric: str = 'cosine') -> list:
+    """Finds the k verbs with the most similar connotation profile.
+
+    :param index: Dictionary. Output of lexicon_index.
+    :param query: String or Array. A verb of the lexicon or a connotation profile vector.
+    :param k: Integer. Amount of returned verbs.
+    :param metric: String. 'cosine' or 'euclidean'.
+    :return: List. Tuples (verb, similarity), most similar first. A query verb is not part of its own result.
+    """
+    exclude = None
+    if isinstance(query, str):
+        exclude = index['rows'][query]
+        query = index['matrix'][exclude]
+    query = np.asarray(query, dtype=np.float64).reshape(1, -1)
+
+    if metric == 'cosine':
+        similarities = similarity_block(normalize_rows(query), index['normalized'], metric)
+    else:
+        similarities = similarity_block(query, index['matrix'], metric, index['squared_norms'])
+
+    if exclude is not None:
+        similarities[0, exclude] = -np.inf
+
+    indices, values = top_k(similarities, k)
+    return [(index['verbs'][i], float(v)) for i, v in zip(indices[0], values[0]) if np.isfinite(v)]
+
+
+def all_pairs(matrix: object, metric: str = 'cosine', block_size: int = 2048) -> object:
+    """Computes the similarities of all pairs of verbs block by block, so the full matrix never has to be in memory.
+
+    :param matrix: Array. Connotation Frame matrix (see cf_matrix).
+    :param metric: String. 'cosine' or 'euclidean'.
+    :param block_size: Integer. Amount of rows per block.
+    :return: Generator. Yields tuples (first row of the block, similarities of the block x all rows).
+    """
+    if metric == 'cosine':
+        matrix = normalize_rows(matrix)
+    for start in range(0, matrix.shape[0], block_size):
+        yield start, similarity_block(matrix[start:start + block_size], matrix, metric)
+
+
+def all_pairs_top_k(matrix: object, k: int = 10, metric: str = 'cosine', block_size: int = 2048) -> tuple:
+    """Computes the k nearest neighbours of every verb of the lexicon (without the verb itself).
+
+    :param matrix: Array. Connotation Frame matrix (see cf_matrix).
+    :param k: Integer. Amount of neighbours per verb.
+    :param metric: String. 'cosine' or 'euclidean'.
+    :param block_size: Integer. Amount of rows per block.
+    :return: Tuple. Indices and similarities of the neighbours (verbs x k), most similar first.
+    """
+    indices = np.zeros((matrix.shape[0], min(k, matrix.shape[0] - 1)), dtype=np.int64)
+    values = np.zeros(indices.shape, dtype=np.float64)
+
+    for start, similarities in all_pairs(matrix, metric, block_size):
+        rows = np.arange(similarities.shape[0])
+        similarities[rows, start + rows] = -np.inf
+        block_indices, block_values = top_k(similarities, indices.shape[1])
+        indices[start:start + similarities.shape[0]] = block_indices
+        values[start:start + similarities.shape[0]] = block_values
+
+    return indices, values
+
+
+def frame_centroids(matrix: object, verbs: list, role_mapping: dict) -> dict:
+    """Computes the mean connotation profile of all verbs of each frame of a role mapping.
+
+    :param matrix: Array. Connotation Frame matrix (see cf_matrix).
+    :param verbs: List. The verbs of the matrix rows.
+    :param role_mapping: Dictionary. The finished dictionary with all LUs, role mappings, connotation frames etc.
+    :return: Dictionary. Keys are frame names, values are the centroid vectors.
+    """
+    verb_index = {verb: row for row, verb in enumerate(verbs)}
+    frame_rows = {}
+    for lu_id, information in role_mapping.items():
+        if len(information) < 5 or information[0] not in verb_index:  # If no proper mapping was found
+            continue
+        frame_rows.setdefault(information[4], []).append(verb_index[information[0]])
+    return {frame: matrix[rows].mean(axis=0) for frame, rows in frame_rows.items()}
+
+
+def benchmark(n_verbs: int = 100000, n_queries: int = 1000, k: int = 10, metric: str = 'cosine') -> dict:
+    """Measures the query time of nearest_verbs and all_pairs_top_k on a random lexicon.
+
+    :param n_verbs: Integer. Size of the random lexicon.
+    :param n_queries: Integer. Amount of single top-k queries.
+    :param k: Integer. Amount of neighbours per query.
+    :param metric: String. 'cosine' or 'euclidean'.
+    :return: Dictionary. Seconds for building the index, mean milliseconds per single query and seconds for the top-k
+    of 10000 verbs.
+    """
+    rng = np.random.default_rng(0)
+    matrix = rng.uniform(-1, 1, size=(n_verbs, 12))
+    queries = rng.uniform(-1, 1, size=(n_queries, 12))
+
+    start = time.perf_counter()
+    index = lexicon_index(matrix, ['verb{}'.format(i) for i in range(n_verbs)])
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        nearest_verbs(index, query, k, metric)
+    single_query_ms = (time.perf_counter() - start) / n_queries * 1000
+
+    start = time.perf_counter()
+    all_pairs_top_k(matrix[:10000], k, metric)
+    all_pairs_seconds = time.perf_counter() - start
+
+    return {'verbs': n_verbs, 'metric': metric, 'index_s': round(index_seconds, 3),
+            'single_query_ms': round(single_query_ms, 3),
+            'all_pairs_top_k_10000_verbs_s': round(all_pairs_seconds, 3)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Similarity search over Connotation Frame profiles.')
+    parser.add_argument('verbs', nargs='*', help='Verbs for which the nearest verbs are printed')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--metric', default='cosine', choices=['cosine', 'euclidean'])
+    parser.add_argument('--benchmark', action='store_true', help='Runs the benchmark on a random 100k verb lexicon')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(benchmark(metric=args.metric))
+    else:
+        cf_matrix_, cf_verbs, cf_features = cf_matrix(load_obj('extracted_cf_verbs'))
+        cf_index = lexicon_index(cf_matrix_, cf_verbs)
+        for verb in args.verbs:
+            print(verb, nearest_verbs(cf_index, verb, args.k, args.metric))
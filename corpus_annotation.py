@@ -0,0 +1,189 @@
+from preprocessing.serialization import load_obj
+import framenet_connotationframes_mapping as map
+import lemma_trie
+import en_core_web_sm
+import argparse
+import gzip
+import json
+import sys
+
+
+def open_text(path: str) -> object:
+    """Opens a text file for reading. Gzipped files (.gz) are decompressed on the fly, '-' stands for stdin.
+
+    :param path: String. Path to the text file, '-' for stdin.
+    :return: Object. A text file object.
+    """
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='UTF-8')
+    return open(path, 'r', encoding='UTF-8')
+
+
+def read_texts(paths: list, max_length: int = 100000) -> object:
+    """Lazily yields the non-empty lines of all given files, so arbitrarily large corpora are never fully in memory.
+
+    Lines longer than max_length characters are split into several pieces to keep each parsed Doc small.
+
+    :param paths: List. Paths to the text files ('-' for stdin, '.gz' for gzipped files).
+    :param max_length: Integer. Maximum amount of characters of one yielded text.
+    :return: Generator. Yields strings.
+    """
+    for path in paths:
+        file = open_text(path)
+        try:
+            for line in file:
+                line = line.strip()
+                for start in range(0, len(line), max_length):
+                    yield line[start:start + max_length]
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+
+def index_role_mapping(role_mapping: dict) -> dict:
+    """Creates an index from the LU IDs of a role mapping to their mapping information.
+
+    Only LUs for which a proper mapping was found are indexed. The returned dictionary looks like this:
+    {LU ID: ['verb', LU ID, {'CF_Agent', 'FE'}, {'CF_Theme', 'FE'}, 'Frame', Passive Cases, {CF}], ...}
+
+    :param role_mapping: Dictionary. The finished dictionary with all LUs, role mappings, connotation frames etc.
+    :return: Dictionary. Keys are LU IDs, values are the role mapping information of the LU.
+    """
+    lu_index = {}
+    for lu_id, information in role_mapping.items():
+        if len(information) < 7:  # If no proper mapping was found
+            continue
+        lu_index[information[1]] = information
+    return lu_index
+
+
+def annotation_trie(lu_index: dict) -> dict:
+    """Returns the lemma trie of all verbal LUs (see lemma_trie.load_verb_trie), so that multiword and phrasal verbs
+    are matched as their own LUs, e.g. 'gave it up' as 'give up' and not as 'give'. Indexed LUs which are missing in
+    it are added with the lemmas of their verb.
+
+    :param lu_index: Dictionary. Output of index_role_mapping.
+    :return: Dictionary. The trie, targets are LU IDs.
+    """
+    trie = lemma_trie.load_verb_trie()
+    for lu_id, information in lu_index.items():
+        lemma_trie.insert(trie, lu_id, tuple(information[0].lower().split()))
+    return trie
+
+
+def annotate_sentence(nlp: object, sentence: object, lu_index: dict, approach: str, trie: dict = None) -> dict:
+    """Detects the agent and theme of every occurrence of a mapped LU in a parsed sentence and attaches its Connotation
+    Frame.
+
+    The occurrences are found with the lemma trie (see lemma_trie.find_targets), and the agent is the logical subject
+    and the theme the logical object of the occurrence (see argument_rules.find_arguments_of_token). If the subject is
+    marked as passive, the roles are swapped - in the same way as in the role mapping.
+
+    The returned dictionary looks like this:
+    {'sentence': 'text', 'annotations': [{'verb': 'verb', 'lu_id': 123, 'frame': 'Frame', 'passive': 0,
+    'agent': [{'text': 'subject', 'span': [start, end]}], 'theme': [...], 'agent_fes': [...], 'theme_fes': [...],
+    'connotation_frame': {CF}}]}
+
+    :param nlp: Object. Preloaded Language Model.
+    :param sentence: Doc. The parsed sentence (positions are relative to the start of the sentence).
+    :param lu_index: Dictionary. Output of index_role_mapping.
+    :param approach: String. The approach of the detection methods: 'naive', 'short' or 'long'.
+    :param trie: Dictionary. Output of annotation_trie(lu_index); loaded if not given.
+    :return: Dictionary. The sentence and its annotations. None if no mapped LU occurs in the sentence.
+    """
+    sentence_text = sentence.text
+    annotations = []
+
+    for match in lemma_trie.detect_targets(sentence, trie if trie is not None else annotation_trie(lu_index),
+                                           approach, ('VERB', 'AUX')):
+        subjects = map.split_detection(match['subject'])
+        objects = map.split_detection(match['object'])
+        if len(subjects) == 0 and len(objects) == 0:
+            continue
+
+        passive = subjects[0][3] if len(subjects) > 0 else 0
+
+        subject_spans = [{'text': sentence_text[s[1][0]:s[1][1]], 'span': list(s[1])} for s in subjects]
+        object_spans = [{'text': sentence_text[o[1][0]:o[1][1]], 'span': list(o[1])} for o in objects]
+
+        for lu_id in match['targets']:
+            if lu_id not in lu_index:
+                continue
+            information = lu_index[lu_id]
+            annotations.append({'verb': information[0],
+                                'lu_id': lu_id,
+                                'frame': information[4],
+                                'passive': passive,
+                                'agent': subject_spans if passive == 0 else object_spans,
+                                'theme': object_spans if passive == 0 else subject_spans,
+                                'agent_fes': sorted(fe for fe in information[2] if fe != 'CF_Agent'),
+                                'theme_fes': sorted(fe for fe in information[3] if fe != 'CF_Theme'),
+                                'connotation_frame': information[6]})
+
+    if len(annotations) == 0:
+        return None
+
+    return {'sentence': sentence_text, 'annotations': annotations}
+
+
+def annotate_texts(nlp: object, texts: object, role_mapping: dict, approach: str = 'short', batch_size: int = 256,
+                   n_process: int = 1) -> object:
+    """Annotates a stream of texts with the agents, themes and Connotation Frames of all mapped verbs.
+
+    The texts are parsed in batches via nlp.pipe. As both the input and the output are generators, only one batch of
+    Docs is in memory at a time, regardless of the size of the corpus.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param texts: Iterable. The texts (strings) to be annotated.
+    :param role_mapping: Dictionary. The finished dictionary with all LUs, role mappings, connotation frames etc.
+    :param approach: String. The approach of the detection methods: 'naive', 'short' or 'long'.
+    :param batch_size: Integer. Amount of texts which are parsed in one batch.
+    :param n_process: Integer. Amount of processes used for parsing.
+    :return: Generator. Yields one dictionary per annotated sentence (see annotate_sentence).
+    """
+    lu_index = index_role_mapping(role_mapping)
+    trie = annotation_trie(lu_index)
+
+    for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+        for sent in doc.sents:
+            annotation = annotate_sentence(nlp, sent.as_doc(), lu_index, approach, trie)
+            if annotation is not None:
+                yield annotation
+
+
+def write_jsonl(annotations: object, output: object) -> int:
+    """Writes annotations as JSON lines into a text file object.
+
+    :param annotations: Iterable. The annotations to be written (dictionaries).
+    :param output: Object. Text file object to write to.
+    :return: Integer. Amount of written lines.
+    """
+    count = 0
+    for annotation in annotations:
+        output.write(json.dumps(annotation, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotates raw text with mapped Connotation Frames as JSONL.')
+    parser.add_argument('inputs', nargs='*', default=['-'], help="Text files ('.gz' allowed, '-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="Output file ('-' for stdout)")
+    parser.add_argument('-a', '--approach', default='short', choices=sorted(map.DETECTORS))
+    parser.add_argument('-b', '--batch-size', type=int, default=256)
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    nlp = en_core_web_sm.load()
+    role_mapping = load_obj(map.ROLE_MAPPING_FILES[args.approach])
+
+    annotations = annotate_texts(nlp, read_texts(args.inputs), role_mapping, args.approach, args.batch_size,
+                                 args.processes)
+
+    if args.output == '-':
+        write_jsonl(annotations, sys.stdout)
+    else:
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            write_jsonl(annotations, f)
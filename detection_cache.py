@@ -0,0 +1,228 @@
+from collections import OrderedDict
+import atexit
+import hashlib
+import os
+import pickle
+import sqlite3
+import warnings
+import profiling
+
+
+# Bounded in-memory tier: {key: detection result}, least recently used entries are dropped first
+_memory = OrderedDict()
+_max_size = 100000
+
+# Optional on-disk tier (SQLite). Can be configured with the environment variable CF_DETECTION_CACHE or configure()
+_disk = None
+
+# New results which are not written to the on-disk tier yet: {key: detection result}. They are written in one short
+# transaction once COMMIT_EVERY results are pending, so several processes can share the on-disk tier without holding
+# its write lock while they parse.
+_pending = OrderedDict()
+COMMIT_EVERY = 1000
+
+# Pickle protocol of the results in the on-disk tier. It is pinned (instead of HIGHEST_PROTOCOL), so workers running
+# different Python versions can share the on-disk tier.
+CACHE_PROTOCOL = 4
+
+STATISTICS = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'write_errors': 0}
+
+
+def configure(max_size: int = 100000, disk_path: str = None) -> None:
+    """Configures the size of the in-memory tier and (optionally) the path of the on-disk tier.
+
+    :param max_size: Integer. Maximum amount of detection results kept in memory.
+    :param disk_path: String. Path to the SQLite file of the on-disk tier. None disables the on-disk tier.
+    :return: None.
+    """
+    global _max_size, _disk
+    _max_size = max_size
+    while len(_memory) > _max_size:
+        _memory.popitem(last=False)
+
+    if _disk is not None:
+        flush()
+        _disk.close()
+        _disk = None
+
+    if disk_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+        _disk = sqlite3.connect(disk_path, timeout=10)
+        try:
+            # Write-ahead log: readers are not blocked by the (short) write transactions of other processes
+            _disk.execute('PRAGMA journal_mode=WAL')
+            with _disk:
+                _disk.execute('CREATE TABLE IF NOT EXISTS detections (key TEXT PRIMARY KEY, result BLOB)')
+        except sqlite3.Error as error:
+            warnings.warn('Detection cache {} is not usable, only the in-memory tier is used: {}'.format(disk_path,
+                                                                                                      error))
+            _disk.close()
+            _disk = None
+
+
+def model_version(nlp: object) -> str:
+    """Returns a string identifying the language model, e.g. 'en_core_web_sm-3.7.1'.
+
+    :param nlp: Object. Preloaded Language Model.
+    :return: String. Name and version of the model.
+    """
+    meta = getattr(nlp, 'meta', {})
+    return '{}_{}-{}'.format(meta.get('lang', ''), meta.get('name', ''), meta.get('version', ''))
+
+
+def cache_key(nlp: object, detector: object, sentence, lu: str) -> str:
+    """Builds the cache key from the sentence hash, the LU lemma, the detection method and the model version.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param detector: Function. One of the detection methods, e.g. detect_subject_short_phrase.
+    :param sentence: String or Doc. The sentence.
+    :param lu: String. The Lexical Unit.
+    :return: String. The cache key.
+    """
+    text = sentence if isinstance(sentence, str) else sentence.text
+    sentence_hash = hashlib.sha1(text.encode('UTF-8')).hexdigest()
+    return '{}|{}|{}|{}'.format(sentence_hash, lu, detector.__name__, model_version(nlp))
+
+
+@profiling.profiled('detection')
+def detect(nlp: object, detector: object, sentence, lu: str) -> list:
+    """Returns the result of a detection method, running it only if it is neither in memory nor on disk.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param detector: Function. One of the detection methods, e.g. detect_subject_short_phrase.
+    :param sentence: String or Doc. The sentence.
+    :param lu: String. The Lexical Unit.
+    :return: List. The result of the detection method (see detect_subject).
+    """
+    key = cache_key(nlp, detector, sentence, lu)
+
+    if key in _memory:
+        _memory.move_to_end(key)
+        STATISTICS['hits'] += 1
+        return list(_memory[key])
+
+    result = _pending.get(key)
+    if result is None:
+        result = _read(key)
+        if result is not None:
+            STATISTICS['disk_hits'] += 1
+
+    if result is None:
+        result = detector(nlp, sentence, lu)
+        STATISTICS['misses'] += 1
+        if _disk is not None:
+            _pending[key] = result
+            if len(_pending) >= COMMIT_EVERY:
+                flush()
+
+    _memory[key] = result
+    if len(_memory) > _max_size:
+        _memory.popitem(last=False)
+
+    return list(result)
+
+
+def detect_all(nlp: object, detectors: list, sentence, lu: str) -> list:
+    """Returns the results of several detection methods for one sentence, parsing the sentence at most once.
+
+    Results which are already cached are not recomputed. If at least one result is missing, the sentence is parsed
+    once and the Doc is handed to all missing detection methods.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param detectors: List. Detection methods, e.g. [detect_subject, detect_object].
+    :param sentence: String or Doc. The sentence.
+    :param lu: String. The Lexical Unit.
+    :return: List. One detection result per detection method, in the same order.
+    """
+    if isinstance(sentence, str) and not is_cached(nlp, detectors, sentence, lu):
+        with profiling.stage('parsing'):
+            sentence = nlp(sentence)
+    return [detect(nlp, detector, sentence, lu) for detector in detectors]
+
+
+def is_cached(nlp: object, detectors: list, sentence, lu: str) -> bool:
+    """Checks whether the results of all given detection methods are cached (in memory or on disk), i.e. whether the
+    sentence does not have to be parsed.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param detectors: List. Detection methods, e.g. [detect_subject, detect_object].
+    :param sentence: String or Doc. The sentence.
+    :param lu: String. The Lexical Unit.
+    :return: Boolean. True if all results are cached.
+    """
+    keys = [key for key in (cache_key(nlp, detector, sentence, lu) for detector in detectors)
+            if key not in _memory and key not in _pending]
+    return all(_read(key) is not None for key in keys)
+
+
+def _read(key: str) -> list:
+    """Reads the result of a key from the on-disk tier. None if it is not there, the on-disk tier is not readable or
+    the stored result can not be decoded (the cache is optional, so this never fails - a broken entry is a miss)."""
+    if _disk is None:
+        return None
+    try:
+        row = _disk.execute('SELECT result FROM detections WHERE key = ?', (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+    try:
+        return pickle.loads(row[0])
+    except Exception:
+        return None
+
+
+def flush() -> None:
+    """Writes all pending results to the on-disk tier in one short transaction.
+
+    If the write fails (e.g. the database stays locked by another process), the pending results are dropped with a
+    warning and counted as 'write_errors' - a cache failure never aborts a mapping.
+
+    :return: None.
+    """
+    if _disk is None or len(_pending) == 0:
+        return
+    rows = [(key, pickle.dumps(result, CACHE_PROTOCOL)) for key, result in _pending.items()]
+    _pending.clear()
+    try:
+        with _disk:
+            _disk.executemany('INSERT OR REPLACE INTO detections VALUES (?, ?)', rows)
+    except sqlite3.Error as error:
+        STATISTICS['write_errors'] += len(rows)
+        warnings.warn('{} results could not be written to the detection cache: {}'.format(len(rows), error))
+
+
+def statistics() -> dict:
+    """Returns the hit/miss statistics of the cache.
+
+    :return: Dictionary. Looks like this: {'hits': 10, 'disk_hits': 5, 'misses': 2, 'write_errors': 0,
+    'hit_rate': 0.88, 'size': 12}
+    """
+    lookups = STATISTICS['hits'] + STATISTICS['disk_hits'] + STATISTICS['misses']
+    hit_rate = (STATISTICS['hits'] + STATISTICS['disk_hits']) / lookups if lookups > 0 else 0.0
+    return dict(STATISTICS, hit_rate=hit_rate, size=len(_memory))
+
+
+def release_memory() -> None:
+    """Empties the in-memory tier, e.g. when the memory budget of a mapping run is exceeded. The statistics and the
+    on-disk tier are kept.
+
+    :return: None.
+    """
+    _memory.clear()
+
+
+def clear() -> None:
+    """Empties the in-memory tier and resets the statistics. The on-disk tier is kept.
+
+    :return: None.
+    """
+    _memory.clear()
+    for key in STATISTICS:
+        STATISTICS[key] = 0
+
+
+if os.environ.get('CF_DETECTION_CACHE'):
+    configure(disk_path=os.environ['CF_DETECTION_CACHE'])
+
+atexit.register(flush)
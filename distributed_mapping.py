@@ -0,0 +1,359 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.serialization as serialization
+import role_counts
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+
+# Layout of a work queue directory (on a filesystem shared by all workers):
+# queue.json            approach and shard ids
+# tasks/<shard>.pkl     part of mapping_verb_lu_cfs, {('verb', lu id): CF}
+# leases/<shard>.lease  exists while a worker processes the shard; holds the worker's token, its mtime is the heartbeat
+# attempts/<shard>.json how often the shard was claimed
+# results/<shard>.pkl   role mapping of the shard, {lu id: [...]}
+# failed/<shard>.json   marks a shard which failed max_attempts times
+QUEUE_DIRECTORIES = ('tasks', 'leases', 'attempts', 'results', 'failed')
+
+
+def create_queue(queue_dir: str, mapping_verb_lu_cfs: dict, approach: str = 'short', shard_size: int = 50) -> list:
+    """Splits the LUs of the mapping into shards and writes them as work units to a queue directory.
+
+    :param queue_dir: String. Path to the queue directory (created if it does not exist).
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param shard_size: Integer. Amount of LUs per shard.
+    :return: List. The shard ids.
+    """
+    if approach not in ROLE_MAPPING_FILES:
+        raise ValueError("Unknown approach '{}'. Use one of {}".format(approach, sorted(ROLE_MAPPING_FILES)))
+    for directory in QUEUE_DIRECTORIES:
+        os.makedirs(os.path.join(queue_dir, directory), exist_ok=True)
+
+    keys = sorted(mapping_verb_lu_cfs, key=lambda key: key[1])  # Sorted by LU ID, so the shards are reproducible
+    shard_ids = []
+    for number, start in enumerate(range(0, len(keys), shard_size)):
+        shard_id = 'shard_{:05d}'.format(number)
+        save_obj({key: mapping_verb_lu_cfs[key] for key in keys[start:start + shard_size]}, shard_id,
+                 root=os.path.join(queue_dir, 'tasks'))
+        shard_ids.append(shard_id)
+
+    with open(os.path.join(queue_dir, 'queue.json'), 'w', encoding='UTF-8') as f:
+        json.dump({'approach': approach, 'shards': shard_ids}, f, indent=1)
+    return shard_ids
+
+
+def read_queue(queue_dir: str) -> dict:
+    """Reads the description of a queue: {'approach': 'short', 'shards': ['shard_00000', ...]}"""
+    with open(os.path.join(queue_dir, 'queue.json'), 'r', encoding='UTF-8') as f:
+        return json.load(f)
+
+
+def queue_file(queue_dir: str, directory: str, shard_id: str, extension: str) -> str:
+    """Returns the path of a file of a shard, e.g. queue_file(queue_dir, 'leases', 'shard_00001', '.lease')."""
+    return os.path.join(queue_dir, directory, shard_id + extension)
+
+
+def is_finished(queue_dir: str, shard_id: str) -> bool:
+    """Checks whether a shard has a result or has failed too often."""
+    return (os.path.exists(queue_file(queue_dir, 'results', shard_id, '.pkl'))
+            or os.path.exists(queue_file(queue_dir, 'failed', shard_id, '.json')))
+
+
+def lease_token(lease_path: str) -> str:
+    """Returns the token written into a lease file, None if the file is empty or half-written."""
+    with open(lease_path, 'r', encoding='UTF-8') as f:
+        try:
+            return json.load(f).get('token')
+        except ValueError:
+            return None
+
+
+def remove_lease(lease_path: str, expected_token: str, token: str, lease_timeout: float = None) -> bool:
+    """Removes a lease file only if it holds the expected token or, without an expected token, if it is expired.
+
+    The lease is renamed to a name of its own first (which only one worker can do) and the condition is checked on the
+    renamed file afterwards, so it can not refer to a lease which another worker created in the meantime. Otherwise
+    the lease is put back, so a worker never removes a lease it does not mean to. A lease without a readable token
+    (e.g. half-written) never matches an expected token.
+
+    :param lease_path: String. Path to the lease file.
+    :param expected_token: String. Token of the lease which is to be removed. None removes an expired lease.
+    :param token: String. Token of the calling worker (makes the temporary name unique).
+    :param lease_timeout: Float. Seconds without heartbeat after which a lease is expired (if expected_token is None).
+    :return: Boolean. True if the lease was removed.
+    """
+    own_path = '{}.{}.removed'.format(lease_path, token)
+    try:
+        os.rename(lease_path, own_path)
+    except FileNotFoundError:
+        return False
+    if expected_token is None:
+        remove = time.time() - os.path.getmtime(own_path) > lease_timeout  # Renaming keeps the heartbeat time
+    else:
+        remove = lease_token(own_path) == expected_token
+    if remove:
+        os.remove(own_path)
+        return True
+    try:
+        os.link(own_path, lease_path)  # Unlike rename, never replaces a lease which was created in the meantime
+    except FileExistsError:
+        pass
+    os.remove(own_path)
+    return False
+
+
+def claim(queue_dir: str, shard_id: str, worker_id: str, lease_timeout: float) -> str:
+    """Tries to take the lease of a shard.
+
+    The lease file is created exclusively, so only one worker can hold it, and holds a token which is unique to this
+    claim. A lease whose heartbeat is older than lease_timeout belongs to a dead worker; it is removed and claimed
+    again. Whether it is expired is checked again after it was renamed (see remove_lease), so a worker never removes
+    a lease which another worker has taken over in the meantime, and of several workers only one succeeds.
+
+    :param queue_dir: String. Path to the queue directory.
+    :param shard_id: String. The shard.
+    :param worker_id: String. Identifies the worker in the lease file.
+    :param lease_timeout: Float. Seconds without heartbeat after which a lease is considered expired.
+    :return: String. The token of the lease if the worker holds it now, None otherwise.
+    """
+    lease_path = queue_file(queue_dir, 'leases', shard_id, '.lease')
+    token = '{}-{}'.format(worker_id, uuid.uuid4().hex)
+
+    try:
+        if time.time() - os.path.getmtime(lease_path) > lease_timeout:
+            remove_lease(lease_path, None, token, lease_timeout)
+    except FileNotFoundError:  # No lease or another worker removed the expired lease first
+        pass
+
+    try:
+        file_descriptor = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(file_descriptor, 'w', encoding='UTF-8') as f:
+        json.dump({'worker': worker_id, 'token': token, 'claimed': time.time()}, f)
+
+    if is_finished(queue_dir, shard_id):  # Finished after the caller checked it
+        release(queue_dir, shard_id, token)
+        return None
+    return token
+
+
+def release(queue_dir: str, shard_id: str, token: str) -> None:
+    """Removes the lease of a shard if it is still the one claimed with the token (see claim)."""
+    remove_lease(queue_file(queue_dir, 'leases', shard_id, '.lease'), token, token)
+
+
+def count_attempt(queue_dir: str, shard_id: str) -> int:
+    """Increments and returns the amount of attempts of a shard. Must only be called while holding its lease."""
+    path = queue_file(queue_dir, 'attempts', shard_id, '.json')
+    attempts = 0
+    if os.path.exists(path):
+        with open(path, 'r', encoding='UTF-8') as f:
+            attempts = json.load(f)['attempts']
+    with open(path + '.tmp', 'w', encoding='UTF-8') as f:
+        json.dump({'attempts': attempts + 1}, f)
+    os.replace(path + '.tmp', path)
+    return attempts + 1
+
+
+def keep_alive(lease_path: str, token: str, interval: float, stop: threading.Event) -> None:
+    """Touches the lease file every interval seconds until stop is set, as long as it holds the worker's token. Runs in
+    a background thread of the worker."""
+    while not stop.wait(interval):
+        try:
+            if lease_token(lease_path) == token:
+                os.utime(lease_path)
+        except FileNotFoundError:  # Renamed for a moment by another worker checking its token (see remove_lease)
+            pass
+
+
+def mapping_process(approach: str, worker_id: str) -> object:
+    """Returns a function which computes the role mapping of one shard with the language model and the detection cache.
+
+    Every worker has a detection cache file of its own (obj/detection_cache_<worker id>.sqlite), as SQLite files must
+    not be shared over a network filesystem. A fixed --worker-id reuses it in later runs.
+
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param worker_id: String. Name of the worker.
+    :return: Function. Takes a part of mapping_verb_lu_cfs and returns its role mapping.
+    """
+    import framenet_connotationframes_mapping as map
+    import detection_cache
+    import en_core_web_sm
+
+    nlp = en_core_web_sm.load()
+    if os.environ.get('CF_DETECTION_CACHE') is None:
+        detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT,
+                                                         'detection_cache_{}.sqlite'.format(worker_id)))
+
+    def process(shard: dict) -> dict:
+        result = map.MAPPING_FUNCTIONS[approach](nlp, shard)
+        detection_cache.flush()
+        return result
+
+    return process
+
+
+def run_worker(queue_dir: str, worker_id: str = None, lease_timeout: float = 600, max_attempts: int = 3,
+               poll_interval: float = 5, process: object = None) -> list:
+    """Processes shards of a queue until every shard has a result or has failed.
+
+    A shard whose result already exists is never processed again, and the result is written atomically, so running a
+    shard twice (e.g. after a lease expired too early) does not change the outcome. While other workers hold the
+    remaining leases, the worker waits and takes over shards whose lease expires.
+
+    :param queue_dir: String. Path to the queue directory.
+    :param worker_id: String. Name of the worker. Default: hostname and process id.
+    :param lease_timeout: Float. Seconds without heartbeat after which a lease is considered expired.
+    :param max_attempts: Integer. Amount of attempts per shard before it is marked as failed.
+    :param poll_interval: Float. Seconds to wait while all remaining shards are leased by other workers.
+    :param process: Function. Computes the role mapping of a shard. Default: the mapping of the queue's approach.
+    :return: List. The shard ids processed by this worker.
+    """
+    worker_id = worker_id or '{}-{}'.format(socket.gethostname(), os.getpid())
+    queue = read_queue(queue_dir)
+    processed = []
+
+    while True:
+        remaining = [shard_id for shard_id in queue['shards'] if not is_finished(queue_dir, shard_id)]
+        if len(remaining) == 0:
+            return processed
+
+        claimed = None
+        for shard_id in remaining:
+            token = claim(queue_dir, shard_id, worker_id, lease_timeout)
+            if token is not None:
+                claimed = shard_id
+                break
+        if claimed is None:
+            time.sleep(poll_interval)
+            continue
+
+        attempt = count_attempt(queue_dir, claimed)
+        if attempt > max_attempts:
+            with open(queue_file(queue_dir, 'failed', claimed, '.json'), 'w', encoding='UTF-8') as f:
+                json.dump({'attempts': attempt - 1, 'worker': worker_id}, f)
+            release(queue_dir, claimed, token)
+            continue
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_alive, daemon=True,
+                                     args=(queue_file(queue_dir, 'leases', claimed, '.lease'), token, lease_timeout / 3,
+                                           stop))
+        heartbeat.start()
+        try:
+            if process is None:
+                process = mapping_process(queue['approach'], worker_id)
+            print('[{}] {} (attempt {})'.format(worker_id, claimed, attempt))
+            result = process(load_obj(claimed, root=os.path.join(queue_dir, 'tasks')))
+            save_obj(result, claimed, root=os.path.join(queue_dir, 'results'))
+            processed.append(claimed)
+        except Exception as exception:  # The shard is retried by this or another worker
+            print('[{}] {} failed: {!r}'.format(worker_id, claimed, exception))
+        finally:
+            stop.set()
+            heartbeat.join()
+            release(queue_dir, claimed, token)
+
+
+def queue_status(queue_dir: str) -> dict:
+    """Counts the shards of a queue by state.
+
+    :param queue_dir: String. Path to the queue directory.
+    :return: Dictionary. Looks like this: {'shards': 20, 'done': 12, 'leased': 3, 'failed': 0, 'pending': 5}
+    """
+    shard_ids = read_queue(queue_dir)['shards']
+    done = sum(os.path.exists(queue_file(queue_dir, 'results', shard_id, '.pkl')) for shard_id in shard_ids)
+    failed = sum(os.path.exists(queue_file(queue_dir, 'failed', shard_id, '.json')) for shard_id in shard_ids)
+    leased = sum(os.path.exists(queue_file(queue_dir, 'leases', shard_id, '.lease')) and
+                 not is_finished(queue_dir, shard_id) for shard_id in shard_ids)
+    return {'shards': len(shard_ids), 'done': done, 'leased': leased, 'failed': failed,
+            'pending': len(shard_ids) - done - failed - leased}
+
+
+def merge_results(queue_dir: str, allow_partial: bool = False) -> dict:
+    """Assembles the role mapping {lu id: [...]} from the result shards of a queue.
+
+    :param queue_dir: String. Path to the queue directory.
+    :param allow_partial: Boolean. If False, a ValueError is raised if a shard has no result.
+    :return: Dictionary. The role mapping of all (finished) shards.
+    """
+    mapping = {}
+    missing = []
+    for shard_id in read_queue(queue_dir)['shards']:
+        if not os.path.exists(queue_file(queue_dir, 'results', shard_id, '.pkl')):
+            missing.append(shard_id)
+            continue
+        mapping.update(load_obj(shard_id, root=os.path.join(queue_dir, 'results')))
+
+    if len(missing) > 0 and not allow_partial:
+        raise ValueError('{} shards have no result: {}'.format(len(missing), ', '.join(missing)))
+    return mapping
+
+
+def run_local(queue_dir: str, workers: int = 4, lease_timeout: float = 600, max_attempts: int = 3) -> list:
+    """Launches several worker processes on this machine against a queue and waits for them.
+
+    :param queue_dir: String. Path to the queue directory.
+    :param workers: Integer. Amount of worker processes.
+    :param lease_timeout: Float. Seconds without heartbeat after which a lease is considered expired.
+    :param max_attempts: Integer. Amount of attempts per shard before it is marked as failed.
+    :return: List. The exit codes of the workers.
+    """
+    command = [sys.executable, os.path.abspath(__file__), 'worker', queue_dir,
+               '--lease-timeout', str(lease_timeout), '--max-attempts', str(max_attempts)]
+    processes = [subprocess.Popen(command + ['--worker-id', 'local-{}'.format(number)]) for number in range(workers)]
+    return [worker.wait() for worker in processes]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed role mapping via a work queue on a shared filesystem.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('create', help='Writes the LUs of obj/mapping_verb_lu_cfs.pkl as shards')
+    create_parser.add_argument('queue_dir')
+    create_parser.add_argument('--approach', default='short', choices=sorted(ROLE_MAPPING_FILES))
+    create_parser.add_argument('--shard-size', type=int, default=50)
+
+    for name, help_text in (('worker', 'Processes shards until the queue is finished'),
+                            ('local', 'Launches several workers on this machine and merges the results')):
+        worker_parser = subparsers.add_parser(name, help=help_text)
+        worker_parser.add_argument('queue_dir')
+        worker_parser.add_argument('--worker-id')
+        worker_parser.add_argument('--lease-timeout', type=float, default=600)
+        worker_parser.add_argument('--max-attempts', type=int, default=3)
+        worker_parser.add_argument('--workers', type=int, default=4)
+
+    status_parser = subparsers.add_parser('status', help='Prints the amount of done, leased, failed and pending shards')
+    status_parser.add_argument('queue_dir')
+
+    merge_parser = subparsers.add_parser('merge', help='Saves the merged role mapping in the artifact directory')
+    merge_parser.add_argument('queue_dir')
+    merge_parser.add_argument('--allow-partial', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        print(len(create_queue(args.queue_dir, load_obj('mapping_verb_lu_cfs'), args.approach, args.shard_size)),
+              'shards')
+    elif args.command == 'worker':
+        run_worker(args.queue_dir, args.worker_id, args.lease_timeout, args.max_attempts)
+    elif args.command == 'status':
+        print(queue_status(args.queue_dir))
+    else:
+        if args.command == 'local':
+            run_local(args.queue_dir, args.workers, args.lease_timeout, args.max_attempts)
+            print(queue_status(args.queue_dir))
+        approach = read_queue(args.queue_dir)['approach']
+        role_mapping = merge_results(args.queue_dir, getattr(args, 'allow_partial', False))
+        save_obj(role_mapping, ROLE_MAPPING_FILES[approach])
+        save_obj(role_counts.count_matrices(role_mapping), ROLE_MAPPING_FILES[approach] + '_counts')
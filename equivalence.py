@@ -0,0 +1,255 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.framenet_store as fn
+import framenet_connotationframes_mapping as map
+import detection_cache
+import profiling
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import ast
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import sys
+
+
+# One-sentence mapping of an earlier version of this work: ['verb', lu id, ('Agent', 'FE'), ('Theme', 'FE'), CF, sentence]
+SENTENCE_REFERENCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'nonambiguous_mapping.txt')
+
+_nlp = None  # Language Model of a worker process (see load_model)
+
+
+def load_model() -> None:
+    """Initializer of the worker processes: loads the Language Model and uses an empty in-memory detection cache, so
+    that the legacy detections are computed and not read from an on-disk cache of an older version."""
+    global _nlp
+    import en_core_web_sm
+    _nlp = en_core_web_sm.load()
+    detection_cache.configure(disk_path=None)
+
+
+def resolve(name: str) -> object:
+    """Imports a function given as 'module:function', e.g. 'framenet_connotationframes_mapping:detect_subject'."""
+    module, function = name.split(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def candidate_mapping(approach: str, candidate: str = 'batched', detectors: tuple = None) -> object:
+    """Returns the optimized role mapping method which is compared with the legacy method of the approach.
+
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param candidate: String. 'batched' (map_cf_roles_and_fes_batched), 'pipelined' (map_cf_roles_and_fes_pipelined)
+    or a role mapping method as 'module:function' which takes the Language Model and the LU - CF mapping like
+    map_cf_roles_and_fes_short_phrase_all_sents.
+    :param detectors: Tuple. Subject and object detection method used by 'batched' and 'pipelined'. Default: those of
+    the approach.
+    :return: Function. Takes the Language Model and the LU - CF mapping, returns a role mapping.
+    """
+    if candidate == 'batched':
+        return functools.partial(map.map_cf_roles_and_fes_batched, approach=approach, detectors=detectors)
+    if candidate == 'pipelined':
+        import pipelined_mapping
+        return functools.partial(pipelined_mapping.map_cf_roles_and_fes_pipelined, approach=approach,
+                                 detectors=detectors)
+    return resolve(candidate)
+
+
+def diff_entries(expected: list, actual: list) -> dict:
+    """Compares the role mapping entries of one LU.
+
+    The returned dictionary only contains the differences, e.g.
+    {'agent_missing': ['FE'], 'agent_extra': [], 'theme_missing': [], 'theme_extra': ['FE'], 'passive': [2, 1]}
+    'mapped' is given if only one of the entries has a mapping, 'counts' if the Frame Element counts differ.
+
+    :param expected: List. Role mapping entry of the reference (or the legacy method). None if the LU is missing.
+    :param actual: List. Role mapping entry of the compared method. None if the LU is missing.
+    :return: Dictionary. The differences; empty if the entries are equal.
+    """
+    expected_mapped = expected is not None and len(expected) > 4
+    actual_mapped = actual is not None and len(actual) > 4
+    if not expected_mapped or not actual_mapped:
+        return {} if expected_mapped == actual_mapped else {'mapped': [expected_mapped, actual_mapped]}
+
+    diff = {}
+    for role, index in (('agent', 2), ('theme', 3)):
+        missing = sorted(set(expected[index]) - set(actual[index]))
+        extra = sorted(set(actual[index]) - set(expected[index]))
+        if len(missing) + len(extra) > 0:
+            diff[role + '_missing'] = missing
+            diff[role + '_extra'] = extra
+    if expected[5] != actual[5]:
+        diff['passive'] = [expected[5], actual[5]]
+    if len(expected) > 7 and len(actual) > 7 and expected[7] != actual[7]:
+        diff['counts'] = [expected[7], actual[7]]
+    return diff
+
+
+def load_sentence_reference(path: str = SENTENCE_REFERENCE) -> dict:
+    """Reads the one-sentence mapping (data/nonambiguous_mapping.txt). LUs without a mapping are left out.
+
+    :param path: String. Path to the file.
+    :return: Dictionary. Keys are LU IDs, values look like this: {'verb': 'seem', 'agent': {'CF_Agent', 'FE'},
+    'theme': {'CF_Theme', 'FE'}, 'sentence': 'It seems ...'}
+    """
+    reference = {}
+    with open(path, 'r', encoding='UTF-8') as f:
+        for line in f:
+            entry = ast.literal_eval(line)
+            roles = [value for value in entry if isinstance(value, tuple)]
+            if len(roles) != 2:
+                continue
+            reference[entry[1]] = {'verb': entry[0], 'sentence': entry[-1],
+                                   'agent': {'CF_Agent'} | set(roles[0][1:]), 'theme': {'CF_Theme'} | set(roles[1][1:])}
+    return reference
+
+
+def map_sentence(nlp: object, doc: object, lu_text: str, fes: list, approach: str, detectors: tuple) -> dict:
+    """Maps the roles within one sentence. Returns {'agent': {...}, 'theme': {...}, 'passive': 0}."""
+    agents, themes, passive = map.align_roles(detectors[0](nlp, doc, lu_text), detectors[1](nlp, doc, lu_text), fes,
+                                              approach)
+    return {'agent': {'CF_Agent'} | set(agents), 'theme': {'CF_Theme'} | set(themes), 'passive': passive}
+
+
+def compare_sentence(nlp: object, lu_id: int, reference: dict, approach: str, detectors: tuple = None) -> dict:
+    """Compares the one-sentence reference of an LU with the mapping of the legacy and the candidate detection methods
+    on the same sentence.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_id: Integer. The LU ID.
+    :param reference: Dictionary. Entry of load_sentence_reference.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param detectors: Tuple. Candidate subject and object detection method (None compares only the legacy ones).
+    :return: Dictionary. {'legacy': diff to the reference, 'candidate': diff to the legacy mapping}; None if the
+    sentence is not among the exemplars of the LU anymore.
+    """
+    examples = [example for example in fn.lu(lu_id).exemplars if example.text.strip() == reference['sentence'].strip()]
+    if len(examples) == 0:
+        return None
+    doc = nlp(examples[0].text)
+    fes = examples[0].frameAnnotation.FE[0]
+    legacy = map_sentence(nlp, doc, reference['verb'], fes, approach, map.DETECTORS[approach])
+
+    result = {'legacy': {role + '_' + kind: sorted(values) for role in ('agent', 'theme')
+                         for kind, values in (('missing', reference[role] - legacy[role]),
+                                              ('extra', legacy[role] - reference[role])) if len(values) > 0}}
+    if detectors is not None:
+        candidate = map_sentence(nlp, doc, reference['verb'], fes, approach, detectors)
+        result['candidate'] = {key: [legacy[key], candidate[key]] for key in legacy if legacy[key] != candidate[key]}
+    return result
+
+
+def compare_lus(items: list, approach: str, candidate: str = 'batched', detectors: list = None,
+                reference: dict = None, sentence_reference: dict = None) -> list:
+    """Runs the legacy and the candidate role mapping on some LUs and compares them with each other and the reference.
+
+    This is done in the worker processes (see run_equivalence). The output of the legacy methods is suppressed.
+
+    :param items: List. Tuples of ((verb, lu id), CF) of the LU - CF mapping.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param candidate: String. See candidate_mapping.
+    :param detectors: List. Candidate subject and object detection method as 'module:function'. None: the legacy ones.
+    :param reference: Dictionary. The saved role mapping of the approach (golden output). None skips the comparison.
+    :param sentence_reference: Dictionary. Output of load_sentence_reference. None skips the comparison.
+    :return: List. One result per LU: {'lu_id': 123, 'verb': 'verb', 'candidate': diff legacy -> candidate,
+    'reference': diff reference -> legacy, 'sentence': see compare_sentence}
+    """
+    nlp = _nlp
+    detector_functions = tuple(resolve(name) for name in detectors) if detectors is not None else None
+    mapping_verb_lu_cfs = dict(items)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        legacy = map.MAPPING_FUNCTIONS[approach](nlp, mapping_verb_lu_cfs)
+    optimized = candidate_mapping(approach, candidate, detector_functions)(nlp, mapping_verb_lu_cfs)
+
+    results = []
+    for (verb, lu_id), _ in items:
+        result = {'lu_id': lu_id, 'verb': verb, 'candidate': diff_entries(legacy.get(lu_id), optimized.get(lu_id))}
+        if reference is not None:
+            result['reference'] = diff_entries(reference.get(lu_id), legacy.get(lu_id))
+        if sentence_reference is not None and lu_id in sentence_reference:
+            result['sentence'] = compare_sentence(nlp, lu_id, sentence_reference[lu_id], approach, detector_functions)
+        results.append(result)
+    return results
+
+
+def run_equivalence(mapping_verb_lu_cfs: dict, approach: str, candidate: str = 'batched', detectors: list = None,
+                    reference: dict = None, sentence_reference: dict = None, jobs: int = 4,
+                    chunk_size: int = 10) -> list:
+    """Compares the legacy and the candidate role mapping of an approach on all given LUs, in parallel across LUs.
+
+    :param mapping_verb_lu_cfs: Dictionary. The shared fixture: keys are a tuple containing verb and lu id, values are
+    the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param candidate: String. See candidate_mapping.
+    :param detectors: List. Candidate subject and object detection method as 'module:function'.
+    :param reference: Dictionary. The saved role mapping of the approach (golden output).
+    :param sentence_reference: Dictionary. Output of load_sentence_reference.
+    :param jobs: Integer. Amount of worker processes.
+    :param chunk_size: Integer. Amount of LUs per task.
+    :return: List. One result per LU (see compare_lus), in the order of the fixture.
+    """
+    items = list(mapping_verb_lu_cfs.items())
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+    def task_reference(chunk: list, full: dict) -> dict:
+        return {lu_id: full[lu_id] for (_, lu_id), _ in chunk if lu_id in full} if full is not None else None
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=load_model) as executor:
+        futures = [executor.submit(compare_lus, chunk, approach, candidate, detectors,
+                                   task_reference(chunk, reference), task_reference(chunk, sentence_reference))
+                   for chunk in chunks]
+        return [result for future in futures for result in future.result()]
+
+
+def summarize(results: list) -> dict:
+    """Counts the LUs with differences: {'lus': 283, 'candidate': 0, 'reference': 3, 'sentence': 12}"""
+    summary = {'lus': len(results)}
+    for key in ('candidate', 'reference'):
+        summary[key] = sum(1 for result in results if len(result.get(key) or {}) > 0)
+    summary['sentence'] = sum(1 for result in results if result.get('sentence') is not None
+                              and any(len(diff) > 0 for diff in result['sentence'].values()))
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that an optimized role mapping returns the same results as '
+                                                 'the legacy role mapping and the saved golden outputs.')
+    parser.add_argument('--approaches', nargs='+', default=sorted(ROLE_MAPPING_FILES),
+                        choices=sorted(ROLE_MAPPING_FILES))
+    parser.add_argument('--candidate', default='batched',
+                        help="'batched', 'pipelined' or a role mapping method as module:function (default: batched)")
+    parser.add_argument('--detectors', nargs=2, metavar=('SUBJECT', 'OBJECT'),
+                        help='Candidate detection methods as module:function (default: those of the approach)')
+    parser.add_argument('--lus', nargs='+', type=int, help='LU IDs to be compared (default: all)')
+    parser.add_argument('--limit', type=int, help='Compares only the first N LUs of the fixture')
+    parser.add_argument('--no-reference', action='store_true', help='Skips the comparison with the saved outputs')
+    parser.add_argument('--report', default='equivalence_report.jsonl', help='Per-LU results (JSON lines)')
+    parser.add_argument('-j', '--jobs', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=10)
+    args = parser.parse_args()
+    profiling.start('equivalence')
+
+    fixture = {key: value for key, value in load_obj('mapping_verb_lu_cfs').items()
+               if args.lus is None or key[1] in args.lus}
+    if args.limit is not None:
+        fixture = dict(list(fixture.items())[:args.limit])
+    sentences = None if args.no_reference else load_sentence_reference()
+
+    differences = 0
+    with open(args.report, 'w', encoding='UTF-8') as report:
+        for approach_name in args.approaches:
+            golden = None if args.no_reference else load_obj(ROLE_MAPPING_FILES[approach_name])
+            approach_results = run_equivalence(fixture, approach_name, args.candidate, args.detectors, golden,
+                                               sentences, args.jobs, args.chunk_size)
+            for approach_result in approach_results:
+                if any(approach_result.get(key) for key in ('candidate', 'reference', 'sentence')):
+                    report.write(json.dumps(dict(approach_result, approach=approach_name), ensure_ascii=False,
+                                            default=sorted) + '\n')
+            approach_summary = summarize(approach_results)
+            differences += approach_summary['candidate']
+            print(approach_name, approach_summary)
+
+    sys.exit(1 if differences > 0 else 0)
@@ -1,8 +1,11 @@
 import preprocessing.framenet_preprocessing as fn_pre
-from nltk.corpus import framenet as fn
+import preprocessing.framenet_store as fn
 from preprocessing.serialization import load_obj
 from preprocessing.serialization import save_obj
 import framenet_connotationframes_mapping as map
+import preprocessing.serialization as serialization
+import detection_cache
+import profiling
 import en_core_web_sm
 import random
 import os
@@ -28,9 +31,9 @@ def show_mapping_for_one_verb_naive(nlp: object, lu_id: str, lu_text: str) -> li
             sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
             fes = example.frameAnnotation.FE[0]
 
-            logical_subject = map.detect_subject(nlp, sentence, lu_text)  # looks like this:
-            # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-            logical_object = map.detect_object(nlp, sentence, lu_text)  # same as above.
+            logical_subject, logical_object = detection_cache.detect_all(nlp, map.DETECTORS['naive'], sentence, lu_text)
+            # both look like this: ["subject", (position start, position end), "head", 0] (0 means False for passive
+            # boolean; so 0 is active). The sentence is parsed at most once for both detections.
 
             # subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -98,9 +101,9 @@ def show_mapping_for_one_verb_short(nlp: object, lu_id: str, lu_text: str) -> li
             sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
             fes = example.frameAnnotation.FE[0]
 
-            logical_subject = map.detect_subject_short_phrase(nlp, sentence, lu_text)  # looks like this:
-            # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-            logical_object = map.detect_object_short_phrase(nlp, sentence, lu_text)  # same as above.
+            logical_subject, logical_object = detection_cache.detect_all(nlp, map.DETECTORS['short'], sentence, lu_text)
+            # both look like this: ["subject", (position start, position end), "head", 0] (0 means False for passive
+            # boolean; so 0 is active). The sentence is parsed at most once for both detections.
 
             subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -163,9 +166,9 @@ def show_mapping_for_one_verb_long(nlp: object, lu_id: str, lu_text: str) -> Non
             sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
             fes = example.frameAnnotation.FE[0]
 
-            logical_subject = map.detect_subject_long_phrase(nlp, sentence, lu_text)  # looks like this:
-            # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-            logical_object = map.detect_object_long_phrase(nlp, sentence, lu_text)  # same as above.
+            logical_subject, logical_object = detection_cache.detect_all(nlp, map.DETECTORS['long'], sentence, lu_text)
+            # both look like this: ["subject", (position start, position end), "head", 0] (0 means False for passive
+            # boolean; so 0 is active). The sentence is parsed at most once for both detections.
 
             subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -206,6 +209,32 @@ def show_mapping_for_one_verb_long(nlp: object, lu_id: str, lu_text: str) -> Non
         print("No examples found; no mapping possible.\n")
 
 
+def evaluation_sentences(examples: list, agent_mapping: set, theme_mapping: set, amount: int = 2) -> list:
+    """Selects the sentences of an LU which are shown in the evaluation: the first sentences which contain both a Frame
+    Element mapped to the agent role and one mapped to the theme role (like in map_evaluation and cf_evaluation).
+
+    One entry of the returned list looks like this:
+    {'sentence': 'text', 'agent': ["Frame Element -> 'text'", ...], 'theme': ["Frame Element -> 'text'", ...]}
+
+    :param examples: List. The exemplars of the LU.
+    :param agent_mapping: Set. Frame Elements mapped to the agent role.
+    :param theme_mapping: Set. Frame Elements mapped to the theme role.
+    :param amount: Integer. Maximum amount of sentences.
+    :return: List. The selected sentences with the Frame Elements found for each role.
+    """
+    selected = []
+    for example in examples:
+        if len(selected) == amount:
+            break
+        sentence = example.text
+        fes = example.frameAnnotation.FE[0]  # one entry looks like this: (start pos, end pos, 'Frame Element name')
+        agent = ["{} -> '{}'".format(fe[2], sentence[fe[0]:fe[1]]) for fe in fes if fe[2] in agent_mapping]
+        theme = ["{} -> '{}'".format(fe[2], sentence[fe[0]:fe[1]]) for fe in fes if fe[2] in theme_mapping]
+        if len(agent) > 0 and len(theme) > 0:
+            selected.append({'sentence': sentence, 'agent': agent, 'theme': theme})
+    return selected
+
+
 def map_evaluation(role_mapping: dict, approach: str, eval_list: list) -> None:
     """The interactive evaluation programm for evaluating the role mapping from a technical view.
 
@@ -638,7 +667,7 @@ def pick_lus_for_evaluation(nlp: object, role_mapping: dict) -> list:
                 usable_sentence_count += 1
 
             # passive case checking:
-            subject = map.detect_subject(nlp, sentence, lu_text)
+            subject = detection_cache.detect(nlp, map.detect_subject, sentence, lu_text)
             passive = subject[3] if len(subject) == 4 else 0
             passive_cases_this_sent += passive  # 'passive' is an integer 0 or 1
 
@@ -656,10 +685,12 @@ def pick_lus_for_evaluation(nlp: object, role_mapping: dict) -> list:
 
 
 if __name__ == '__main__':
+    profiling.start('evaluation')
     nlp = en_core_web_sm.load()
-    role_mapping_short = load_obj("role_mapping_nonamb_lus_short_phrases_all_sents")
-    role_mapping_long = load_obj("role_mapping_nonamb_lus_long_phrases_all_sents")
-    role_mapping_naive = load_obj("role_mapping_nonamb_naive_all_sents")
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
+    role_mapping_short = load_obj(map.ROLE_MAPPING_FILES['short'])
+    role_mapping_long = load_obj(map.ROLE_MAPPING_FILES['long'])
+    role_mapping_naive = load_obj(map.ROLE_MAPPING_FILES['naive'])
 
     picked_lus = pick_lus_for_evaluation(nlp, role_mapping_short)
     # print(picked_lus)
@@ -0,0 +1,315 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import lookup_service
+import argparse
+import asyncio
+import functools
+import json
+import os
+import pickle
+import re
+import sqlite3
+from urllib.parse import unquote, parse_qs
+
+
+# The Connotation Frame features which are rated in the evaluation
+CF_FEATURES = ('Perspective(writer->agent)', 'Perspective(writer->theme)', 'Perspective(agent->theme)',
+               'Perspective(theme->agent)', 'Value(theme)')
+
+MAP_ANSWERS = ('y', 'n', '-', '?')
+CF_ANSWERS = ('-2', '-1', '0', '1', '2', '?')
+
+# The evaluation tasks: one role mapping evaluation per approach and the Connotation Frame evaluation
+TASKS = tuple('map_' + approach for approach in ROLE_MAPPING_FILES) + ('cf',)
+
+# Annotator names become part of file names
+ANNOTATOR_PATTERN = re.compile(r'^[a-z0-9_-]+$')
+
+# Annotators of the committed evaluation files (eval/<name>_..._eval.pkl) which the statistics of the thesis are
+# computed from; their files must never be overwritten by an export
+GOLD_ANNOTATORS = ('sina', 'lschmidt')
+
+
+def build_items(role_mappings: dict, eval_list: list, amount: int = 2) -> dict:
+    """Precomputes the items of all evaluation tasks, so no FrameNet lookup is needed while annotators are served.
+
+    One item looks like this:
+    {'lu_id': 123, 'lu_text': 'verb', 'frame': 'Frame', 'connotation_frame': {feature: 'original value'},
+     'sentences': [{'sentence': 'text', 'agent': ["FE -> 'text'"], 'theme': ["FE -> 'text'"]}, ...]}
+    Like in map_evaluation and cf_evaluation, LUs without a proper mapping are skipped. The Connotation Frame
+    evaluation uses the sentences of the short phrase mapping.
+
+    :param role_mappings: Dictionary. Keys are the approaches ('naive', 'short', 'long'), values their role mappings.
+    :param eval_list: List. The LU IDs to be evaluated (see pick_lus_for_evaluation).
+    :param amount: Integer. Amount of sentences per LU.
+    :return: Dictionary. Keys are the tasks (see TASKS), values are the lists of items.
+    """
+    import evaluation
+    import preprocessing.framenet_store as fn
+
+    items = {}
+    for task in TASKS:
+        role_mapping = role_mappings['short' if task == 'cf' else task[len('map_'):]]
+        items[task] = []
+        for lu_id in eval_list:
+            information = role_mapping[lu_id]
+            if len(information) < 4:  # If no proper mapping was found
+                continue
+            lu_object = fn.lu(lu_id)
+            items[task].append({'lu_id': lu_id, 'lu_text': information[0], 'frame': lu_object.frame.name,
+                                'connotation_frame': {feature: information[6][feature] for feature in CF_FEATURES},
+                                'sentences': evaluation.evaluation_sentences(lu_object.exemplars, information[2],
+                                                                             information[3], amount)})
+    return items
+
+
+def open_store(path: str) -> object:
+    """Opens (and creates) the SQLite file in which all answers are stored.
+
+    :param path: String. Path to the SQLite file.
+    :return: Object. The connection.
+    """
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute('CREATE TABLE IF NOT EXISTS answers (annotator TEXT, task TEXT, lu_id INTEGER, answer TEXT, '
+                       'PRIMARY KEY (annotator, task, lu_id))')
+    connection.commit()
+    return connection
+
+
+def validate_annotator(annotator: str) -> str:
+    """Checks an annotator name. Returns an error message, or None if the name is valid."""
+    if ANNOTATOR_PATTERN.match(annotator) is None:
+        return 'The annotator name may only contain a-z, 0-9, _ and -'
+    return None
+
+
+def validate_answer(task: str, item: dict, answer: dict) -> str:
+    """Checks an answer for one item. Returns an error message, or None if the answer is valid.
+
+    A role mapping answer looks like this: {'sentences': [{'agent': 'y', 'theme': 'n'}, ...]}
+    A Connotation Frame answer looks like this: {'verb': {feature: '-1', ...}, 'sentences': [{feature: '2', ...}, ...]}
+    There has to be one sentence answer per sentence of the item.
+
+    :param task: String. The task (see TASKS).
+    :param item: Dictionary. The evaluated item.
+    :param answer: Dictionary. The answer.
+    :return: String. The error message or None.
+    """
+    if not isinstance(answer, dict) or len(answer.get('sentences', [])) != len(item['sentences']):
+        return 'Expected one answer per sentence ({} sentences)'.format(len(item['sentences']))
+
+    if task == 'cf':
+        for ratings in [answer.get('verb')] + answer['sentences']:
+            if not isinstance(ratings, dict) or any(ratings.get(feature) not in CF_ANSWERS for feature in CF_FEATURES):
+                return 'Every feature {} has to be rated with one of {}'.format(CF_FEATURES, CF_ANSWERS)
+    else:
+        for ratings in answer['sentences']:
+            if not isinstance(ratings, dict) or ratings.get('agent') not in MAP_ANSWERS \
+                    or ratings.get('theme') not in MAP_ANSWERS:
+                return "'agent' and 'theme' have to be answered with one of {}".format(MAP_ANSWERS)
+    return None
+
+
+def answered(connection: object, annotator: str, task: str) -> dict:
+    """Returns all stored answers of an annotator for a task: {lu id: answer}"""
+    rows = connection.execute('SELECT lu_id, answer FROM answers WHERE annotator = ? AND task = ?', (annotator, task))
+    return {lu_id: json.loads(answer) for lu_id, answer in rows}
+
+
+def progress(connection: object, items: list, annotator: str, task: str) -> dict:
+    """Returns the progress of an annotator: {'annotator': 'name', 'task': 'cf', 'done': 3, 'total': 25}"""
+    done = len(set(answered(connection, annotator, task)) & {item['lu_id'] for item in items})
+    return {'annotator': annotator, 'task': task, 'done': done, 'total': len(items)}
+
+
+def export_map_eval(items: list, answers: dict) -> list:
+    """Converts the answers of the role mapping evaluation into the structure written by map_evaluation.
+
+    The returned list looks like this (see statistics.cohens_kappa):
+    [{statistics dict}, {LU ID: [lu_text, lu_id, frame, ['Agent Mapping: ...', 'Theme Mapping :...', sentence,
+     'Agent Answer: y', 'Theme Answer: y'], [same for sentence 2]]}]
+
+    :param items: List. The items of the task.
+    :param answers: Dictionary. The answers of one annotator, {lu id: answer}.
+    :return: List. The statistics and the evaluation per LU.
+    """
+    counts = {'y': 'positive_count', 'n': 'negative_count', '-': 'not_existing_count', '?': 'not_sure_count'}
+    statistics = {'last_stopped': 0, 'sentence_count': 0}
+    for role in ('agent', 'theme'):
+        for count in counts.values():
+            statistics['{}_{}'.format(role, count)] = 0
+
+    lus = {}
+    for item in items:
+        if item['lu_id'] not in answers:
+            continue
+        verb_eval = [item['lu_text'], item['lu_id'], item['frame']]
+        for sentence, ratings in zip(item['sentences'], answers[item['lu_id']]['sentences']):
+            verb_eval.append(['Agent Mapping: ' + fe for fe in sentence['agent']] +
+                             ['Theme Mapping :' + fe for fe in sentence['theme']] +
+                             [sentence['sentence'], 'Agent Answer: ' + ratings['agent'],
+                              'Theme Answer: ' + ratings['theme']])
+            statistics['sentence_count'] += 1
+            statistics['agent_' + counts[ratings['agent']]] += 1
+            statistics['theme_' + counts[ratings['theme']]] += 1
+        lus[item['lu_id']] = verb_eval
+        statistics['last_stopped'] += 1
+    return [statistics, lus]
+
+
+def export_cf_eval(items: list, answers: dict) -> list:
+    """Converts the answers of the Connotation Frame evaluation into the structure written by cf_evaluation.
+
+    The returned list looks like this (see statistics.read_cf_eval):
+    [{'last_stopped': 25, 'sentence_count': 50}, {LU ID: [lu_text, lu_id, frame, [(feature, original value,
+     rating without context, rating sentence 1, rating sentence 2), ...], sentence 1, sentence 2]}]
+
+    :param items: List. The items of the task.
+    :param answers: Dictionary. The answers of one annotator, {lu id: answer}.
+    :return: List. The statistics and the evaluation per LU.
+    """
+    statistics = {'last_stopped': 0, 'sentence_count': 0}
+    lus = {}
+    for item in items:
+        if item['lu_id'] not in answers:
+            continue
+        answer = answers[item['lu_id']]
+        verb_cf_eval = [tuple([feature, item['connotation_frame'][feature], answer['verb'][feature]] +
+                              [ratings[feature] for ratings in answer['sentences']]) for feature in CF_FEATURES]
+        lus[item['lu_id']] = ([item['lu_text'], item['lu_id'], item['frame'], verb_cf_eval] +
+                              [sentence['sentence'] for sentence in item['sentences']])
+        statistics['sentence_count'] += len(item['sentences'])
+        statistics['last_stopped'] += 1
+    return [statistics, lus]
+
+
+def export(connection: object, items: dict, annotator: str, task: str, directory: str = 'eval') -> str:
+    """Writes the answers of an annotator to the pickle file which the interactive evaluation would have written,
+    e.g. eval/name_map_short_eval.pkl or eval/name_cf_eval.pkl.
+
+    :param connection: Object. The answer store.
+    :param items: Dictionary. The items of all tasks (see build_items).
+    :param annotator: String. Name of the annotator.
+    :param task: String. The task (see TASKS).
+    :param directory: String. The directory of the evaluation files.
+    :return: String. Path of the written file.
+    :raises ValueError: If the annotator name is invalid or belongs to the committed evaluation (GOLD_ANNOTATORS).
+    """
+    error = validate_annotator(annotator)
+    if error is not None:
+        raise ValueError(error)
+    if annotator in GOLD_ANNOTATORS:
+        raise ValueError("The evaluation files of '{}' are part of the thesis and are not overwritten".format(
+            annotator))
+    path = os.path.join(directory, annotator + '_cf_eval.pkl' if task == 'cf' else
+                        '{}_{}_eval.pkl'.format(annotator, task))
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(directory):
+        raise ValueError('{} is not in {}'.format(path, directory))
+
+    answers = answered(connection, annotator, task)
+    result = export_cf_eval(items[task], answers) if task == 'cf' else export_map_eval(items[task], answers)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def handle_request(connection: object, items: dict, directory: str, method: str, path: str, body: bytes) -> tuple:
+    """Answers one request of an annotator.
+
+    GET /next/<task>?annotator=name returns the next unanswered item and the progress of the annotator.
+    POST /answer/<task> stores the answer for one item: {"annotator": "name", "lu_id": 123, "answer": {...}}
+    (see validate_answer). Answers can be changed by posting them again.
+    GET /progress/<task>?annotator=name returns the progress of the annotator.
+    POST /export/<task>?annotator=name writes the answers to the evaluation file of the annotator (not for the
+    annotators of the committed evaluation, GOLD_ANNOTATORS). Annotator names may only contain a-z, 0-9, _ and -.
+
+    :param connection: Object. The answer store.
+    :param items: Dictionary. The items of all tasks (see build_items).
+    :param directory: String. The directory of the evaluation files.
+    :param method: String. HTTP method.
+    :param path: String. Request path.
+    :param body: Bytes. Request body.
+    :return: Tuple. Status and encoded JSON body.
+    """
+    path, _, query = path.partition('?')
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+    annotator = parse_qs(query).get('annotator', [''])[0].lower()
+
+    if len(parts) != 2 or parts[1] not in items:
+        return '404 Not Found', json.dumps({'error': 'Unknown endpoint {} {}'.format(method, path)}).encode('UTF-8')
+    endpoint, task = parts
+
+    if method == 'POST' and endpoint == 'answer':
+        try:
+            request = json.loads(body.decode('UTF-8'))
+            annotator = str(request['annotator']).lower()
+            item = next(item for item in items[task] if item['lu_id'] == int(request['lu_id']))
+        except (ValueError, KeyError, TypeError, StopIteration):
+            return '400 Bad Request', json.dumps({'error': 'Expected annotator, a known lu_id and answer'}).encode(
+                'UTF-8')
+        error = validate_annotator(annotator) or validate_answer(task, item, request.get('answer'))
+        if error is not None:
+            return '400 Bad Request', json.dumps({'error': error}).encode('UTF-8')
+        with connection:  # One transaction per answered LU
+            connection.execute('INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)',
+                               (annotator, task, item['lu_id'], json.dumps(request['answer'])))
+        return '200 OK', json.dumps(progress(connection, items[task], annotator, task)).encode('UTF-8')
+
+    if len(annotator) == 0:
+        return '400 Bad Request', json.dumps({'error': 'The annotator is missing'}).encode('UTF-8')
+    error = validate_annotator(annotator)
+    if error is not None:
+        return '400 Bad Request', json.dumps({'error': error}).encode('UTF-8')
+
+    if method == 'GET' and endpoint == 'next':
+        done = answered(connection, annotator, task)
+        remaining = [item for item in items[task] if item['lu_id'] not in done]
+        return '200 OK', json.dumps({'item': remaining[0] if len(remaining) > 0 else None,
+                                     'progress': progress(connection, items[task], annotator, task)}).encode('UTF-8')
+
+    if method == 'GET' and endpoint == 'progress':
+        return '200 OK', json.dumps(progress(connection, items[task], annotator, task)).encode('UTF-8')
+
+    if method == 'POST' and endpoint == 'export':
+        try:
+            return '200 OK', json.dumps({'path': export(connection, items, annotator, task, directory)}).encode(
+                'UTF-8')
+        except ValueError as error:
+            return '403 Forbidden', json.dumps({'error': str(error)}).encode('UTF-8')
+
+    return '404 Not Found', json.dumps({'error': 'Unknown endpoint {} {}'.format(method, path)}).encode('UTF-8')
+
+
+async def serve(items: dict, store_path: str, directory: str = 'eval', host: str = '127.0.0.1',
+                port: int = 8766) -> None:
+    """Runs the evaluation server until it is cancelled. Any amount of annotators can be served at the same time.
+
+    :param items: Dictionary. The items of all tasks (see build_items).
+    :param store_path: String. Path to the SQLite file of the answers.
+    :param directory: String. The directory of the evaluation files.
+    :param host: String. Host to bind to.
+    :param port: Integer. Port to bind to.
+    :return: None.
+    """
+    connection = open_store(store_path)
+    handle = functools.partial(handle_request, connection, items, directory)
+    server = await asyncio.start_server(functools.partial(lookup_service.serve_connection, handle), host, port)
+    print('Serving {} on http://{}:{}'.format(', '.join('{} ({} LUs)'.format(task, len(task_items))
+                                                         for task, task_items in items.items()), host, port))
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Evaluation server for several annotators at the same time.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--store', default=os.path.join('eval', 'answers.sqlite'), help='SQLite file of the answers')
+    args = parser.parse_args()
+
+    with open(os.path.join('eval', 'picked_lus.pkl'), 'rb') as f:
+        picked_lus = pickle.load(f)
+    evaluation_items = build_items({approach: load_obj(name) for approach, name in ROLE_MAPPING_FILES.items()},
+                                   picked_lus[2])
+    asyncio.run(serve(evaluation_items, args.store, 'eval', args.host, args.port))
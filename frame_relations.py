@@ -0,0 +1,182 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.serialization as serialization
+import preprocessing.framenet_store as fn
+import role_counts
+import argparse
+import os
+
+
+# Frame-to-frame relations along which role mappings are propagated from the super frame to the sub frame
+PROPAGATING_RELATIONS = ('Inheritance', 'Perspective_on', 'Using', 'Subframe')
+
+INDEX_NAME = 'frame_relation_index'
+
+
+def build_index(relation_types: tuple = PROPAGATING_RELATIONS) -> dict:
+    """Precomputes the frame relation index from nltk's FrameNet reader (only has to be done once).
+
+    The index looks like this:
+    {'parents': {'sub frame': [{'frame': 'super frame', 'relation': 'Inheritance', 'fes': {'super FE': 'sub FE'}}]},
+     'fes': {'frame': ['FE', ...]}}
+
+    :param relation_types: Tuple. Names of the frame-to-frame relations which are indexed.
+    :return: Dictionary. The index.
+    """
+    from nltk.corpus import framenet as nltk_fn
+
+    index = {'parents': {}, 'fes': {}}
+    for relation in nltk_fn.frame_relations():
+        if relation.type.name not in relation_types:
+            continue
+        index['parents'].setdefault(relation.subFrameName, []).append(
+            {'frame': relation.superFrameName, 'relation': relation.type.name,
+             'fes': {fe_relation.superFEName: fe_relation.subFEName for fe_relation in relation.feRelations}})
+    for frame in nltk_fn.frames():
+        index['fes'][frame.name] = sorted(frame.FE.keys())
+    return index
+
+
+def load_index() -> dict:
+    """Loads the precomputed index; builds and saves it if it does not exist yet."""
+    if not os.path.exists(serialization.artifact_path(INDEX_NAME)):
+        save_obj(build_index(), INDEX_NAME)
+    return load_obj(INDEX_NAME)
+
+
+def ancestors(index: dict, frame: str, max_depth: int = 2) -> list:
+    """Returns the super frames of a frame, nearest first, with the Frame Element correspondences along the path.
+
+    One entry looks like this: {'frame': 'super frame', 'path': [('super frame', 'Inheritance')], 'fes': {'super FE':
+    'FE of the frame'}}. A Frame Element without an explicit FE relation corresponds to the Frame Element of the same
+    name, if the sub frame has one.
+
+    :param index: Dictionary. The frame relation index (see build_index).
+    :param frame: String. Name of the frame.
+    :param max_depth: Integer. Maximal amount of relations between the frames.
+    :return: List. The super frames.
+    """
+    found = []
+    seen = {frame}
+    level = [{'frame': frame, 'path': [], 'fes': {fe: fe for fe in index['fes'].get(frame, [])}}]
+    for _ in range(max_depth):
+        next_level = []
+        for current in level:
+            for parent in index['parents'].get(current['frame'], []):
+                if parent['frame'] in seen:
+                    continue
+                seen.add(parent['frame'])
+                fes = {}
+                for parent_fe in index['fes'].get(parent['frame'], parent['fes'].keys()):
+                    child_fe = parent['fes'].get(parent_fe, parent_fe)
+                    if child_fe in current['fes']:
+                        fes[parent_fe] = current['fes'][child_fe]
+                next_level.append({'frame': parent['frame'], 'path': current['path'] + [(parent['frame'],
+                                                                                         parent['relation'])],
+                                   'fes': fes})
+        found += next_level
+        level = next_level
+    return found
+
+
+def vote(role_mapping: dict, lu_ids: list, fe_map: dict = None, min_share: float = 0.5) -> dict:
+    """Infers agent and theme Frame Elements from the role mappings of other LUs: a Frame Element is inferred for a role
+    if at least min_share of the LUs map it to this role.
+
+    :param role_mapping: Dictionary. The role mapping.
+    :param lu_ids: List. IDs of the mapped LUs which are taken into account.
+    :param fe_map: Dictionary. Translates their Frame Elements into the ones of the target frame; Frame Elements
+    without translation are left out. None: the same frame.
+    :param min_share: Float. Minimal share of the LUs.
+    :return: Dictionary. {'agent': {'FE': share}, 'theme': {'FE': share}}
+    """
+    support = {}
+    for role, index, marker in (('agent', 2, 'CF_Agent'), ('theme', 3, 'CF_Theme')):
+        counts = {}
+        for lu_id in lu_ids:
+            for fe in role_mapping[lu_id][index] - {marker}:
+                target = fe if fe_map is None else fe_map.get(fe)
+                if target is not None:
+                    counts[target] = counts.get(target, 0) + 1
+        support[role] = {fe: count / len(lu_ids) for fe, count in counts.items() if count / len(lu_ids) >= min_share}
+    return support
+
+
+def propagate_mappings(role_mapping: dict, mapping_verb_lu_cfs: dict, index: dict, min_share: float = 0.5,
+                       max_depth: int = 2) -> dict:
+    """Infers the role mappings of LUs without exemplars from the mapped LUs of the same frame (siblings) and, if there
+    are none, of the nearest super frames (translated with the FE relations). No sentence is parsed.
+
+    An inferred entry looks like a regular one (with empty counts and passive count 0) plus a provenance tag:
+    ['verb', lu id, agent set, theme set, 'frame', 0, CF, counts, {'source': 'sibling' or 'parent', 'frame': 'frame of
+     the LUs', 'path': [('frame', 'relation')], 'lus': [lu ids], 'support': {'agent': {'FE': share}, 'theme': {...}}}]
+
+    :param role_mapping: Dictionary. A role mapping of one approach.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param index: Dictionary. The frame relation index (see build_index).
+    :param min_share: Float. Minimal share of the LUs mapping a Frame Element (see vote).
+    :param max_depth: Integer. Maximal amount of relations to a super frame.
+    :return: Dictionary. A copy of the role mapping with the inferred entries.
+    """
+    cfs = {lu_id: cf for (_, lu_id), cf in mapping_verb_lu_cfs.items()}
+    mapped_lus = {}  # {frame: [lu ids]} of the LUs whose mapping contains at least one Frame Element
+    for lu_id, entry in role_mapping.items():
+        if len(entry) > 3 and len(entry) < 9 and len((entry[2] | entry[3]) - {'CF_Agent', 'CF_Theme'}) > 0:
+            mapped_lus.setdefault(entry[4], []).append(lu_id)
+
+    propagated = dict(role_mapping)
+    for lu_id, entry in role_mapping.items():
+        if len(entry) > 3:
+            continue
+        frame = fn.lu(lu_id).frame.name
+        sources = [{'frame': frame, 'path': [], 'fes': None, 'source': 'sibling'}] + \
+                  [dict(ancestor, source='parent') for ancestor in ancestors(index, frame, max_depth)]
+        for source in sources:
+            lu_ids = [other for other in mapped_lus.get(source['frame'], []) if other != lu_id]
+            if len(lu_ids) == 0:
+                continue
+            support = vote(role_mapping, lu_ids, source['fes'], min_share)
+            if len(support['agent']) + len(support['theme']) == 0:
+                continue
+            propagated[lu_id] = [entry[0], lu_id, {'CF_Agent'} | set(support['agent']),
+                                 {'CF_Theme'} | set(support['theme']), frame, 0, cfs.get(lu_id),
+                                 role_counts.count_information(['CF_Agent'], ['CF_Theme'], 0, 0, 0),
+                                 {'source': source['source'], 'frame': source['frame'], 'path': source['path'],
+                                  'lus': lu_ids, 'support': support}]
+            break
+    return propagated
+
+
+def coverage(role_mapping: dict) -> dict:
+    """Counts the mapped, inferred and unmapped LUs of a role mapping."""
+    result = {'lus': len(role_mapping), 'mapped': 0, 'sibling': 0, 'parent': 0, 'unmapped': 0}
+    for entry in role_mapping.values():
+        if len(entry) <= 3:
+            result['unmapped'] += 1
+        elif len(entry) > 8:
+            result[entry[8]['source']] += 1
+        else:
+            result['mapped'] += 1
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Infers the role mappings of LUs without exemplars from related LUs '
+                                                 'and frames.')
+    parser.add_argument('--approaches', nargs='+', default=sorted(ROLE_MAPPING_FILES),
+                        choices=sorted(ROLE_MAPPING_FILES))
+    parser.add_argument('--min-share', type=float, default=0.5)
+    parser.add_argument('--max-depth', type=int, default=2)
+    parser.add_argument('--rebuild', action='store_true', help='Builds the frame relation index again')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        save_obj(build_index(), INDEX_NAME)
+    relation_index = load_index()
+    verb_lu_cfs = load_obj('mapping_verb_lu_cfs')
+    for approach in args.approaches:
+        result = propagate_mappings(load_obj(ROLE_MAPPING_FILES[approach]), verb_lu_cfs, relation_index, args.min_share,
+                                    args.max_depth)
+        save_obj(result, ROLE_MAPPING_FILES[approach] + '_propagated')
+        print(approach, coverage(result))
@@ -1,9 +1,15 @@
 import preprocessing.framenet_preprocessing as fn_pre
-from nltk.corpus import framenet as fn
+import preprocessing.framenet_store as fn
 from preprocessing.serialization import load_obj
 from preprocessing.serialization import save_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.serialization as serialization
+import detection_cache
+import profiling
+import role_counts
 import en_core_web_sm
 import re
+import os
 import pprint
 
 
@@ -78,7 +84,8 @@ def map_cfs_lus(verbs: list, cfs: dict) -> dict:
         key_information.append(verb)
 
         verb_regex = fn_pre.regex(verb)
-        lus = fn.lus(verb_regex)
+        with profiling.stage('framenet_lookup'):
+            lus = fn.lus(verb_regex)
 
         if len(lus) == 1:
             lu = lus[0].ID
@@ -98,6 +105,35 @@ def map_cfs_lus(verbs: list, cfs: dict) -> dict:
     return mapping
 
 
+@profiling.profiled('parsing')
+def parse(nlp: object, sentence) -> object:
+    """Parses a sentence with the language model unless it already is a parsed spaCy Doc.
+
+    This allows the detection methods to be used both with raw strings and with Docs that were parsed in batches
+    beforehand (e.g. via nlp.pipe), so a sentence does not have to be parsed more than once.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param sentence: String or Doc. The sentence to be parsed.
+    :return: Object. The parsed spaCy Doc.
+    """
+    if isinstance(sentence, str):
+        return nlp(sentence)
+    return sentence
+
+
+def split_detection(detection: list) -> list:
+    """Splits the flat list returned by the detection methods into one list per detected subject/object.
+
+    The detection methods append four values for every subject/object found in a sentence, so a sentence with two
+    subjects results in a list of length 8. The returned list looks like this:
+    [["subject", (position start, position end), "head", 0], ["subject2", (...), "head", 0]]
+
+    :param detection: List. Output of one of the detection methods.
+    :return: List. Contains one list of four elements per detected subject/object.
+    """
+    return [detection[i:i + 4] for i in range(0, len(detection), 4)]
+
+
 def detect_subject(nlp: object, sentence: str, lu: str) -> list:
     """Detects the syntactic subject of a given head and returns it's string, position, head and passive boolean.
 
@@ -106,11 +142,11 @@ def detect_subject(nlp: object, sentence: str, lu: str) -> list:
 
     :param nlp: Object. Preloaded Language Model.
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about the syntactic subject, position in the sentence and head
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*subj.*')  # To check later whether the token is parsed as a subject
     head = lu
 
@@ -147,11 +183,11 @@ def detect_subject_short_phrase(nlp: object, sentence: str, lu: str) -> list:
 
     :param nlp: Object. Preloaded Language Model.
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about the syntactic 'short' subject phrase, position in the sentence and head
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*subj.*')  # To check later whether the token is parsed as a subject
     head = lu
 
@@ -197,11 +233,11 @@ def detect_subject_long_phrase(nlp: object, sentence: str, lu: str) -> list:
     ["subject head", (position start, position end), "head", 0] (0 means False for passive; so 0 is active)
 
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about logical subject, position in the sentence and head
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*subj.*')  # To check later whether the token is parsed as a subject
     head = lu
 
@@ -242,11 +278,11 @@ def detect_object(nlp: object, sentence: str, lu: str) -> list:
 
     :param nlp: Object. Preloaded Language Model.
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about the syntactic object, position in the sentence and head.
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*obj.*')  # To check later whether a token is a parsed object.
     head = lu
 
@@ -286,11 +322,11 @@ def detect_object_short_phrase(nlp: object, sentence: str, lu: str) -> list:
     ["object head", (position start, position end), "head", 0] (0 means False for passive; so 0 is active)
 
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about the syntactic object, position in the sentence and head.
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*obj.*')  # To check later whether the token is parsed as a subject
     head = lu
 
@@ -349,11 +385,11 @@ def detect_object_long_phrase(nlp: object, sentence: str, lu: str) -> list:
     ["object head", (position start, position end), "head", 0] (0 means False for passive; so 0 is active)
 
     :param lu: String. The Lexical Unit that we want to retrieve the information for.
-    :param sentence: String. Sentence to be parsed.
+    :param sentence: String or Doc. Sentence to be parsed (or an already parsed spaCy Doc).
     :return: List. Containing information about the syntactic object, position in the sentence and head.
     """
     # nlp = en_core_web_sm.load()
-    doc = nlp(sentence)
+    doc = parse(nlp, sentence)
     regex = re.compile('.*obj.*')  # To check later whether the token is parsed as a subject
     head = lu
 
@@ -400,6 +436,13 @@ def detect_object_long_phrase(nlp: object, sentence: str, lu: str) -> list:
     return token_and_head
 
 
+# The subject and object detection methods of each approach: {approach: (subject detection, object detection)}
+DETECTORS = {'naive': (detect_subject, detect_object),
+             'short': (detect_subject_short_phrase, detect_object_short_phrase),
+             'long': (detect_subject_long_phrase, detect_object_long_phrase)}
+
+
+@profiling.profiled('fe_alignment')
 def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict) -> dict:
     """Mapping of all Connotation Frame Roles and Frame Elements in FrameNet through Subjects/Objects in a sentence.
 
@@ -423,7 +466,8 @@ def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict)
       will be mapped to the object of the sentence.
 
     One example of the returned list looks like this:
-    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF]}
+    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF, counts]}
+    'counts' contains how often each Frame Element was mapped (see role_counts.count_information).
 
     :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
     :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and example sentences in a list.
@@ -435,27 +479,30 @@ def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict)
 
         lu_text = key[0]
         lu_id = key[1]
-        lu_object = fn.lu(lu_id)
+        with profiling.stage('framenet_lookup'):
+            lu_object = fn.lu(lu_id)
+            examples = lu_object.exemplars
         information.append(lu_text)
         information.append(lu_id)
 
         frame_text = lu_object.frame.name
 
-        examples = lu_object.exemplars
-
         passive_count = 0
 
         if len(examples) > 0:
             agent_mapping = ['CF_Agent']  # For the direct mapping of the cf 'agent' to the fn 'frame element'
             theme_mapping = ['CF_Theme']
 
+            hit_count = 0  # Amount of sentences in which at least one Frame Element was mapped
+
             for example in examples:
                 sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
                 fes = example.frameAnnotation.FE[0]
+                mapped_before = len(agent_mapping) + len(theme_mapping)
 
-                logical_subject = detect_subject(nlp, sentence, lu_text)  # looks like this:
+                logical_subject = detection_cache.detect(nlp, detect_subject, sentence, lu_text)  # looks like this:
                 # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-                logical_object = detect_object(nlp, sentence, lu_text)  # same as above.
+                logical_object = detection_cache.detect(nlp, detect_object, sentence, lu_text)  # same as above.
 
                 # subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -494,6 +541,9 @@ def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict)
                         elif object_start >= fe_start and object_end <= fe_end and subject_passive_bool == 1:  # are not marked as passive,
                             agent_mapping.append(fe[2])  # but when subject is passive the object has to take the agent role
 
+                if len(agent_mapping) + len(theme_mapping) > mapped_before:
+                    hit_count += 1
+
                 # if len(agent_mapping) > 1 and len(theme_mapping) > 1:
                 #     break
 
@@ -514,6 +564,9 @@ def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict)
             information.append(value)
             # information.append(sentence)
 
+            information.append(role_counts.count_information(agent_mapping, theme_mapping, len(examples), hit_count,
+                                                             passive_count))
+
         else:
             information.append('No examples found. No Mapping possible')
 
@@ -524,6 +577,7 @@ def map_cf_roles_and_fes_naive_all_sents(nlp: object, mapping_verb_lu_cfs: dict)
     return mapping
 
 
+@profiling.profiled('fe_alignment')
 def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs: dict) -> dict:
     """Mapping of all Connotation Frame Roles and Frame Elements in FrameNet through Subjects/Objects in a sentence.
 
@@ -547,7 +601,8 @@ def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs
       will be mapped to the object of the sentence.
 
     One example of the returned list looks like this:
-    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF]}
+    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF, counts]}
+    'counts' contains how often each Frame Element was mapped (see role_counts.count_information).
 
     :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
     :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and example sentences in a list.
@@ -559,27 +614,30 @@ def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs
 
         lu_text = key[0]
         lu_id = key[1]
-        lu_object = fn.lu(lu_id)
+        with profiling.stage('framenet_lookup'):
+            lu_object = fn.lu(lu_id)
+            examples = lu_object.exemplars
         information.append(lu_text)
         information.append(lu_id)
 
         frame_text = lu_object.frame.name
 
-        examples = lu_object.exemplars
-
         passive_count = 0
 
         if len(examples) > 0:
             agent_mapping = ['CF_Agent']  # For the direct mapping of the cf 'agent' to the fn 'frame element'
             theme_mapping = ['CF_Theme']
 
+            hit_count = 0  # Amount of sentences in which at least one Frame Element was mapped
+
             for example in examples:
                 sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
                 fes = example.frameAnnotation.FE[0]
+                mapped_before = len(agent_mapping) + len(theme_mapping)
 
-                logical_subject = detect_subject_short_phrase(nlp, sentence, lu_text)  # looks like this:
+                logical_subject = detection_cache.detect(nlp, detect_subject_short_phrase, sentence, lu_text)  # looks like this:
                 # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-                logical_object = detect_object_short_phrase(nlp, sentence, lu_text)  # same as above.
+                logical_object = detection_cache.detect(nlp, detect_object_short_phrase, sentence, lu_text)  # same as above.
 
                 subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -616,6 +674,9 @@ def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs
                             # subject passive bool is taken on purpose because objects are not marked as passive, but
                             # when subject is passive the object has to take the agent role
 
+                if len(agent_mapping) + len(theme_mapping) > mapped_before:
+                    hit_count += 1
+
                 # if len(agent_mapping) > 1 and len(theme_mapping) > 1:
                 #     break
 
@@ -635,6 +696,9 @@ def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs
             information.append(value)
             # information.append(sentence)
 
+            information.append(role_counts.count_information(agent_mapping, theme_mapping, len(examples), hit_count,
+                                                             passive_count))
+
         else:
             information.append('No examples found. No Mapping possible')
 
@@ -645,6 +709,7 @@ def map_cf_roles_and_fes_short_phrase_all_sents(nlp: object, mapping_verb_lu_cfs
     return mapping
 
 
+@profiling.profiled('fe_alignment')
 def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs: dict) -> dict:
     """Mapping of all Connotation Frame Roles and Frame Elements in FrameNet through Subjects/Objects in a sentence.
 
@@ -668,7 +733,8 @@ def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs:
       will be mapped to the object of the sentence.
 
     One example of the returned dictionary looks like this:
-    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF]}
+    {123: ['verb', lu id, ('Agent', 'mapped FE'), ('Patient', 'mapped FE'), frame name, passive bool, CF, counts]}
+    'counts' contains how often each Frame Element was mapped (see role_counts.count_information).
 
     :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
     :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and example sentences in a list.
@@ -680,27 +746,30 @@ def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs:
 
         lu_text = key[0]
         lu_id = key[1]
-        lu_object = fn.lu(lu_id)
+        with profiling.stage('framenet_lookup'):
+            lu_object = fn.lu(lu_id)
+            examples = lu_object.exemplars
         information.append(lu_text)
         information.append(lu_id)
 
         frame_text = lu_object.frame.name
 
-        examples = lu_object.exemplars
-
         passive_count = 0
 
         if len(examples) > 0:
             agent_mapping = ['CF_Agent']  # For the direct mapping of the cf 'agent' to the fn 'frame element'
             theme_mapping = ['CF_Theme']
 
+            hit_count = 0  # Amount of sentences in which at least one Frame Element was mapped
+
             for example in examples:
                 sentence = example.text  # In case there are only subjects/objects mapable I take the first sentence.
                 fes = example.frameAnnotation.FE[0]
+                mapped_before = len(agent_mapping) + len(theme_mapping)
 
-                logical_subject = detect_subject_long_phrase(nlp, sentence, lu_text)  # looks like this:
+                logical_subject = detection_cache.detect(nlp, detect_subject_long_phrase, sentence, lu_text)  # looks like this:
                 # ["subject", (position start, position end), "head", 0] (0 means False for passive boolean; so 0 is active)
-                logical_object = detect_object_long_phrase(nlp, sentence, lu_text)  # same as above.
+                logical_object = detection_cache.detect(nlp, detect_object_long_phrase, sentence, lu_text)  # same as above.
 
                 subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
 
@@ -738,6 +807,9 @@ def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs:
                             # subject passive bool is taken on purpose because objects are not marked as passive, but
                             # when subject is passive the object has to take the agent role
 
+                if len(agent_mapping) + len(theme_mapping) > mapped_before:
+                    hit_count += 1
+
                 # if len(agent_mapping) > 1 and len(theme_mapping) > 1:
                 #     break
 
@@ -757,6 +829,9 @@ def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs:
             information.append(value)
             # information.append(sentence)
 
+            information.append(role_counts.count_information(agent_mapping, theme_mapping, len(examples), hit_count,
+                                                             passive_count))
+
         else:
             information.append('No examples found. No Mapping possible')
 
@@ -767,8 +842,149 @@ def map_cf_roles_and_fes_long_phrase_all_sents(nlp: object, mapping_verb_lu_cfs:
     return mapping
 
 
+@profiling.profiled('fe_alignment')
+def align_roles(logical_subject: list, logical_object: list, fes: list, approach: str) -> tuple:
+    """Aligns the detected subject and object of one sentence with its Frame Elements.
+
+    The rules are the same as in the role mapping methods: for the naive approach, the subject/object has to lie within
+    the Frame Element, for the short and long phrase approaches, both spans have to be equal. If the subject is marked
+    as passive, it is mapped to the theme role and the object is mapped to the agent role.
+
+    :param logical_subject: List. Output of the subject detection method of the approach.
+    :param logical_object: List. Output of the object detection method of the approach.
+    :param fes: List. The Frame Elements of the sentence: [(start pos, end pos, 'Frame Element name'), ...]
+    :param approach: String. 'naive', 'short' or 'long'.
+    :return: Tuple. The Frame Elements mapped to the agent role, to the theme role (both lists) and the passive count.
+    """
+    if approach == 'naive':
+        matches = lambda start, end, fe: start >= fe[0] and end <= fe[1]
+    else:
+        matches = lambda start, end, fe: start == fe[0] and end == fe[1]
+
+    agent_mapping = []
+    theme_mapping = []
+    passive_count = 0
+    subject_passive_bool = logical_subject[3] if len(logical_subject) > 0 else 0
+
+    if len(logical_subject) > 0:
+        for fe in fes:
+            if matches(logical_subject[1][0], logical_subject[1][1], fe):
+                if subject_passive_bool == 0:
+                    agent_mapping.append(fe[2])
+                else:
+                    theme_mapping.append(fe[2])
+                    passive_count += 1
+
+    if len(logical_object) > 0:
+        for fe in fes:
+            if matches(logical_object[1][0], logical_object[1][1], fe):
+                theme_mapping.append(fe[2]) if subject_passive_bool == 0 else agent_mapping.append(fe[2])
+
+    return agent_mapping, theme_mapping, passive_count
+
+
+@profiling.profiled('fe_alignment')
+def map_cf_roles_and_fes_batched(nlp: object, mapping_verb_lu_cfs: dict, approach: str = 'short',
+                                 batch_size: int = 256, detectors: tuple = None) -> dict:
+    """Role mapping of one approach which parses the example sentences of each LU in batches (nlp.pipe) and aligns the
+    detected subjects and objects with align_roles.
+
+    It is meant to return exactly the same mapping as the role mapping methods of the approaches (e.g.
+    map_cf_roles_and_fes_short_phrase_all_sents), which can be checked with the equivalence harness (equivalence.py).
+    The detection results are not cached.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and counts in a list.
+    """
+    mapping = {}
+
+    for (lu_text, lu_id), value in mapping_verb_lu_cfs.items():
+        with profiling.stage('framenet_lookup'):
+            lu_object = fn.lu(lu_id)
+            examples = lu_object.exemplars
+
+        with profiling.stage('parsing'):
+            docs = list(nlp.pipe([example.text for example in examples], batch_size=batch_size))
+
+        mapping[lu_id] = map_lu_from_docs(nlp, lu_text, lu_id, value, lu_object, examples, docs, approach, detectors)
+
+    return mapping
+
+
+def align_docs(nlp: object, lu_text: str, examples: list, docs: list, agent_mapping: list, theme_mapping: list,
+               approach: str = 'short', detectors: tuple = None) -> tuple:
+    """Detects subject and object in parsed exemplars of an LU and aligns them with their Frame Elements (see
+    align_roles). The mapped Frame Elements are appended to agent_mapping and theme_mapping.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_text: String. The verb.
+    :param examples: List. Exemplars of the LU.
+    :param docs: List. The parsed exemplars, in the same order.
+    :param agent_mapping: List. Frame Elements mapped to the agent role so far.
+    :param theme_mapping: List. Frame Elements mapped to the theme role so far.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :return: Tuple. The amount of sentences with at least one mapped Frame Element (hits) and of passive subjects.
+    """
+    subject_detector, object_detector = detectors or DETECTORS[approach]
+    hit_count = 0
+    passive_count = 0
+
+    for example, doc in zip(examples, docs):
+        with profiling.stage('detection'):
+            logical_subject = subject_detector(nlp, doc, lu_text)
+            logical_object = object_detector(nlp, doc, lu_text)
+        agents, themes, passive = align_roles(logical_subject, logical_object, example.frameAnnotation.FE[0], approach)
+        agent_mapping.extend(agents)
+        theme_mapping.extend(themes)
+        passive_count += passive
+        if len(agents) + len(themes) > 0:
+            hit_count += 1
+    return hit_count, passive_count
+
+
+def map_lu_from_docs(nlp: object, lu_text: str, lu_id: int, cf: object, lu_object: object, examples: list, docs: list,
+                     approach: str = 'short', detectors: tuple = None) -> list:
+    """Role mapping of one LU whose example sentences are already parsed (used by map_cf_roles_and_fes_batched and
+    the pipelined role mapping).
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_text: String. The verb.
+    :param lu_id: Integer. The LU ID.
+    :param cf: The Connotation Frame of the verb.
+    :param lu_object: Object. The Lexical Unit.
+    :param examples: List. The exemplars of the LU.
+    :param docs: List. The parsed exemplars, in the same order.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :return: List. The role mapping entry of the LU.
+    """
+    if len(examples) == 0:
+        return [lu_text, lu_id, 'No examples found. No Mapping possible']
+
+    agent_mapping = ['CF_Agent']
+    theme_mapping = ['CF_Theme']
+    hit_count, passive_count = align_docs(nlp, lu_text, examples, docs, agent_mapping, theme_mapping, approach,
+                                          detectors)
+
+    return [lu_text, lu_id, set(agent_mapping), set(theme_mapping), lu_object.frame.name, passive_count, cf,
+            role_counts.count_information(agent_mapping, theme_mapping, len(examples), hit_count, passive_count)]
+
+
+# The role mapping method of each approach
+MAPPING_FUNCTIONS = {'naive': map_cf_roles_and_fes_naive_all_sents,
+                     'short': map_cf_roles_and_fes_short_phrase_all_sents,
+                     'long': map_cf_roles_and_fes_long_phrase_all_sents}
+
+
 if __name__ == '__main__':
+    profiling.start('mapping')
     nlp = en_core_web_sm.load()
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
     cf_verb_frame_count_dict = cf_verbs_frame_count('extracted_cf_verbs')  # contains all common verbs/LUs and the
     # amount of frames evoked.
     save_obj(cf_verb_frame_count_dict, 'cf_verb_frame_count_dict')
@@ -788,10 +1004,15 @@ if __name__ == '__main__':
     # lus_sentences = frame_and_sentence(mapping)
 
     role_mapping_naive_all_sents = map_cf_roles_and_fes_naive_all_sents(nlp, mapping)
-    save_obj(role_mapping_naive_all_sents, 'role_mapping_nonamb_naive_all_sents')
+    save_obj(role_mapping_naive_all_sents, ROLE_MAPPING_FILES['naive'])
+    save_obj(role_counts.count_matrices(role_mapping_naive_all_sents), ROLE_MAPPING_FILES['naive'] + '_counts')
 
     role_mapping_short_phrases_all_sents = map_cf_roles_and_fes_short_phrase_all_sents(nlp, mapping)
-    save_obj(role_mapping_short_phrases_all_sents, 'role_mapping_nonamb_lus_short_phrases_all_sents')
+    save_obj(role_mapping_short_phrases_all_sents, ROLE_MAPPING_FILES['short'])
+    save_obj(role_counts.count_matrices(role_mapping_short_phrases_all_sents), ROLE_MAPPING_FILES['short'] + '_counts')
 
     role_mapping_long_phrases_all_sents = map_cf_roles_and_fes_long_phrase_all_sents(nlp, mapping)
-    save_obj(role_mapping_long_phrases_all_sents, 'role_mapping_nonamb_lus_long_phrases_all_sents')
+    save_obj(role_mapping_long_phrases_all_sents, ROLE_MAPPING_FILES['long'])
+    save_obj(role_counts.count_matrices(role_mapping_long_phrases_all_sents), ROLE_MAPPING_FILES['long'] + '_counts')
+
+    print(detection_cache.statistics())
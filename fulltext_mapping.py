@@ -0,0 +1,128 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.framenet_fulltext as fulltext
+import preprocessing.serialization as serialization
+import framenet_connotationframes_mapping as map
+import detection_cache
+import profiling
+import role_counts
+from collections import Counter
+import argparse
+import os
+
+
+def map_cf_roles_and_fes_fulltext(nlp: object, mapping_verb_lu_cfs: dict, approach: str = 'short',
+                                  records: object = None, batch_size: int = 256) -> dict:
+    """Mapping of the Connotation Frame roles and Frame Elements through the targets of the FrameNet full-text documents.
+
+    The records are consumed as a stream: for each target, subject and object are detected with the detection methods
+    of the approach and aligned with the Frame Elements like in the role mapping methods (see align_roles). Only the
+    Frame Element counts per LU are kept, so the memory usage does not grow with the amount of documents.
+
+    The returned dictionary has the same format as the role mappings:
+    {123: ['verb', lu id, {'CF_Agent', 'mapped FE'}, {'CF_Theme', 'mapped FE'}, frame name, passive count, CF, counts]}
+    Only LUs with at least one target in the documents are contained.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param records: Iterable. Records as yielded by iter_fulltext_records. Default: all full-text documents.
+    :param batch_size: Integer. Amount of records which are parsed together.
+    :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and counts in a list.
+    """
+    verbs = {lu_id: (verb, cf) for (verb, lu_id), cf in mapping_verb_lu_cfs.items()}
+    if records is None:
+        records = fulltext.iter_fulltext_records(set(verbs))
+    subject_detector, object_detector = map.DETECTORS[approach]
+
+    counts = {}
+    frames = {}
+
+    for record, doc in fulltext.iter_parsed_records(nlp, records, batch_size):
+        lu_id = record['lu_id']
+        if lu_id not in verbs:
+            continue
+        lu_text = verbs[lu_id][0]
+
+        logical_subject = detection_cache.detect(nlp, subject_detector, doc, lu_text)
+        logical_object = detection_cache.detect(nlp, object_detector, doc, lu_text)
+        agent_mapping, theme_mapping, passive_count = map.align_roles(logical_subject, logical_object, record['fes'],
+                                                                      approach)
+
+        if lu_id not in counts:
+            counts[lu_id] = {'agent': Counter(), 'theme': Counter(), 'sentences': 0, 'hits': 0, 'passive': 0}
+            frames[lu_id] = record['frame']
+        lu_counts = counts[lu_id]
+        lu_counts['agent'].update(agent_mapping)
+        lu_counts['theme'].update(theme_mapping)
+        lu_counts['sentences'] += 1
+        lu_counts['hits'] += 1 if len(agent_mapping) + len(theme_mapping) > 0 else 0
+        lu_counts['passive'] += passive_count
+
+    mapping = {}
+    for lu_id, lu_counts in counts.items():
+        lu_counts['agent'] = dict(lu_counts['agent'])
+        lu_counts['theme'] = dict(lu_counts['theme'])
+        mapping[lu_id] = [verbs[lu_id][0], lu_id, {'CF_Agent'} | set(lu_counts['agent']),
+                          {'CF_Theme'} | set(lu_counts['theme']), frames[lu_id], lu_counts['passive'],
+                          verbs[lu_id][1], lu_counts]
+    return mapping
+
+
+def merge_role_mappings(role_mapping: dict, additional_mapping: dict) -> dict:
+    """Merges two role mappings of the same approach, e.g. the exemplar mapping and the full-text mapping.
+
+    The mapped Frame Elements are united and the counts are added up. LUs without a mapping in one of the role mappings
+    take the mapping of the other one.
+
+    :param role_mapping: Dictionary. A role mapping (see map_cf_roles_and_fes_short_phrase_all_sents).
+    :param additional_mapping: Dictionary. Another role mapping.
+    :return: Dictionary. The merged role mapping.
+    """
+    merged = dict(role_mapping)
+    for lu_id, information in additional_mapping.items():
+        existing = merged.get(lu_id)
+        if existing is None or len(existing) < 5:  # If no proper mapping was found
+            merged[lu_id] = information
+            continue
+        if len(information) < 5:
+            continue
+
+        combined = existing[:2] + [existing[2] | information[2], existing[3] | information[3], existing[4],
+                                   existing[5] + information[5], existing[6]]
+        if len(existing) > 7 and len(information) > 7:
+            existing_counts, counts = existing[7], information[7]
+            combined.append({'agent': dict(Counter(existing_counts['agent']) + Counter(counts['agent'])),
+                             'theme': dict(Counter(existing_counts['theme']) + Counter(counts['theme'])),
+                             'sentences': existing_counts['sentences'] + counts['sentences'],
+                             'hits': existing_counts['hits'] + counts['hits'],
+                             'passive': existing_counts['passive'] + counts['passive']})
+        merged[lu_id] = combined
+    return merged
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Role mapping over the targets of the FrameNet full-text documents.')
+    parser.add_argument('--approach', default='short', choices=sorted(ROLE_MAPPING_FILES))
+    parser.add_argument('--documents', help='Regular expression for the document file names (default: all)')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--merge', action='store_true', help='Merges the result with the exemplar role mapping')
+    args = parser.parse_args()
+    profiling.start('fulltext_mapping')
+
+    import en_core_web_sm
+
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
+    mapping_verb_lu_cfs = load_obj('mapping_verb_lu_cfs')
+    fulltext_records = fulltext.iter_fulltext_records({lu_id for verb, lu_id in mapping_verb_lu_cfs}, args.documents)
+    fulltext_mapping = map_cf_roles_and_fes_fulltext(en_core_web_sm.load(), mapping_verb_lu_cfs, args.approach,
+                                                     fulltext_records, args.batch_size)
+
+    name = ROLE_MAPPING_FILES[args.approach] + '_fulltext'
+    if args.merge:
+        fulltext_mapping = merge_role_mappings(load_obj(ROLE_MAPPING_FILES[args.approach]), fulltext_mapping)
+        name = ROLE_MAPPING_FILES[args.approach] + '_with_fulltext'
+    save_obj(fulltext_mapping, name)
+    save_obj(role_counts.count_matrices(fulltext_mapping), name + '_counts')
+    print(len(fulltext_mapping), 'LUs mapped,', detection_cache.statistics())
@@ -0,0 +1,161 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.framenet_store as fn
+import preprocessing.serialization as serialization
+import framenet_connotationframes_mapping as map
+import detection_cache
+import profiling
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import html
+import json
+import os
+
+
+def parse_missing(nlp: object, sentences: list, lu_text: str, approaches: list, batch_size: int = 64) -> dict:
+    """Parses all sentences whose detection results are not cached for all approaches, batched with nlp.pipe.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param sentences: List. The sentences of an LU.
+    :param lu_text: String. The Lexical Unit.
+    :param approaches: List. The approaches ('naive', 'short', 'long').
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :return: Dictionary. Keys are the sentences which had to be parsed, values are their Docs.
+    """
+    detectors = [detector for approach in approaches for detector in map.DETECTORS[approach]]
+    missing = list(dict.fromkeys(sentence for sentence in sentences
+                                 if not detection_cache.is_cached(nlp, detectors, sentence, lu_text)))
+    return dict(zip(missing, nlp.pipe(missing, batch_size=batch_size)))
+
+
+def inspect_lu(nlp: object, lu_id: int, lu_text: str, approaches: list = ('naive', 'short', 'long'),
+               role_mappings: dict = None, batch_size: int = 64) -> dict:
+    """Computes the mapping of every example sentence of an LU for several approaches, like show_mapping_for_one_verb_*
+    but without printing.
+
+    Each sentence is parsed at most once for all approaches. The returned dictionary looks like this:
+    {'lu_id': 123, 'lu_text': 'verb', 'frame': 'Frame', 'mappings': {approach: {'agent': [FE], 'theme': [FE]}},
+     'sentences': [{'sentence': 'text', 'fes': [[start, end, 'FE', 'text']],
+                    'approaches': {approach: {'subject': 'text', 'object': 'text', 'agent': [FE], 'theme': [FE],
+                                              'passive': 0}}}]}
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_id: Integer. The LU ID.
+    :param lu_text: String. The Lexical Unit.
+    :param approaches: List. The approaches to be inspected.
+    :param role_mappings: Dictionary. Keys are approaches, values their role mappings (for the final LU mappings).
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :return: Dictionary. The inspection report of the LU.
+    """
+    lu_object = fn.lu(lu_id)
+    examples = lu_object.exemplars
+    docs = parse_missing(nlp, [example.text for example in examples], lu_text, approaches, batch_size)
+
+    report = {'lu_id': lu_id, 'lu_text': lu_text, 'frame': lu_object.frame.name, 'mappings': {}, 'sentences': []}
+    for approach in approaches:
+        information = (role_mappings or {}).get(approach, {}).get(lu_id, [])
+        if len(information) > 4:
+            report['mappings'][approach] = {'agent': sorted(information[2] - {'CF_Agent'}),
+                                            'theme': sorted(information[3] - {'CF_Theme'})}
+
+    for example in examples:
+        sentence = example.text
+        fes = example.frameAnnotation.FE[0]
+        inspected = {'sentence': sentence, 'fes': [[fe[0], fe[1], fe[2], sentence[fe[0]:fe[1]]] for fe in fes],
+                     'approaches': {}}
+        for approach in approaches:
+            logical_subject, logical_object = detection_cache.detect_all(nlp, map.DETECTORS[approach],
+                                                                         docs.get(sentence, sentence), lu_text)
+            agent_mapping, theme_mapping, _ = map.align_roles(logical_subject, logical_object, fes, approach)
+            inspected['approaches'][approach] = {
+                'subject': logical_subject[0] if len(logical_subject) > 0 else None,
+                'object': logical_object[0] if len(logical_object) > 0 else None,
+                'agent': agent_mapping, 'theme': theme_mapping,
+                'passive': logical_subject[3] if len(logical_subject) > 0 else 0}
+        report['sentences'].append(inspected)
+    return report
+
+
+def render_html(report: dict) -> str:
+    """Renders the inspection report of one LU as an HTML section with one table row per sentence and approach."""
+    escape = html.escape
+    lines = ['<section id="lu-{}">'.format(report['lu_id']),
+             '<h2>{} ({}, LU {})</h2>'.format(escape(report['lu_text']), escape(report['frame']), report['lu_id'])]
+
+    for approach, mapping in report['mappings'].items():
+        lines.append('<p><b>{}</b>: Agent = {}; Theme = {}</p>'.format(
+            approach, escape(', '.join(mapping['agent']) or '-'), escape(', '.join(mapping['theme']) or '-')))
+
+    if len(report['sentences']) == 0:
+        lines.append('<p>No examples found; no mapping possible.</p>')
+    else:
+        lines.append('<table><tr><th>Sentence</th><th>Frame Elements</th><th>Approach</th><th>Subject</th>'
+                     '<th>Object</th><th>Agent</th><th>Theme</th><th>Passive</th></tr>')
+        for inspected in report['sentences']:
+            fes = '<br>'.join('{} &rarr; {}'.format(escape(fe[2]), escape(fe[3])) for fe in inspected['fes'])
+            for number, (approach, result) in enumerate(inspected['approaches'].items()):
+                cells = ['<td rowspan="{}">{}</td><td rowspan="{}">{}</td>'.format(
+                    len(inspected['approaches']), escape(inspected['sentence']), len(inspected['approaches']), fes)
+                         if number == 0 else '']
+                cells += ['<td>{}</td>'.format(escape(str(value if value is not None else '-'))) for value in
+                          (approach, result['subject'], result['object'], ', '.join(result['agent']),
+                           ', '.join(result['theme']), result['passive'])]
+                lines.append('<tr>{}</tr>'.format(''.join(cells)))
+        lines.append('</table>')
+
+    lines.append('</section>')
+    return '\n'.join(lines)
+
+
+def write_reports(reports: list, jsonl_path: str = None, html_path: str = None, jobs: int = 4) -> None:
+    """Writes inspection reports as JSON lines and/or as one HTML page. The HTML sections are rendered in parallel.
+
+    :param reports: List. Inspection reports (see inspect_lu).
+    :param jsonl_path: String. Path of the JSONL file (one line per LU). None writes no JSONL file.
+    :param html_path: String. Path of the HTML file. None writes no HTML file.
+    :param jobs: Integer. Amount of processes rendering the HTML sections.
+    :return: None.
+    """
+    if jsonl_path is not None:
+        with open(jsonl_path, 'w', encoding='UTF-8') as f:
+            for report in reports:
+                f.write(json.dumps(report, ensure_ascii=False) + '\n')
+
+    if html_path is not None:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            sections = list(executor.map(render_html, reports, chunksize=16))
+        with open(html_path, 'w', encoding='UTF-8') as f:
+            f.write('<!DOCTYPE html>\n<html><head><meta charset="UTF-8"><title>Mapping inspection</title>'
+                    '<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px;'
+                    'vertical-align:top}</style></head><body>\n')
+            f.write('<ul>{}</ul>\n'.format(''.join('<li><a href="#lu-{0}">{1} ({0})</a></li>'.format(
+                report['lu_id'], html.escape(report['lu_text'])) for report in reports)))
+            f.write('\n'.join(sections))
+            f.write('\n</body></html>\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Writes the mapping of every example sentence of all (or some) LUs.')
+    parser.add_argument('--approaches', nargs='+', default=sorted(ROLE_MAPPING_FILES),
+                        choices=sorted(ROLE_MAPPING_FILES))
+    parser.add_argument('--lus', nargs='+', type=int, help='LU IDs to be inspected (default: all mapped LUs)')
+    parser.add_argument('--verbs', nargs='+', help='Verbs to be inspected (default: all mapped LUs)')
+    parser.add_argument('--jsonl', default='inspection.jsonl')
+    parser.add_argument('--html', default='inspection.html')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('-j', '--jobs', type=int, default=4)
+    args = parser.parse_args()
+    profiling.start('inspection_report')
+
+    import en_core_web_sm
+
+    nlp = en_core_web_sm.load()
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
+    mappings = {approach: load_obj(ROLE_MAPPING_FILES[approach]) for approach in args.approaches}
+    mapped_lus = {lu_id: information[0] for mapping in mappings.values() for lu_id, information in mapping.items()}
+
+    inspection_reports = [inspect_lu(nlp, lu_id, lu_text, args.approaches, mappings, args.batch_size)
+                          for lu_id, lu_text in sorted(mapped_lus.items())
+                          if (args.lus is None or lu_id in args.lus) and (args.verbs is None or lu_text in args.verbs)]
+    write_reports(inspection_reports, args.jsonl, args.html, args.jobs)
+    print(len(inspection_reports), 'LUs inspected,', detection_cache.statistics())
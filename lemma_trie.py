@@ -0,0 +1,141 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+import preprocessing.serialization as serialization
+import preprocessing.framenet_store as fn
+import argument_rules
+import argparse
+import os
+import re
+
+
+TRIE_NAME = 'verb_lemma_trie'
+
+# Dependency labels of verb particles, e.g. 'up' in 'She gave it up.'
+PARTICLE_DEPS = ('prt', 'compound:prt')
+
+_TARGETS = ''  # Key of the target IDs in a trie node (no lemma is empty)
+
+
+def lu_lemmas(name: str) -> tuple:
+    """Converts an LU name into its lemma sequence, e.g. 'give up.v' -> ('give', 'up'). Optional words in parentheses
+    are left out ('break (in).v' -> ('break',))."""
+    words = re.sub(r'\([^)]*\)', ' ', name.rsplit('.', 1)[0]).replace('_', ' ')
+    return tuple(words.lower().split())
+
+
+def build_trie(targets: dict) -> dict:
+    """Compiles lemma sequences into a trie of nested dictionaries.
+
+    A node maps each following lemma to its child node; the IDs of the targets ending in a node are stored under ''.
+    {'give': {'': [1234], 'up': {'': [5678]}}, ...}
+
+    :param targets: Dictionary. Keys are target IDs (e.g. LU IDs or verbs), values are lemma sequences (tuples).
+    :return: Dictionary. The trie.
+    """
+    trie = {}
+    for target, lemmas in targets.items():
+        insert(trie, target, lemmas)
+    return trie
+
+
+def insert(trie: dict, target: object, lemmas: tuple) -> None:
+    """Adds one target with its lemma sequence to a trie (see build_trie). Empty sequences are left out."""
+    if len(lemmas) == 0:
+        return
+    node = trie
+    for lemma in lemmas:
+        node = node.setdefault(lemma, {})
+    if target not in node.setdefault(_TARGETS, []):
+        node[_TARGETS].append(target)
+
+
+def compile_verb_trie() -> dict:
+    """Builds the trie of all verbal LUs of FrameNet ('.v'), multiword and phrasal verbs included. Targets are LU
+    IDs."""
+    return build_trie({lu.ID: lu_lemmas(lu.name) for lu in fn.lus(r'\.v$')})
+
+
+def load_verb_trie() -> dict:
+    """Loads the precompiled trie of all verbal LUs; compiles and saves it if it does not exist yet."""
+    if not os.path.exists(serialization.artifact_path(TRIE_NAME)):
+        save_obj(compile_verb_trie(), TRIE_NAME)
+    return load_obj(TRIE_NAME)
+
+
+def walk(trie: dict, tokens: list) -> tuple:
+    """Follows the lemmas of the tokens through the trie and returns the longest match.
+
+    :param trie: Dictionary. The trie (see build_trie).
+    :param tokens: List. Tokens, starting with the verb.
+    :return: Tuple. The amount of matched tokens and the target IDs (0 and None if nothing matched).
+    """
+    best = (0, None)
+    node = trie
+    for length, token in enumerate(tokens, 1):
+        node = node.get(token.lemma_.lower())
+        if node is None:
+            break
+        if _TARGETS in node:
+            best = (length, node[_TARGETS])
+    return best
+
+
+def find_targets(doc: object, trie: dict, pos: tuple = None) -> list:
+    """Finds every occurrence of a target in a parsed sentence in one scan over its tokens.
+
+    A target starts at a token whose lemma starts a lemma sequence of the trie. Its remaining lemmas are either the
+    following tokens ('take off') or the particles of the verb, which may be separated from it ('take it off'). The
+    longest match is used.
+
+    One match looks like this: {'targets': [LU IDs], 'lemmas': ['take', 'off'], 'head': 3, 'tokens': [3, 5]}
+
+    :param doc: Object. The parsed spaCy Doc (or sentence Span).
+    :param trie: Dictionary. The trie (see build_trie).
+    :param pos: Tuple. Allowed part of speech tags of the first token, e.g. ('VERB', 'AUX'). None: all.
+    :return: List. The matches in the order of the sentence.
+    """
+    matches = []
+    offset = doc[0].i if len(doc) > 0 else 0  # Token indices of a Span are relative to the Doc
+    for token in doc:
+        if token.lemma_.lower() not in trie or (pos is not None and token.pos_ not in pos):
+            continue
+        start = token.i - offset
+        length, targets = walk(trie, doc[start:])
+        tokens = list(doc[start:start + length])
+        particles = [token] + [child for child in token.children if child.dep_ in PARTICLE_DEPS]
+        if len(particles) > 1:
+            particle_length, particle_targets = walk(trie, particles)
+            if particle_length > length:
+                length, targets, tokens = particle_length, particle_targets, particles[:particle_length]
+        if targets is None:
+            continue
+        matches.append({'targets': list(targets), 'lemmas': [t.lemma_.lower() for t in tokens], 'head': token.i,
+                        'tokens': [t.i for t in tokens]})
+    return matches
+
+
+def detect_targets(doc: object, trie: dict, approach: str = 'short', pos: tuple = None) -> list:
+    """Finds all targets of a parsed sentence and detects subject and object of each occurrence with the argument
+    rules (see argument_rules), in the output format of the detection methods.
+
+    One entry looks like this: dict(match, subject=[...], object=[...]) (see find_targets and detect_subject)
+
+    :param doc: Object. The parsed spaCy Doc.
+    :param trie: Dictionary. The trie (see build_trie).
+    :param approach: String. 'naive', 'short' or 'long' (the span expansion policy).
+    :param pos: Tuple. Allowed part of speech tags of the first token (see find_targets).
+    :return: List. The matches with their subjects and objects.
+    """
+    detected = []
+    for match in find_targets(doc, trie, pos):
+        arguments = argument_rules.find_arguments_of_token(doc, match['head'])
+        detected.append(dict(match, subject=argument_rules.detection_format(arguments, approach, 'subject'),
+                             object=argument_rules.detection_format(arguments, approach, 'object')))
+    return detected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompiles the lemma trie of all verbal LUs of FrameNet.')
+    parser.parse_args()
+    save_obj(compile_verb_trie(), TRIE_NAME)
+    print('Saved to', serialization.artifact_path(TRIE_NAME))
@@ -0,0 +1,89 @@
+from lookup_service import load_index
+import argparse
+import asyncio
+import random
+import time
+
+
+def sample_paths(index: dict, amount: int) -> list:
+    """Samples request paths for the load test from all lookup types of the index.
+
+    :param index: Dictionary. The lookup index (see lookup_service.build_index).
+    :param amount: Integer. Amount of paths to be sampled.
+    :return: List. Request paths, e.g. '/verb/build'.
+    """
+    candidates = []
+    for by in ('verb', 'frame', 'fe'):
+        candidates.extend('/{}/{}'.format(by, key.replace(' ', '%20')) for key in index[by])
+    candidates.extend('/lu/{}'.format(lu_id) for lu_id in index['lu'])
+    return [random.choice(candidates) for _ in range(amount)]
+
+
+async def run_client(paths: list, host: str, port: int, unix_socket: str, latencies: list) -> None:
+    """Sends all given requests one after another over one keep-alive connection and records their latencies.
+
+    :param paths: List. Request paths.
+    :param host: String. Host of the service.
+    :param port: Integer. Port of the service.
+    :param unix_socket: String. Path of the Unix socket of the service. If given, host and port are ignored.
+    :param latencies: List. The latency of each request (seconds) is appended to this list.
+    :return: None.
+    """
+    if unix_socket is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_socket)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    for path in paths:
+        start = time.perf_counter()
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(path).encode('ascii'))
+        await writer.drain()
+
+        content_length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            if line.lower().startswith(b'content-length:'):
+                content_length = int(line.split(b':')[1])
+        await reader.readexactly(content_length)
+        latencies.append(time.perf_counter() - start)
+
+    writer.close()
+
+
+async def load_test(paths: list, concurrency: int, host: str, port: int, unix_socket: str) -> dict:
+    """Runs the load test with several concurrent clients.
+
+    :param paths: List. Request paths which are distributed over the clients.
+    :param concurrency: Integer. Amount of concurrent connections.
+    :param host: String. Host of the service.
+    :param port: Integer. Port of the service.
+    :param unix_socket: String. Path of the Unix socket of the service.
+    :return: Dictionary. Amount of requests, duration, requests per second and latency percentiles in milliseconds.
+    """
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[run_client(paths[i::concurrency], host, port, unix_socket, latencies)
+                           for i in range(concurrency)])
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {'requests': len(latencies),
+            'seconds': round(duration, 3),
+            'requests_per_second': round(len(latencies) / duration, 1),
+            'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test for the lookup service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None)
+    parser.add_argument('-n', '--requests', type=int, default=20000)
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    request_paths = sample_paths(load_index(), args.requests)
+    print(asyncio.run(load_test(request_paths, args.concurrency, args.host, args.port, args.unix_socket)))
@@ -0,0 +1,231 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import argparse
+import asyncio
+import functools
+import json
+from urllib.parse import unquote
+
+
+LOOKUP_TYPES = ('verb', 'lu', 'frame', 'fe')
+
+
+def build_index(mapping_verb_lu_cfs: dict, role_mappings: dict) -> dict:
+    """Builds an in-memory index over the verb - LU - CF mapping and the role mappings of all approaches.
+
+    One LU entry looks like this:
+    {'verb': 'verb', 'lu_id': 123, 'frame': 'Frame', 'connotation_frame': {CF},
+     'mappings': {'short': {'agent': ['FE'], 'theme': ['FE'], 'passive_count': 0}, ...}}
+
+    The returned dictionary looks like this:
+    {'lu': {123: entry}, 'verb': {'verb': [123]}, 'frame': {'Frame': [123]}, 'fe': {'FE': [123]}}
+
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id(s), values are the CFs.
+    :param role_mappings: Dictionary. Keys are the approaches ('naive', 'short', 'long'), values the role mappings.
+    :return: Dictionary. Keys are the lookup types, values are the respective indices.
+    """
+    index = {'lu': {}, 'verb': {}, 'frame': {}, 'fe': {}}
+
+    for key, connotation_frame in mapping_verb_lu_cfs.items():
+        verb = key[0]
+        lu_ids = key[1] if isinstance(key[1], tuple) else (key[1],)
+        for lu_id in lu_ids:
+            index['lu'][lu_id] = {'verb': verb, 'lu_id': lu_id, 'frame': None, 'connotation_frame': connotation_frame,
+                                  'mappings': {}}
+            index['verb'].setdefault(verb, []).append(lu_id)
+
+    for approach, role_mapping in role_mappings.items():
+        for lu_id, information in role_mapping.items():
+            if lu_id not in index['lu']:
+                index['lu'][lu_id] = {'verb': information[0], 'lu_id': lu_id, 'frame': None,
+                                      'connotation_frame': information[6] if len(information) > 6 else None,
+                                      'mappings': {}}
+                index['verb'].setdefault(information[0], []).append(lu_id)
+
+            if len(information) < 7:  # If no proper mapping was found
+                continue
+
+            entry = index['lu'][lu_id]
+            agent_fes = sorted(fe for fe in information[2] if fe != 'CF_Agent')
+            theme_fes = sorted(fe for fe in information[3] if fe != 'CF_Theme')
+            entry['frame'] = information[4]
+            entry['mappings'][approach] = {'agent': agent_fes, 'theme': theme_fes, 'passive_count': information[5]}
+
+            for fe in agent_fes + theme_fes:
+                lu_ids = index['fe'].setdefault(fe, [])
+                if lu_id not in lu_ids:
+                    lu_ids.append(lu_id)
+
+    for lu_id, entry in index['lu'].items():
+        if entry['frame'] is not None:
+            index['frame'].setdefault(entry['frame'], []).append(lu_id)
+
+    return index
+
+
+def load_index(approaches: list = None) -> dict:
+    """Loads the serialized mapping tables from obj/ and builds the lookup index.
+
+    :param approaches: List. Approaches whose role mappings shall be loaded. Default: all approaches.
+    :return: Dictionary. The lookup index (see build_index).
+    """
+    approaches = approaches if approaches is not None else list(ROLE_MAPPING_FILES)
+    mapping_verb_lu_cfs = load_obj('mapping_verb_lu_cfs')
+    role_mappings = {approach: load_obj(ROLE_MAPPING_FILES[approach]) for approach in approaches}
+    return build_index(mapping_verb_lu_cfs, role_mappings)
+
+
+def lookup(index: dict, by: str, key: str) -> list:
+    """Looks up all LU entries for a verb, LU ID, frame name or Frame Element name.
+
+    :param index: Dictionary. The lookup index (see build_index).
+    :param by: String. The lookup type: 'verb', 'lu', 'frame' or 'fe'.
+    :param key: String. The verb, LU ID, frame name or Frame Element name.
+    :return: List. The matching LU entries. Empty if nothing was found.
+    """
+    if by not in LOOKUP_TYPES:
+        raise ValueError("Unknown lookup type '{}'. Use one of {}".format(by, LOOKUP_TYPES))
+
+    if by == 'lu':
+        try:
+            lu_id = int(key)
+        except ValueError:
+            return []
+        return [index['lu'][lu_id]] if lu_id in index['lu'] else []
+
+    return [index['lu'][lu_id] for lu_id in index[by].get(key, [])]
+
+
+def make_responder(index: dict, cache_size: int = 65536) -> object:
+    """Creates a function which answers lookups with encoded JSON and caches the most recent responses.
+
+    :param index: Dictionary. The lookup index (see build_index).
+    :param cache_size: Integer. Maximum amount of cached responses.
+    :return: Function. Takes lookup type and key, returns the JSON response as bytes.
+    """
+    @functools.lru_cache(maxsize=cache_size)
+    def respond(by: str, key: str) -> bytes:
+        return json.dumps(lookup(index, by, key), ensure_ascii=False).encode('UTF-8')
+
+    return respond
+
+
+def http_response(status: str, body: bytes, keep_alive: bool) -> bytes:
+    """Builds a HTTP/1.1 response with a JSON body.
+
+    :param status: String. Status code and reason, e.g. '200 OK'.
+    :param body: Bytes. The encoded JSON body.
+    :param keep_alive: Boolean. Whether the connection is kept open.
+    :return: Bytes. The complete response.
+    """
+    header = 'HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+        status, len(body), 'keep-alive' if keep_alive else 'close')
+    return header.encode('ascii') + body
+
+
+def handle_request(respond: object, method: str, path: str, body: bytes) -> tuple:
+    """Answers one request.
+
+    GET /<type>/<key> answers a single lookup, e.g. GET /verb/abandon or GET /lu/1234.
+    POST /batch answers several lookups at once. The body looks like this: [{"by": "verb", "key": "abandon"}, ...]
+    and the response contains one result list per lookup in the same order.
+
+    :param respond: Function. Output of make_responder.
+    :param method: String. HTTP method.
+    :param path: String. Request path.
+    :param body: Bytes. Request body.
+    :return: Tuple. Status and encoded JSON body.
+    """
+    parts = [unquote(part) for part in path.split('?')[0].strip('/').split('/', 1)]
+
+    if method == 'GET' and len(parts) == 2 and parts[0] in LOOKUP_TYPES:
+        return '200 OK', respond(parts[0], parts[1])
+
+    if method == 'POST' and parts == ['batch']:
+        try:
+            queries = json.loads(body.decode('UTF-8'))
+            results = [respond(query['by'], str(query['key'])) for query in queries]
+        except (ValueError, KeyError, TypeError) as e:
+            return '400 Bad Request', json.dumps({'error': str(e)}).encode('UTF-8')
+        return '200 OK', b'[' + b','.join(results) + b']'
+
+    return '404 Not Found', json.dumps({'error': 'Unknown endpoint {} {}'.format(method, path)}).encode('UTF-8')
+
+
+async def serve_connection(handle: object, reader: object, writer: object) -> None:
+    """Serves all requests of one (keep-alive) connection.
+
+    :param handle: Function. Answers one request: handle(method, path, body) -> (status, body), e.g. handle_request
+    with a bound responder.
+    :param reader: Object. asyncio StreamReader of the connection.
+    :param writer: Object. asyncio StreamWriter of the connection.
+    :return: None.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            body = b''
+            if int(headers.get('content-length', 0)) > 0:
+                body = await reader.readexactly(int(headers['content-length']))
+
+            method, path, version = request_line.decode('latin-1').split()
+            keep_alive = headers.get('connection', '').lower() != 'close' and version != 'HTTP/1.0'
+
+            status, response_body = handle(method, path, body)
+            writer.write(http_response(status, response_body, keep_alive))
+            await writer.drain()
+
+            if not keep_alive:
+                break
+    except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(index: dict, host: str = '127.0.0.1', port: int = 8765, unix_socket: str = None,
+                cache_size: int = 65536) -> None:
+    """Runs the lookup service either on a TCP port or on a Unix socket until it is cancelled.
+
+    :param index: Dictionary. The lookup index (see build_index).
+    :param host: String. Host to bind to.
+    :param port: Integer. Port to bind to.
+    :param unix_socket: String. Path of a Unix socket. If given, host and port are ignored.
+    :param cache_size: Integer. Maximum amount of cached responses.
+    :return: None.
+    """
+    respond = make_responder(index, cache_size)
+    handler = functools.partial(serve_connection, functools.partial(handle_request, respond))
+
+    if unix_socket is not None:
+        server = await asyncio.start_unix_server(handler, path=unix_socket)
+        print('Serving on unix socket {}'.format(unix_socket))
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        print('Serving on http://{}:{}'.format(host, port))
+
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local lookup service for verb -> LU -> FE mapping -> CF.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', default=None)
+    parser.add_argument('--cache-size', type=int, default=65536)
+    args = parser.parse_args()
+
+    lookup_index = load_index()
+    asyncio.run(serve(lookup_index, args.host, args.port, args.unix_socket, args.cache_size))
@@ -0,0 +1,184 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+import preprocessing.serialization as serialization
+import detection_cache
+from collections.abc import Mapping
+import gc
+import os
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+
+
+MEASURES = ('rss', 'tracemalloc')
+
+# The collected role mappings are spilled once they take this share of the budget (see map_with_memory_budget) ...
+RESULT_SHARE = 0.25
+# ... or, if the process exceeds the budget, once they take at least this part of that share
+LOW_WATERMARK = 0.25
+
+
+def memory_usage(measure: str = 'rss') -> int:
+    """Returns the current memory usage of the process in bytes.
+
+    'rss' is the resident set size of the whole process (including spaCy's native memory), read from /proc on Linux.
+    'tracemalloc' only counts memory allocated by Python objects; tracing has to be started first (see
+    map_with_memory_budget). Where /proc is not available, 'rss' falls back to 'tracemalloc'.
+
+    :param measure: String. 'rss' or 'tracemalloc'.
+    :return: Integer. Used memory in bytes.
+    """
+    if measure == 'rss' and os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if measure not in MEASURES:
+        raise ValueError("Unknown measure '{}'. Use one of {}".format(measure, MEASURES))
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def release_memory() -> None:
+    """Releases everything that is only kept for speed: the in-memory detection results and unreachable objects
+    (e.g. parsed Docs in reference cycles)."""
+    detection_cache.flush()
+    detection_cache.release_memory()
+    gc.collect()
+
+
+class SpilledMapping(Mapping):
+    """Read-only role mapping whose entries were spilled to shards on disk (see map_with_memory_budget).
+
+    The entries are loaded shard by shard when they are accessed, and at most one shard is kept in memory; iterating
+    over the mapping reads every shard once. save_parts(mapping.parts(), name) saves it shard by shard as one
+    artifact, which load_obj reads as a plain dictionary, so the complete role mapping is never assembled in memory.
+    close() removes the shards.
+    """
+
+    def __init__(self, spill_dir: str, index: dict, remainder: dict, temporary: bool = False):
+        self.spill_dir = spill_dir
+        self.index = index  # {lu id: shard name}, None for the entries in remainder
+        self.remainder = remainder
+        self.temporary = temporary
+        self._shard_name = None
+        self._shard = {}
+
+    def __getitem__(self, lu_id):
+        name = self.index[lu_id]
+        if name is None:
+            return self.remainder[lu_id]
+        if name != self._shard_name:
+            self._shard = load_obj(name, root=self.spill_dir)
+            self._shard_name = name
+        return self._shard[lu_id]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def parts(self):
+        """Yields the entries as dictionaries, one per shard and one for the entries which were not spilled."""
+        for name in sorted(set(self.index.values()) - {None}):
+            yield load_obj(name, root=self.spill_dir)
+        yield self.remainder
+
+    def __reduce__(self):
+        raise TypeError('A SpilledMapping can not be pickled. Save it with save_parts(mapping.parts(), name)')
+
+    def close(self) -> None:
+        """Removes the shards if they are in a temporary directory."""
+        self._shard = {}
+        if self.temporary:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def spill(mapping: dict, spill_dir: str, spills: list, index: dict) -> None:
+    """Writes the role mapping collected so far as a shard to disk and empties it.
+
+    :param mapping: Dictionary. The partial role mapping, {lu id: [...]}.
+    :param spill_dir: String. Directory of the shards.
+    :param spills: List. Names of all shards written so far; the new shard is appended.
+    :param index: Dictionary. {lu id: shard name} of all mapped LUs; the LUs of the new shard are added.
+    :return: None.
+    """
+    name = 'spill_{:05d}'.format(len(spills))
+    save_obj(mapping, name, root=spill_dir)
+    spills.append(name)
+    index.update((lu_id, name) for lu_id in mapping)
+    mapping.clear()
+
+
+def map_with_memory_budget(nlp: object, mapping_verb_lu_cfs: dict, mapping_function: object, budget_mb: float,
+                           measure: str = 'rss', spill_dir: str = None) -> Mapping:
+    """Performs a role mapping LU by LU and keeps the memory usage below a budget by spilling results to disk.
+
+    The role mappings collected so far are written to a shard in spill_dir once their size (measured as the size of
+    the pickled entries) exceeds RESULT_SHARE of the budget, or once the memory usage of the process exceeds the
+    budget and they take at least LOW_WATERMARK of that share. Afterwards, the in-memory detection results are dropped
+    and the garbage collector is run. As the RSS of a process rarely shrinks after objects were freed, the second
+    condition only ensures that a full process spills earlier; it never produces shards of single LUs.
+
+    If nothing was spilled, the role mapping is returned as a dictionary. Otherwise, a SpilledMapping is returned
+    which reads the shards lazily, so the complete role mapping is never held in memory; close it after use (e.g.
+    after save_parts) to remove a temporary spill directory. Both contain the same entries as
+    mapping_function(nlp, mapping_verb_lu_cfs).
+
+    :param nlp: Object. Preloaded Language Model.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param mapping_function: Function. One of the role mapping methods, e.g. map_cf_roles_and_fes_short_phrase_all_sents
+    :param budget_mb: Float. Memory budget in megabytes.
+    :param measure: String. 'rss' or 'tracemalloc' (see memory_usage).
+    :param spill_dir: String. Directory for the shards. Default: a temporary directory in the artifact root which is
+    removed when the SpilledMapping is closed.
+    :return: Dictionary or SpilledMapping. Keys are LU IDs, values are the verbs, role mappings, CFs etc. (see the
+    mapping method)
+    """
+    budget = budget_mb * 1024 * 1024
+    result_budget = budget * RESULT_SHARE
+    temporary = spill_dir is None
+    if temporary:
+        os.makedirs(serialization.ARTIFACT_ROOT, exist_ok=True)
+        spill_dir = tempfile.mkdtemp(prefix='spill_', dir=serialization.ARTIFACT_ROOT)
+    started_tracing = measure == 'tracemalloc' and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    mapping = {}
+    mapping_bytes = 0
+    spills = []
+    index = {}
+    try:
+        for key, value in mapping_verb_lu_cfs.items():
+            result = mapping_function(nlp, {key: value})
+            mapping.update(result)
+            mapping_bytes += sum(len(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)) for entry in result.values())
+
+            if mapping_bytes > result_budget or \
+                    (mapping_bytes > result_budget * LOW_WATERMARK and memory_usage(measure) > budget):
+                spill(mapping, spill_dir, spills, index)
+                mapping_bytes = 0
+                release_memory()
+    except BaseException:
+        if temporary:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        raise
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    print('{} LUs spilled to disk in {} shards'.format(len(index), len(spills)))
+    if len(spills) == 0:
+        if temporary:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+        return mapping
+    index.update((lu_id, None) for lu_id in mapping)
+    return SpilledMapping(spill_dir, index, mapping, temporary)
@@ -0,0 +1,257 @@
+from preprocessing.serialization import load_obj
+import framenet_connotationframes_mapping as map
+from concurrent.futures import ProcessPoolExecutor
+from report import table_markdown
+from pipeline import repository_file
+import multiprocessing
+import importlib.util
+import argparse
+import resource
+import pickle
+import random
+import json
+import time
+
+
+# Pipelines which are benchmarked if they are installed
+MODELS = ['en_core_web_sm', 'en_core_web_md', 'en_core_web_lg', 'en_core_web_trf']
+
+ANNOTATORS = ('sina', 'lschmidt')
+
+
+def installed_models(names: list = None) -> list:
+    """Returns the names of the installed spaCy pipelines (default: MODELS)."""
+    return [name for name in names or MODELS if importlib.util.find_spec(name) is not None]
+
+
+def shown_fes(mapping_lines: list, role: str) -> set:
+    """Frame Elements shown for a role in one evaluated sentence, e.g. {'Speaker'} for
+    ["Agent Mapping: Speaker -> 'by Mrs Stych'", "Theme Mapping :Message -> 'reasons'"]."""
+    prefix = '{} Mapping'.format(role.capitalize())
+    return {line.split(':', 1)[1].split(' -> ')[0].strip() for line in mapping_lines if line.startswith(prefix)}
+
+
+def load_judgements(approach: str, annotators: tuple = ANNOTATORS) -> list:
+    """Reads the role mapping evaluation of an approach (eval/<annotator>_map_<approach>_eval.pkl). Every 'y' and 'n'
+    answer of every annotator is one judgement ('-' and '?' are left out).
+
+    One judgement looks like this: {'annotator': 'sina', 'lu_id': 655, 'lu_text': 'request', 'sentence': 'text',
+    'role': 'agent', 'fes': {'Speaker'}, 'correct': True}, i.e. the annotator judged whether the Frame Elements shown
+    for the role in the sentence fill this role.
+
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param annotators: Tuple. Names of the annotators.
+    :return: List. The judgements.
+    """
+    judgements = []
+    for annotator in annotators:
+        with open(repository_file('eval', '{}_map_{}_eval.pkl'.format(annotator, approach)), 'rb') as f:
+            evaluation = pickle.load(f)[1]  # {lu id: ['lu_text', lu id, 'frame', [sentence eval], ...]}
+        for lu_id, lu_eval in evaluation.items():
+            for sentence_eval in lu_eval[3:]:
+                # ['Agent Mapping: ...', 'Theme Mapping :...', 'sentence', 'Agent Answer: y', 'Theme Answer: n']
+                for role, index in (('agent', -2), ('theme', -1)):
+                    answer = sentence_eval[index][-1]
+                    if answer in ('y', 'n'):
+                        judgements.append({'annotator': annotator, 'lu_id': lu_id, 'lu_text': lu_eval[0],
+                                           'sentence': sentence_eval[-3], 'role': role,
+                                           'fes': shown_fes(sentence_eval[:-3], role), 'correct': answer == 'y'})
+    return judgements
+
+
+def predict_judged_sentences(nlp: object, approach: str, judgements: list, detectors: tuple = None) -> dict:
+    """Runs the detection methods of the approach on every judged sentence and aligns the results with the Frame
+    Elements of the sentence. The sentences are looked up among the exemplars of their LU by their text.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param judgements: List. Judgements as returned by load_judgements.
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :return: Dictionary. {(lu id, 'sentence'): {'agent': {FEs}, 'theme': {FEs}}} for the sentences found in FrameNet.
+    """
+    import preprocessing.framenet_store as fn
+
+    subject_detector, object_detector = detectors or map.DETECTORS[approach]
+    sentences = {}  # {lu id: ('lu_text', {sentences})}
+    for judgement in judgements:
+        sentences.setdefault(judgement['lu_id'], (judgement['lu_text'], set()))[1].add(judgement['sentence'])
+
+    predictions = {}
+    for lu_id, (lu_text, texts) in sentences.items():
+        exemplars = {example.text.strip(): example for example in fn.lu(lu_id).exemplars}
+        found = [(text, exemplars[text.strip()]) for text in sorted(texts) if text.strip() in exemplars]
+        for (text, example), doc in zip(found, nlp.pipe([example.text for _, example in found])):
+            agents, themes, _ = map.align_roles(subject_detector(nlp, doc, lu_text), object_detector(nlp, doc, lu_text),
+                                                example.frameAnnotation.FE[0], approach)
+            predictions[(lu_id, text)] = {'agent': set(agents), 'theme': set(themes)}
+    return predictions
+
+
+def agreement(predictions: dict, judgements: list) -> dict:
+    """Compares the Frame Elements which a model maps to each role in the judged sentences with the judgements: a
+    judgement agrees if the model maps one of the judged Frame Elements to the role in this sentence and the annotator
+    accepted them, or none of them and the annotator rejected them. So both missed and spurious mappings count.
+
+    :param predictions: Dictionary. Output of predict_judged_sentences.
+    :param judgements: List. Judgements as returned by load_judgements.
+    :return: Dictionary. Agreement overall, per role and per annotator (share of the judgements), the amount of
+    compared judgements and of judgements whose sentence was not found.
+    """
+    agreeing = {}
+    not_found = 0
+    for judgement in judgements:
+        prediction = predictions.get((judgement['lu_id'], judgement['sentence']))
+        if prediction is None:
+            not_found += 1
+            continue
+        agrees = (len(judgement['fes'] & prediction[judgement['role']]) > 0) == judgement['correct']
+        for group in ('all', judgement['role'], judgement['annotator']):
+            agreeing.setdefault(group, []).append(agrees)
+
+    def share(group):
+        return sum(agreeing[group]) / len(agreeing[group]) if len(agreeing.get(group, [])) > 0 else None
+
+    annotators = sorted({judgement['annotator'] for judgement in judgements})
+    return {'agreement': share('all'), 'agreement_agent': share('agent'), 'agreement_theme': share('theme'),
+            'agreement_annotators': {annotator: share(annotator) for annotator in annotators},
+            'judgements': len(agreeing.get('all', [])), 'not_found': not_found}
+
+
+def sample_lus(mapping_verb_lu_cfs: dict, judgements: list, extra: int = 0, seed: int = 0) -> dict:
+    """The fixed LU sample of the benchmark: all evaluated LUs and, for a larger speed sample, `extra` further LUs
+    picked randomly with a fixed seed.
+
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param judgements: List. Judgements as returned by load_judgements.
+    :param extra: Integer. Amount of additional LUs.
+    :param seed: Integer. Seed of the random sample.
+    :return: Dictionary. The sampled part of mapping_verb_lu_cfs.
+    """
+    evaluated = {judgement['lu_id'] for judgement in judgements}
+    others = sorted(key for key in mapping_verb_lu_cfs if key[1] not in evaluated)
+    picked = set(random.Random(seed).sample(others, min(extra, len(others))))
+    return {key: value for key, value in mapping_verb_lu_cfs.items() if key[1] in evaluated or key in picked}
+
+
+def peak_memory_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_model(model: str, approach: str, lus: dict, judgements: list, batch_size: int = 256) -> dict:
+    """Loads a pipeline and runs the role mapping of the approach on the LU sample (in a fresh worker process, so that
+    the peak memory belongs to this pipeline only).
+
+    :param model: String. Name of the spaCy pipeline.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param lus: Dictionary. The LU sample (see sample_lus).
+    :param judgements: List. Judgements as returned by load_judgements.
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :return: Dictionary. Load time, sentences per second, peak memory and agreement with the judgements (the judged
+    sentences are detected again with this pipeline, see predict_judged_sentences).
+    """
+    import spacy
+    baseline_memory = peak_memory_mb()
+    start = time.perf_counter()
+    nlp = spacy.load(model)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    role_mapping = map.map_cf_roles_and_fes_batched(nlp, lus, approach, batch_size)
+    seconds = time.perf_counter() - start
+    sentences = sum(entry[7]['sentences'] for entry in role_mapping.values() if len(entry) > 3)
+
+    return dict({'model': model, 'version': nlp.meta.get('version'), 'approach': approach, 'lus': len(lus),
+                 'sentences': sentences, 'load_seconds': load_seconds, 'seconds': seconds,
+                 'sentences_per_second': sentences / seconds if seconds > 0 else None,
+                 'peak_memory_mb': peak_memory_mb(), 'model_memory_mb': peak_memory_mb() - baseline_memory},
+                **agreement(predict_judged_sentences(nlp, approach, judgements), judgements))
+
+
+def mark_frontier(results: list, quality_bar: float = None) -> list:
+    """Marks the models on the speed/accuracy frontier (no other model is at least as fast and agrees at least as
+    well with the annotations, being better in one of them) and the recommended model: the fastest one whose
+    agreement reaches the quality bar.
+
+    :param results: List. Results as returned by run_model.
+    :param quality_bar: Float. Minimal agreement. Default: no recommendation.
+    :return: List. The results sorted by speed (fastest first) with 'frontier' and 'recommended' set.
+    """
+    def point(result):
+        return result['sentences_per_second'] or 0, result['agreement'] or 0
+
+    results = sorted(results, key=lambda result: -point(result)[0])
+    for result in results:
+        speed, quality = point(result)
+        result['frontier'] = not any(point(other)[0] >= speed and point(other)[1] >= quality and
+                                     point(other) != (speed, quality) for other in results)
+        result['recommended'] = False
+    if quality_bar is not None:
+        for result in results:
+            if (result['agreement'] or 0) >= quality_bar:
+                result['recommended'] = True
+                break
+    return results
+
+
+def frontier_table(results: list) -> dict:
+    """The frontier as a table ({'columns': [...], 'rows': [[...]]}, see report.table_markdown)."""
+    def rounded(value, digits):
+        return '-' if value is None else round(value, digits)
+
+    return {'columns': ['Model', 'Approach', 'Sentences/s', 'Load (s)', 'Peak memory (MB)', 'Agreement',
+                        'Agreement Agent', 'Agreement Theme', 'Frontier'],
+            'rows': [[result['model'], result['approach'], rounded(result['sentences_per_second'], 1),
+                      rounded(result['load_seconds'], 1), round(result['peak_memory_mb']),
+                      rounded(result['agreement'], 3), rounded(result['agreement_agent'], 3),
+                      rounded(result['agreement_theme'], 3),
+                      ('yes, recommended' if result['recommended'] else 'yes') if result['frontier'] else
+                      ('recommended' if result['recommended'] else '')]
+                     for result in results]}
+
+
+def benchmark(models: list, approach: str = 'short', extra: int = 0, seed: int = 0, batch_size: int = 256,
+              quality_bar: float = None) -> list:
+    """Benchmarks the role mapping of an approach with several pipelines on the same LU sample. The models run one
+    after another, each in its own process.
+
+    :param models: List. Names of the spaCy pipelines.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param extra: Integer. Amount of LUs sampled in addition to the evaluated ones.
+    :param seed: Integer. Seed of the LU sample.
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :param quality_bar: Float. Minimal agreement of the recommended model.
+    :return: List. The results (see run_model and mark_frontier).
+    """
+    judgements = load_judgements(approach)
+    lus = sample_lus(load_obj('mapping_verb_lu_cfs'), judgements, extra, seed)
+    results = []
+    for model in models:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results.append(executor.submit(run_model, model, approach, lus, judgements, batch_size).result())
+        print('{}: {:.1f} sentences/s, agreement {}'.format(model, results[-1]['sentences_per_second'] or 0,
+                                                             results[-1]['agreement']))
+    return mark_frontier(results, quality_bar)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the role mapping with several spaCy pipelines: speed, '
+                                                 'peak memory and agreement with the annotated evaluation (eval/).')
+    parser.add_argument('--models', nargs='+', help='Pipelines to compare (default: the installed ones of {})'
+                        .format(', '.join(MODELS)))
+    parser.add_argument('--approach', default='short', choices=sorted(map.DETECTORS))
+    parser.add_argument('--extra-lus', type=int, default=0, help='LUs sampled in addition to the evaluated ones')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--quality-bar', type=float, help='Minimal agreement; the fastest model reaching it is '
+                                                          'recommended')
+    parser.add_argument('-o', '--output', default='model_benchmark.json', help='JSON file with all results')
+    args = parser.parse_args()
+
+    models = args.models or installed_models()
+    if len(models) == 0:
+        parser.error('none of {} is installed'.format(', '.join(MODELS)))
+    benchmark_results = benchmark(models, args.approach, args.extra_lus, args.seed, args.batch_size, args.quality_bar)
+    with open(args.output, 'w', encoding='UTF-8') as output:
+        json.dump(benchmark_results, output, indent=1)
+    print(table_markdown(frontier_table(benchmark_results)))
@@ -0,0 +1,177 @@
+from preprocessing.serialization import load_obj
+import preprocessing.framenet_store as fn
+import framenet_connotationframes_mapping as map
+from concurrent.futures import ProcessPoolExecutor
+from spacy import displacy
+import argparse
+import html
+import os
+
+
+SENTENCES_PER_PAGE = 100
+
+# Colours of the highlighted spans
+COLOURS = {'FE': '#fde68a', 'Subject': '#a7f3d0', 'Object': '#bfdbfe'}
+
+
+def records_for_lus(lu_ids: list, mapping_verb_lu_cfs: dict = None) -> object:
+    """Yields the example sentences of LUs with their Frame Element spans.
+
+    One record looks like this: {'id': '123-0', 'lu_id': 123, 'lu_text': 'verb', 'sentence': 'text',
+    'fes': [(start, end, 'FE name')]}
+
+    :param lu_ids: List. The LU IDs.
+    :param mapping_verb_lu_cfs: Dictionary. Used to look up the verb of an LU. Default: the LU name without POS.
+    :return: Generator. The records.
+    """
+    verbs = {lu_id: verb for verb, lu_id in (mapping_verb_lu_cfs or {})}
+    for lu_id in lu_ids:
+        lu_object = fn.lu(lu_id)
+        lu_text = verbs[lu_id] if lu_id in verbs else lu_object.name.split('.')[0]
+        for number, example in enumerate(lu_object.exemplars):
+            yield {'id': '{}-{}'.format(lu_id, number), 'lu_id': lu_id, 'lu_text': lu_text, 'sentence': example.text,
+                   'fes': [tuple(fe) for fe in example.frameAnnotation.FE[0]]}
+
+
+def records_for_sentences(sentences: list, lu_text: str = None) -> object:
+    """Yields records (see records_for_lus) for plain sentences. Subjects and objects are only detected if the verb
+    (lu_text) is given."""
+    for number, sentence in enumerate(sentences):
+        yield {'id': 'sentence-{}'.format(number), 'lu_id': None, 'lu_text': lu_text, 'sentence': sentence, 'fes': []}
+
+
+def parse_records(nlp: object, records: object, approaches: list = ('short',), batch_size: int = 64) -> object:
+    """Parses the records in batches and detects subject and object of the LU with the detection methods of each
+    approach.
+
+    The yielded items only contain plain data (no Docs), so they can be rendered in other processes:
+    {'id': ..., 'sentence': 'text', 'parse': dependency parse for displacy (manual=True),
+     'highlights': [{'start': 0, 'end': 4, 'label': 'Subject (short)', 'kind': 'Subject'}], ...}
+
+    :param nlp: Object. Preloaded Language Model (shared by all sentences).
+    :param records: Iterable. Records as yielded by records_for_lus or records_for_sentences.
+    :param approaches: List. Approaches whose subjects/objects are highlighted ('naive', 'short', 'long').
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :return: Generator. The parsed items in the order of the records.
+    """
+    records = iter(records)
+    while True:
+        batch = [record for _, record in zip(range(batch_size), records)]
+        if len(batch) == 0:
+            return
+        for record, doc in zip(batch, nlp.pipe([record['sentence'] for record in batch], batch_size=batch_size)):
+            highlights = [{'start': fe[0], 'end': fe[1], 'label': fe[2], 'kind': 'FE'} for fe in record['fes']]
+            if record['lu_text'] is not None:
+                for approach in approaches:
+                    subject_detector, object_detector = map.DETECTORS[approach]
+                    for kind, detection in (('Subject', subject_detector(nlp, doc, record['lu_text'])),
+                                            ('Object', object_detector(nlp, doc, record['lu_text']))):
+                        for detected in map.split_detection(detection):
+                            label = '{} ({}{})'.format(kind, approach, ', passive' if detected[3] == 1 else '')
+                            highlights.append({'start': detected[1][0], 'end': detected[1][1], 'label': label,
+                                               'kind': kind})
+            yield dict(record, parse=displacy.parse_deps(doc), highlights=highlights)
+
+
+def highlight_html(sentence: str, highlight: dict) -> str:
+    """Renders the sentence with one highlighted span."""
+    return '{}<mark style="background:{}">{}</mark>{}'.format(
+        html.escape(sentence[:highlight['start']]), COLOURS[highlight['kind']],
+        html.escape(sentence[highlight['start']:highlight['end']]), html.escape(sentence[highlight['end']:]))
+
+
+def render_item(item: dict, output_dir: str) -> str:
+    """Writes the dependency parse of one item as <id>.svg and returns its HTML section (in a worker process).
+
+    :param item: Dictionary. A parsed item (see parse_records).
+    :param output_dir: String. Directory of the SVG files.
+    :return: String. HTML section with the highlighted spans and the parse.
+    """
+    svg = displacy.render(item['parse'], style='dep', manual=True, options={'compact': True})
+    svg_name = '{}.svg'.format(item['id'])
+    with open(os.path.join(output_dir, svg_name), 'w', encoding='UTF-8') as f:
+        f.write(svg)
+
+    title = html.escape(item['sentence']) if item['lu_id'] is None else '{} (LU {}): {}'.format(
+        html.escape(item['lu_text']), item['lu_id'], html.escape(item['sentence']))
+    rows = ''.join('<tr><td>{}</td><td>{}</td></tr>'.format(html.escape(highlight['label']),
+                                                           highlight_html(item['sentence'], highlight))
+                   for highlight in item['highlights'])
+    return '<section id="{0}"><h3>{1}</h3><table>{2}</table>{3}<p><a href="{4}">{4}</a></p></section>'.format(
+        html.escape(item['id']), title, rows, svg, svg_name)
+
+
+def write_page(output_dir: str, number: int, sections: list) -> str:
+    """Writes one HTML page with the sections of up to SENTENCES_PER_PAGE sentences and returns its file name."""
+    name = 'page_{:04d}.html'.format(number)
+    with open(os.path.join(output_dir, name), 'w', encoding='UTF-8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="UTF-8"><title>Dependency parses {}</title>'
+                '<style>td{{padding:1px 6px}}section{{border-bottom:1px solid #ccc}}</style></head><body>\n'
+                .format(number))
+        f.write('\n'.join(sections))
+        f.write('\n</body></html>\n')
+    return name
+
+
+def render_all(items: object, output_dir: str, jobs: int = 4) -> int:
+    """Renders all parsed items in parallel processes: one SVG file per sentence, HTML pages with the highlighted
+    spans and an index.html linking all pages.
+
+    :param items: Iterable. Parsed items (see parse_records). Consumed lazily, one page at a time.
+    :param output_dir: String. Output directory.
+    :param jobs: Integer. Amount of rendering processes.
+    :return: Integer. Amount of rendered sentences.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    items = iter(items)
+    pages = []
+    count = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            page_items = [item for _, item in zip(range(SENTENCES_PER_PAGE), items)]
+            if len(page_items) == 0:
+                break
+            sections = list(executor.map(render_item, page_items, [output_dir] * len(page_items), chunksize=10))
+            pages.append((write_page(output_dir, len(pages) + 1, sections), page_items[0]['id'], page_items[-1]['id']))
+            count += len(page_items)
+
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='UTF-8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="UTF-8"><title>Dependency parses</title></head><body>\n')
+        f.write('<p>{} sentences</p><ul>\n'.format(count))
+        f.write(''.join('<li><a href="{0}">{0}</a> ({1} &ndash; {2})</li>\n'.format(name, html.escape(first),
+                                                                                  html.escape(last))
+                        for name, first, last in pages))
+        f.write('</ul></body></html>\n')
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Renders the dependency parses of many sentences with the detected '
+                                                 'subjects/objects and Frame Elements highlighted.')
+    parser.add_argument('sentences', nargs='*', help='Sentences to be rendered')
+    parser.add_argument('--sentences-file', help='File with one sentence per line')
+    parser.add_argument('--lus', nargs='+', type=int, help='Renders all example sentences of these LUs')
+    parser.add_argument('--all-lus', action='store_true', help='Renders the example sentences of all mapped LUs')
+    parser.add_argument('--lu-text', help='Verb of the plain sentences (enables the subject/object detection)')
+    parser.add_argument('--approaches', nargs='+', default=['short'], choices=sorted(map.DETECTORS))
+    parser.add_argument('-o', '--output', default='parses')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('-j', '--jobs', type=int, default=4)
+    args = parser.parse_args()
+
+    import en_core_web_sm
+
+    sentences = list(args.sentences)
+    if args.sentences_file is not None:
+        with open(args.sentences_file, 'r', encoding='UTF-8') as sentences_file:
+            sentences += [line.strip() for line in sentences_file if line.strip() != '']
+    mapping = load_obj('mapping_verb_lu_cfs')
+    lus = sorted(lu_id for _, lu_id in mapping) if args.all_lus else (args.lus or [])
+
+    def all_records():
+        yield from records_for_sentences(sentences, args.lu_text)
+        yield from records_for_lus(lus, mapping)
+
+    rendered = render_all(parse_records(en_core_web_sm.load(), all_records(), args.approaches, args.batch_size),
+                          args.output, args.jobs)
+    print(rendered, 'sentences rendered to', os.path.join(args.output, 'index.html'))
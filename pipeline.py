@@ -0,0 +1,376 @@
+from preprocessing.serialization import load_obj
+from preprocessing.serialization import save_obj
+from preprocessing.serialization import save_parts
+from preprocessing.serialization import ROLE_MAPPING_FILES
+import preprocessing.serialization as serialization
+import profiling
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import functools
+import hashlib
+import json
+import os
+
+
+REPOSITORY = os.path.dirname(os.path.abspath(__file__))
+
+# Default artifact directory of the pipeline (if neither --artifact-root nor CF_ARTIFACT_ROOT is given). It is separate
+# from obj/, whose artifacts are the tracked reference results (e.g. of equivalence.py), so a pipeline run never
+# overwrites them. They are only regenerated on request: python pipeline.py --artifact-root obj
+PIPELINE_ROOT = os.path.join(REPOSITORY, 'build')
+
+
+def artifact(name: str) -> str:
+    """Returns the path of an artifact in the artifact directory (see preprocessing.serialization)."""
+    return serialization.artifact_path(name)
+
+
+def repository_file(*parts: str) -> str:
+    """Returns the path of a file relative to the repository."""
+    return os.path.join(REPOSITORY, *parts)
+
+
+def extract_lexicon() -> None:
+    """Stage: Extracts the Connotation Frame lexicon from data/full_frame_info.txt."""
+    from preprocessing.connotationframes_preprocessing import extract_verbs_and_cfs
+    save_obj(extract_verbs_and_cfs(repository_file('data', 'full_frame_info.txt')), 'extracted_cf_verbs')
+
+
+def count_frames() -> None:
+    """Stage: Counts the frames evoked by each Connotation Frame verb."""
+    import framenet_connotationframes_mapping as map
+    save_obj(map.cf_verbs_frame_count('extracted_cf_verbs'), 'cf_verb_frame_count_dict')
+
+
+def map_lus() -> None:
+    """Stage: Maps the Connotation Frames of the unambiguous verbs to their Lexical Units."""
+    import framenet_connotationframes_mapping as map
+    unambiguous_verbs = map.find_unambiguous_common_verbs(load_obj('cf_verb_frame_count_dict'))
+    save_obj(map.map_cfs_lus(unambiguous_verbs, load_obj('extracted_cf_verbs')), 'mapping_verb_lu_cfs')
+
+
+def role_mapping(approach: str) -> None:
+    """Stage: Maps the Connotation Frame roles to Frame Elements with one approach ('naive', 'short' or 'long')."""
+    import framenet_connotationframes_mapping as map
+    import detection_cache
+    import role_counts
+    import en_core_web_sm
+
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
+    if os.environ.get('CF_MEMORY_BUDGET_MB'):  # Spills intermediate results to disk (see memory_budget)
+        import memory_budget
+        result = memory_budget.map_with_memory_budget(en_core_web_sm.load(), load_obj('mapping_verb_lu_cfs'),
+                                                      map.MAPPING_FUNCTIONS[approach],
+                                                      float(os.environ['CF_MEMORY_BUDGET_MB']))
+    elif os.environ.get('CF_PIPELINED'):  # Overlaps FrameNet loading, parsing and alignment (see pipelined_mapping)
+        import pipelined_mapping
+        metrics = {}
+        result = pipelined_mapping.map_cf_roles_and_fes_pipelined(en_core_web_sm.load(),
+                                                                  load_obj('mapping_verb_lu_cfs'), approach,
+                                                                  metrics=metrics)
+        for queue_name, queue_metrics in metrics.items():
+            print('[{}] queue {}: max depth {}, mean depth {:.1f}, blocked {:.1f}s, starved {:.1f}s'.format(
+                approach, queue_name, queue_metrics['max_depth'], queue_metrics['mean_depth'],
+                queue_metrics['put_wait_seconds'], queue_metrics['get_wait_seconds']))
+    else:
+        result = map.MAPPING_FUNCTIONS[approach](en_core_web_sm.load(), load_obj('mapping_verb_lu_cfs'))
+    try:
+        if hasattr(result, 'parts'):  # Role mapping read from spilled shards (see memory_budget.SpilledMapping)
+            save_parts(result.parts(), ROLE_MAPPING_FILES[approach])
+        else:
+            save_obj(result, ROLE_MAPPING_FILES[approach])
+        save_obj(role_counts.count_matrices(result), ROLE_MAPPING_FILES[approach] + '_counts')
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    detection_cache.flush()
+
+
+def frame_relation_index() -> None:
+    """Stage: Precomputes the frame relation index from FrameNet's frame-to-frame and FE relations."""
+    import frame_relations
+    save_obj(frame_relations.build_index(), frame_relations.INDEX_NAME)
+
+
+def propagate_mappings(approach: str) -> None:
+    """Stage: Infers the role mappings of LUs without exemplars from related LUs (see frame_relations)."""
+    import frame_relations
+    save_obj(frame_relations.propagate_mappings(load_obj(ROLE_MAPPING_FILES[approach]), load_obj('mapping_verb_lu_cfs'),
+                                                load_obj(frame_relations.INDEX_NAME)),
+             ROLE_MAPPING_FILES[approach] + '_propagated')
+
+
+def pick_lus() -> None:
+    """Stage: Picks the LUs for the evaluation from the short phrase role mapping.
+
+    The LUs are picked randomly, so they are saved as artifact 'picked_lus'. The LUs of the existing evaluation
+    (eval/picked_lus.pkl) are never replaced.
+    """
+    import evaluation
+    import detection_cache
+    import en_core_web_sm
+
+    detection_cache.configure(disk_path=os.path.join(serialization.ARTIFACT_ROOT, 'detection_cache.sqlite'))
+    picked_lus = evaluation.pick_lus_for_evaluation(en_core_web_sm.load(), load_obj(ROLE_MAPPING_FILES['short']))
+    save_obj(picked_lus, 'picked_lus')
+
+
+def plot_frames() -> None:
+    """Stage: Plots the amount of frames evoked per verb."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import statistics
+    statistics.plot_verb_frame_amount(statistics.frames_per_verb(load_obj('cf_verb_frame_count_dict')),
+                                      plot_path(), show=False)
+
+
+def plot_path() -> str:
+    """Returns the path of the frame amount plot in the artifact directory (plots/ contains the tracked plot)."""
+    return os.path.join(serialization.ARTIFACT_ROOT, 'lus_frames_amount_updated.png')
+
+
+def run_stage(run: object, name: str) -> None:
+    """Runs a stage, profiled under its own name if profiling is switched on (see profiling.start)."""
+    profiling.start(name)
+    try:
+        run()
+    finally:
+        profiling.stop()
+
+
+def declare_stages() -> dict:
+    """Declares all stages of the pipeline with their inputs, outputs and source files.
+
+    One declaration looks like this: {'run': function, 'inputs': [paths], 'outputs': [paths], 'code': [source files]}
+    The order of the stages is derived from their inputs and outputs.
+
+    :return: Dictionary. Keys are stage names, values are the stage declarations.
+    """
+    mapping_code = ['framenet_connotationframes_mapping.py', 'detection_cache.py', 'role_counts.py',
+                    'pipelined_mapping.py',
+                    os.path.join('preprocessing', 'framenet_preprocessing.py'),
+                    os.path.join('preprocessing', 'framenet_store.py')]
+
+    stages = {
+        'extract_lexicon': {'run': extract_lexicon,
+                            'inputs': [repository_file('data', 'full_frame_info.txt')],
+                            'outputs': [artifact('extracted_cf_verbs')],
+                            'code': [os.path.join('preprocessing', 'connotationframes_preprocessing.py')]},
+        'count_frames': {'run': count_frames,
+                         'inputs': [artifact('extracted_cf_verbs')],
+                         'outputs': [artifact('cf_verb_frame_count_dict')],
+                         'code': mapping_code},
+        'map_lus': {'run': map_lus,
+                    'inputs': [artifact('extracted_cf_verbs'), artifact('cf_verb_frame_count_dict')],
+                    'outputs': [artifact('mapping_verb_lu_cfs')],
+                    'code': mapping_code},
+        'pick_lus': {'run': pick_lus,
+                     'inputs': [artifact(ROLE_MAPPING_FILES['short'])],
+                     'outputs': [artifact('picked_lus')],
+                     'code': mapping_code + ['evaluation.py']},
+        'frame_relation_index': {'run': frame_relation_index,
+                                 'inputs': [],
+                                 'outputs': [artifact('frame_relation_index')],
+                                 'code': ['frame_relations.py']},
+        'plot_frames': {'run': plot_frames,
+                        'inputs': [artifact('cf_verb_frame_count_dict')],
+                        'outputs': [plot_path()],
+                        'code': ['statistics.py']},
+    }
+
+    for approach, name in ROLE_MAPPING_FILES.items():
+        stages['role_mapping_' + approach] = {'run': functools.partial(role_mapping, approach),
+                                              'inputs': [artifact('mapping_verb_lu_cfs')],
+                                              'outputs': [artifact(name), artifact(name + '_counts')],
+                                              'code': mapping_code}
+        stages['propagate_' + approach] = {'run': functools.partial(propagate_mappings, approach),
+                                           'inputs': [artifact(name), artifact('mapping_verb_lu_cfs'),
+                                                      artifact('frame_relation_index')],
+                                           'outputs': [artifact(name + '_propagated')],
+                                           'code': ['frame_relations.py', 'role_counts.py']}
+    return stages
+
+
+def file_hash(path: str) -> str:
+    """Returns the sha256 hash of a file's content, None if the file does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(stage: dict) -> dict:
+    """Computes the hashes of all inputs and the code version of a stage.
+
+    :param stage: Dictionary. A stage declaration.
+    :return: Dictionary. {'inputs': {path: hash}, 'code': hash of all source files}
+    """
+    code = hashlib.sha256()
+    for source in stage['code']:
+        code.update((file_hash(repository_file(source)) or '').encode('ascii'))
+    return {'inputs': {path: file_hash(path) for path in stage['inputs']}, 'code': code.hexdigest()}
+
+
+def state_path() -> str:
+    """Returns the path of the file in which the fingerprints of all finished stages are stored."""
+    return os.path.join(serialization.ARTIFACT_ROOT, 'pipeline_state.json')
+
+
+def load_state() -> dict:
+    """Loads the fingerprints of all finished stages."""
+    if not os.path.exists(state_path()):
+        return {}
+    with open(state_path(), 'r', encoding='UTF-8') as f:
+        return json.load(f)
+
+
+def save_state(state: dict) -> None:
+    """Saves the fingerprints of all finished stages atomically."""
+    temp_path = state_path() + '.tmp'
+    with open(temp_path, 'w', encoding='UTF-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temp_path, state_path())
+
+
+def is_up_to_date(stage: dict, recorded: dict) -> bool:
+    """Checks whether a stage can be skipped: inputs and code are unchanged and all outputs are unchanged.
+
+    :param stage: Dictionary. A stage declaration.
+    :param recorded: Dictionary. The fingerprint recorded after the last run of the stage (None if never run).
+    :return: Boolean. True if the stage can be skipped.
+    """
+    if recorded is None:
+        return False
+    current = fingerprint(stage)
+    if current['inputs'] != recorded['inputs'] or current['code'] != recorded['code']:
+        return False
+    return all(file_hash(path) is not None and file_hash(path) == recorded['outputs'].get(path)
+               for path in stage['outputs'])
+
+
+def dependencies(stages: dict) -> dict:
+    """Derives the dependencies between the stages from their inputs and outputs.
+
+    :param stages: Dictionary. The stage declarations.
+    :return: Dictionary. Keys are stage names, values are sets of the stages they depend on.
+    """
+    producers = {path: name for name, stage in stages.items() for path in stage['outputs']}
+    return {name: {producers[path] for path in stage['inputs'] if path in producers}
+            for name, stage in stages.items()}
+
+
+def select_stages(stages: dict, targets: list) -> set:
+    """Selects the target stages and all stages they (transitively) depend on.
+
+    :param stages: Dictionary. The stage declarations.
+    :param targets: List. Names of the target stages. Empty means all stages.
+    :return: Set. Names of the selected stages.
+    """
+    if len(targets) == 0:
+        return set(stages)
+    depends_on = dependencies(stages)
+    selected = set()
+    todo = list(targets)
+    while len(todo) > 0:
+        name = todo.pop()
+        if name not in stages:
+            raise ValueError("Unknown stage '{}'. Available stages: {}".format(name, sorted(stages)))
+        if name not in selected:
+            selected.add(name)
+            todo.extend(depends_on[name])
+    return selected
+
+
+def run_pipeline(targets: list = (), force: bool = False, jobs: int = 3) -> dict:
+    """Runs the selected stages in dependency order. Independent stages run concurrently in separate processes.
+
+    A stage is skipped if its inputs, its source files and its outputs did not change since its last run.
+
+    :param targets: List. Names of the target stages. Empty means all stages.
+    :param force: Boolean. If True, no stage is skipped.
+    :param jobs: Integer. Maximum amount of stages running at the same time.
+    :return: Dictionary. Keys are stage names, values are 'skipped' or 'done'.
+    """
+    stages = declare_stages()
+    selected = select_stages(stages, list(targets))
+    depends_on = {name: deps & selected for name, deps in dependencies(stages).items() if name in selected}
+    state = load_state()
+    status = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while len(status) < len(selected):
+            ready = [name for name in sorted(selected) if name not in status and name not in running.values()
+                     and all(status.get(dependency) in ('skipped', 'done') for dependency in depends_on[name])]
+
+            for name in ready:
+                if not force and is_up_to_date(stages[name], state.get(name)):
+                    status[name] = 'skipped'
+                    print('[skipped] {}'.format(name))
+                else:
+                    print('[running] {}'.format(name))
+                    running[executor.submit(run_stage, stages[name]['run'], name)] = name
+
+            if len(ready) > 0 and len(running) == 0:
+                continue  # Newly skipped stages may have made other stages ready
+            if len(running) == 0:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()  # Raises the exception of a failed stage
+                recorded = fingerprint(stages[name])
+                recorded['outputs'] = {path: file_hash(path) for path in stages[name]['outputs']}
+                state[name] = recorded
+                save_state(state)
+                status[name] = 'done'
+                print('[done] {}'.format(name))
+
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the stages of the mapping pipeline which are out of date.')
+    parser.add_argument('stages', nargs='*', help='Target stages (default: all). Dependencies are included.')
+    parser.add_argument('--force', action='store_true', help='Runs all selected stages, even if up to date')
+    parser.add_argument('-j', '--jobs', type=int, default=3, help='Maximum amount of concurrent stages')
+    parser.add_argument('--list', action='store_true', help='Lists all stages and whether they are up to date')
+    parser.add_argument('--artifact-root', help='Artifact directory (default: CF_ARTIFACT_ROOT or build/). Only '
+                                                'obj/ overwrites the tracked reference artifacts')
+    parser.add_argument('--memory-budget', type=float, help='Memory budget of all role mapping stages together in MB')
+    parser.add_argument('--pipelined', action='store_true', help='Role mapping with overlapping FrameNet loading, '
+                                                                 'parsing and alignment (pipelined_mapping.py)')
+    parser.add_argument('--profile', help='Writes cProfile stats and collapsed stacks per stage to this directory')
+    parser.add_argument('--profile-sample', type=float, help='Interval of the sampling profiler in seconds')
+    parser.add_argument('--profile-top', type=int, help='Prints the N hottest functions of each stage')
+    args = parser.parse_args()
+
+    # Inherited by the stage processes
+    serialization.set_artifact_root(args.artifact_root or os.environ.get('CF_ARTIFACT_ROOT') or PIPELINE_ROOT)
+    os.environ['CF_ARTIFACT_ROOT'] = serialization.ARTIFACT_ROOT
+    os.makedirs(serialization.ARTIFACT_ROOT, exist_ok=True)
+    if args.memory_budget is not None:
+        # Inherited by the stage processes. The role mapping stages run at the same time, so each gets its share.
+        concurrent_stages = min(args.jobs, sum(name.startswith('role_mapping_')
+                                               for name in select_stages(declare_stages(), args.stages)))
+        os.environ['CF_MEMORY_BUDGET_MB'] = str(args.memory_budget / max(concurrent_stages, 1))
+    if args.pipelined:
+        os.environ['CF_PIPELINED'] = '1'
+    for variable, value in ((profiling.PROFILE_ENV, args.profile), (profiling.SAMPLE_ENV, args.profile_sample),
+                            (profiling.TOP_ENV, args.profile_top)):
+        if value is not None:
+            os.environ[variable] = str(value)
+
+    if args.list:
+        pipeline_state = load_state()
+        pipeline_dependencies = dependencies(declare_stages())
+        for stage_name, declaration in declare_stages().items():
+            up_to_date = is_up_to_date(declaration, pipeline_state.get(stage_name))
+            print('{:<22} {:<11} after: {}'.format(stage_name, 'up to date' if up_to_date else 'out of date',
+                                                   ', '.join(sorted(pipeline_dependencies[stage_name])) or '-'))
+    else:
+        run_pipeline(args.stages, args.force, args.jobs)
@@ -0,0 +1,186 @@
+import preprocessing.framenet_store as fn
+import framenet_connotationframes_mapping as map
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import queue
+import threading
+import time
+
+
+_DONE = object()  # Marks the end of a queue
+
+
+def queue_metrics(capacity: int) -> dict:
+    """Empty metrics of one bounded queue.
+
+    'max_depth' / 'mean_depth': Items waiting in the queue, sampled whenever an item is put or taken
+    'put_wait_seconds': Time the producing stage was blocked because the queue was full (backpressure)
+    'get_wait_seconds': Time the consuming stage waited for an item (starvation)
+    """
+    return {'capacity': capacity, 'items': 0, 'max_depth': 0, 'depth_sum': 0, 'samples': 0, 'put_wait_seconds': 0.0,
+            'get_wait_seconds': 0.0}
+
+
+def sample_depth(metrics: dict, depth: int) -> None:
+    """Records the current depth of a queue."""
+    metrics['max_depth'] = max(metrics['max_depth'], depth)
+    metrics['depth_sum'] += depth
+    metrics['samples'] += 1
+
+
+def put(bounded_queue: queue.Queue, item: object, metrics: dict) -> None:
+    """Puts an item into a bounded queue, blocking while it is full, and records the metrics."""
+    start = time.perf_counter()
+    bounded_queue.put(item)
+    metrics['put_wait_seconds'] += time.perf_counter() - start
+    if item is not _DONE and not isinstance(item, BaseException):
+        metrics['items'] += 1
+    sample_depth(metrics, bounded_queue.qsize())
+
+
+def get(bounded_queue: queue.Queue, metrics: dict) -> object:
+    """Takes the next item from a bounded queue, waiting while it is empty, and records the metrics. Errors of the
+    producing stage are raised again."""
+    start = time.perf_counter()
+    item = bounded_queue.get()
+    metrics['get_wait_seconds'] += time.perf_counter() - start
+    sample_depth(metrics, bounded_queue.qsize())
+    if isinstance(item, BaseException):
+        raise item
+    return item
+
+
+def load_lu(lu_text: str, lu_id: int, cf: object) -> dict:
+    """Loads an LU and its exemplars from FrameNet (in a prefetch thread)."""
+    lu_object = fn.lu(lu_id)
+    return {'lu_text': lu_text, 'lu_id': lu_id, 'cf': cf, 'lu_object': lu_object, 'examples': lu_object.exemplars}
+
+
+def load_stage(mapping_verb_lu_cfs: dict, loaded: queue.Queue, metrics: dict, threads: int,
+               stop: threading.Event) -> None:
+    """Stage 1: Loads the LUs with a thread pool and puts them into the queue in the order of the mapping. At most
+    `threads` LUs are loaded ahead of a full queue.
+
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param loaded: Queue. Output queue of the loaded LUs.
+    :param metrics: Dictionary. Metrics of the output queue.
+    :param threads: Integer. Amount of prefetch threads.
+    :param stop: Event. Set if a later stage failed.
+    :return: None.
+    """
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = collections.deque()
+            for (lu_text, lu_id), cf in mapping_verb_lu_cfs.items():
+                if stop.is_set():
+                    break
+                futures.append(executor.submit(load_lu, lu_text, lu_id, cf))
+                if len(futures) >= threads:
+                    put(loaded, futures.popleft().result(), metrics)
+            while len(futures) > 0 and not stop.is_set():
+                put(loaded, futures.popleft().result(), metrics)
+        put(loaded, _DONE, metrics)
+    except BaseException as error:
+        put(loaded, error, metrics)
+
+
+def parse_stage(nlp: object, loaded: queue.Queue, parsed: queue.Queue, metrics: dict, batch_size: int,
+                stop: threading.Event) -> None:
+    """Stage 2: Parses the exemplars of the loaded LUs with one continuous nlp.pipe, so the batches span several LUs,
+    and puts each LU with its Docs into the output queue as soon as all of its exemplars are parsed.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param loaded: Queue. Input queue of the loaded LUs.
+    :param parsed: Queue. Output queue of the parsed LUs.
+    :param metrics: Dictionary. Metrics of both queues, {'loaded': {...}, 'parsed': {...}}.
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :param stop: Event. Set if a later stage failed.
+    :return: None.
+    """
+    pending = collections.deque()  # [loaded LU, its Docs] in the order of the LUs
+
+    def sentences():
+        while not stop.is_set():
+            item = get(loaded, metrics['loaded'])
+            if item is _DONE:
+                return
+            pending.append([item, []])
+            yield from (example.text for example in item['examples'])
+
+    def emit_complete():
+        while len(pending) > 0 and len(pending[0][1]) == len(pending[0][0]['examples']):
+            item, docs = pending.popleft()
+            put(parsed, dict(item, docs=docs), metrics['parsed'])
+
+    try:
+        for doc in nlp.pipe(sentences(), batch_size=batch_size):
+            for item, docs in pending:
+                if len(docs) < len(item['examples']):
+                    docs.append(doc)
+                    break
+            emit_complete()
+        emit_complete()
+        put(parsed, _DONE, metrics['parsed'])
+    except BaseException as error:
+        put(parsed, error, metrics['parsed'])
+
+
+def map_cf_roles_and_fes_pipelined(nlp: object, mapping_verb_lu_cfs: dict, approach: str = 'short',
+                                   batch_size: int = 256, prefetch_threads: int = 4, queue_size: int = 64,
+                                   detectors: tuple = None, metrics: dict = None) -> dict:
+    """Role mapping of one approach in three overlapping stages connected by bounded queues:
+    1. A thread pool loads the LUs and their exemplars from FrameNet (I/O).
+    2. A parse thread parses the exemplars of consecutive LUs in batches (nlp.pipe).
+    3. The calling thread detects subjects and objects and aligns them with the Frame Elements (map_lu_from_docs).
+
+    If a stage is slower than the next one, the queue in between fills up and blocks the faster stage (backpressure),
+    so at most queue_size LUs wait between two stages. The result is the same as the one of
+    map_cf_roles_and_fes_batched (and the role mapping method of the approach, see equivalence.py).
+
+    :param nlp: Object. Preloaded Language Model.
+    :param mapping_verb_lu_cfs: Dictionary. Keys are a tuple containing verb and lu id, values are the respective CF.
+    :param approach: String. 'naive', 'short' or 'long'.
+    :param batch_size: Integer. Amount of sentences parsed together.
+    :param prefetch_threads: Integer. Amount of threads loading LUs (1 if the FrameNet store is not compiled, as
+    nltk's reader is not thread-safe).
+    :param queue_size: Integer. Capacity of the queues between the stages, in LUs.
+    :param detectors: Tuple. Subject and object detection method. Default: the detection methods of the approach.
+    :param metrics: Dictionary. If given, it is filled with the metrics of both queues, {'loaded': {...},
+    'parsed': {...}} (see queue_metrics), e.g. to find the bottleneck stage.
+    :return: Dictionary. Keys are LU IDs, values are the verbs, role mappings, CFs and counts in a list.
+    """
+    metrics = metrics if metrics is not None else {}
+    metrics.update(loaded=queue_metrics(queue_size), parsed=queue_metrics(queue_size))
+    loaded = queue.Queue(maxsize=queue_size)
+    parsed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    threads = [threading.Thread(target=load_stage, daemon=True, name='load',
+                                args=(mapping_verb_lu_cfs, loaded, metrics['loaded'],
+                                      prefetch_threads if fn.is_compiled() else 1, stop)),
+               threading.Thread(target=parse_stage, daemon=True, name='parse',
+                                args=(nlp, loaded, parsed, metrics, batch_size, stop))]
+    for thread in threads:
+        thread.start()
+
+    mapping = {}
+    try:
+        while True:
+            item = get(parsed, metrics['parsed'])
+            if item is _DONE:
+                break
+            mapping[item['lu_id']] = map.map_lu_from_docs(nlp, item['lu_text'], item['lu_id'], item['cf'],
+                                                          item['lu_object'], item['examples'], item['docs'], approach,
+                                                          detectors)
+    finally:
+        stop.set()
+        while any(thread.is_alive() for thread in threads):
+            for bounded_queue in (parsed, loaded):  # Unblocks stages waiting for space in a full queue
+                while not bounded_queue.empty():
+                    bounded_queue.get_nowait()
+            for thread in threads:
+                thread.join(timeout=0.01)
+
+    for stage_metrics in metrics.values():
+        stage_metrics['mean_depth'] = stage_metrics['depth_sum'] / stage_metrics['samples'] \
+            if stage_metrics['samples'] > 0 else 0
+    return mapping
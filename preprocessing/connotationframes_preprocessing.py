@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
-from serialization import save_obj
-from serialization import load_obj
+from preprocessing.serialization import save_obj
+from preprocessing.serialization import load_obj
 import os
+import profiling
 
 
+@profiling.profiled('lexicon_load')
 def extract_verbs_and_cfs(filename: str) -> dict:
     """Creates a dictionary of all English verbs and their respective Connotation Frames.
 
@@ -40,5 +42,7 @@ def extract_verbs_and_cfs(filename: str) -> dict:
 
 
 if __name__ == '__main__':
-    extracted_cf_verbs = extract_verbs_and_cfs('/mntpnts/theses_diddley/ws20/lschmidt/data/full_frame_info.txt')
-    save_obj(extracted_cf_verbs, 'extracted_cf_verbs', up=True)
\ No newline at end of file
+    profiling.start('extract_lexicon')
+    extracted_cf_verbs = extract_verbs_and_cfs(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                            'data', 'full_frame_info.txt'))
+    save_obj(extracted_cf_verbs, 'extracted_cf_verbs')
\ No newline at end of file
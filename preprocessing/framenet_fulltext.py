@@ -0,0 +1,52 @@
+import itertools
+
+
+def iter_fulltext_records(lu_ids: set = None, document_name: str = None) -> object:
+    """Lazily yields the annotated targets of the FrameNet full-text documents.
+
+    Only one document is loaded at a time, so the memory usage does not depend on the amount of documents. One record
+    looks like this:
+    {'lu_id': 123, 'lu_name': 'hate.v', 'frame': 'Experiencer_focus', 'document': 23, 'sentence': 'text',
+     'fes': [(start pos, end pos, 'Frame Element name'), ...]}
+
+    :param lu_ids: Set. Only targets of these LUs are yielded. None yields the targets of all LUs.
+    :param document_name: String. Regular expression for the file names of the documents, e.g. 'ANC__'. None reads all.
+    :return: Generator. Yields the records as dictionaries.
+    """
+    from nltk.corpus import framenet as nltk_fn
+
+    for metadata in nltk_fn.docs_metadata(document_name):
+        document = nltk_fn.doc(metadata.ID)
+        for sentence in document.sentence:
+            for annotation_set in sentence.annotationSet[1:]:  # The first annotation set contains the POS tags
+                lu_id = annotation_set.get('luID')
+                if lu_id is None or (lu_ids is not None and lu_id not in lu_ids):
+                    continue
+                fes = annotation_set.get('FE', ([], {}))[0]
+                if len(fes) == 0:
+                    continue
+                yield {'lu_id': lu_id, 'lu_name': annotation_set.luName, 'frame': annotation_set.frameName,
+                       'document': metadata.ID, 'sentence': sentence.text, 'fes': [tuple(fe) for fe in fes]}
+        del document
+
+
+def iter_parsed_records(nlp: object, records: object, batch_size: int = 256) -> object:
+    """Parses the sentences of a stream of records in batches with nlp.pipe.
+
+    Every sentence is parsed once per batch, even if it contains several targets. Only the Docs of one batch are in
+    memory at a time.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param records: Iterable. Records as yielded by iter_fulltext_records.
+    :param batch_size: Integer. Amount of records per batch.
+    :return: Generator. Yields tuples (record, Doc of the sentence).
+    """
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if len(batch) == 0:
+            return
+        sentences = list(dict.fromkeys(record['sentence'] for record in batch))
+        docs = dict(zip(sentences, nlp.pipe(sentences)))
+        for record in batch:
+            yield record, docs[record['sentence']]
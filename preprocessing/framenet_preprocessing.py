@@ -1,6 +1,9 @@
-from nltk.corpus import framenet as fn
+import preprocessing.framenet_store as fn
 import random
+import itertools
 import framenet_connotationframes_mapping as map
+import detection_cache
+import profiling
 
 
 def regex(verb: str) -> str:
@@ -13,6 +16,7 @@ def regex(verb: str) -> str:
     return regex
 
 
+@profiling.profiled('framenet_lookup')
 def frame_count(verb: str) -> int:
     """ Counts the amount of evoked frames in FrameNet per verb.
 
@@ -54,48 +58,56 @@ def get_lu_examples(lu: object) -> list:
     return examples
 
 
-def get_examples_containing_subj_and_obj(nlp, lu: object, lu_text: str) -> list:
-    """ Retrieves and example sentence for a lexical unit which is meant to contain both a subject and an object.
+def iter_examples_containing_subj_and_obj(nlp, lu: object, lu_text: str) -> object:
+    """ Lazily yields the example sentences of a lexical unit which contain a subject and/or an object.
 
-    As soon as one sentence is found which contains a subject and an object, this sentence will be returned.
-    If no sentence contains both subject and object the first sentence containing a subject will be returned.
-    If no sentence contains a subject the first sentence containing an object will be returned.
-    If still no sentence could be found, no sentence will be returned.
+    The sentences are yielded in the following priority order:
+    First all sentences containing both a subject and an object - as soon as they are found.
+    Then all sentences containing only a subject, then all sentences containing only an object.
+    Each sentence is parsed at most once. As the sentences are processed lazily, no further sentence will be parsed
+    once the caller stops iterating, e.g. after the first sentence containing both a subject and an object.
 
+    :param nlp: Object. Preloaded Language Model.
     :param lu_text: String. The Lexical Unit as a string.
     :param lu: Object. The Lexical Unit as a FrameNet Object.
-    :return: List. Contains one or more sentences in string format.
+    :return: Generator. Yields FrameNet example sentence objects.
     """
-    all_examples = get_lu_examples(lu)
-
     sent_containing_subject = []
     sent_containing_object = []
-    sent_containing_subject_object = []
 
-    for example in all_examples:
-        counter = 0
-        sentence_text = example.text
+    for example in get_lu_examples(lu):
+        logical_subject, logical_object = detection_cache.detect_all(nlp, [map.detect_subject, map.detect_object],
+                                                                     example.text, lu_text)
 
-        logical_subject = map.detect_subject(nlp, sentence_text, lu_text)
-        if len(logical_subject) > 0:
+        if len(logical_subject) > 0 and len(logical_object) > 0:
+            yield example
+        elif len(logical_subject) > 0:
             sent_containing_subject.append(example)
-            counter += 1
-        # print('Das logische Subjekt dieses Beispielsatzes ist: ' + str(logical_subject))
-
-        logical_object = map.detect_object(nlp, sentence_text, lu_text)
-        if len(logical_object) > 0:
+        elif len(logical_object) > 0:
             sent_containing_object.append(example)
-            counter +=1
-        # print('Das logische Objekt dieses Beispielsatzes ist: ' + str(logical_object))
 
-        if counter == 2:
-            sent_containing_subject_object.append(example)
+    for example in sent_containing_subject:
+        yield example
 
-    if len(sent_containing_subject_object) > 0:
-        return sent_containing_subject_object
+    for example in sent_containing_object:
+        yield example
 
-    else:
-        return sent_containing_subject if len(sent_containing_subject) != 0 else sent_containing_object
+
+def get_examples_containing_subj_and_obj(nlp, lu: object, lu_text: str, amount: int = None) -> list:
+    """ Retrieves example sentences for a lexical unit which are meant to contain both a subject and an object.
+
+    Sentences containing a subject and an object come first, followed by sentences containing only a subject and
+    sentences containing only an object (see iter_examples_containing_subj_and_obj). As soon as 'amount' sentences are
+    found, no further sentence will be parsed.
+    If no sentence could be found, an empty list will be returned.
+
+    :param nlp: Object. Preloaded Language Model.
+    :param lu_text: String. The Lexical Unit as a string.
+    :param lu: Object. The Lexical Unit as a FrameNet Object.
+    :param amount: Integer. Maximum amount of returned sentences. If None, all qualifying sentences are returned.
+    :return: List. Contains one or more FrameNet example sentence objects.
+    """
+    return list(itertools.islice(iter_examples_containing_subj_and_obj(nlp, lu, lu_text), amount))
 
 
 def get_random_example_and_fes(lu: object) -> list:
@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import sqlite3
+
+
+# Path of the compiled store. Can be configured with the environment variable CF_FRAMENET_STORE or set_store_path().
+STORE_PATH = os.environ.get('CF_FRAMENET_STORE',
+                            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'obj',
+                                         'framenet_store.sqlite'))
+
+# Version of the table layout. Stores with another version have to be compiled again.
+STORE_VERSION = 1
+
+_connection = None
+_lu_names = None  # [(LU ID, LU name)] for regular expression lookups
+
+
+class Frame:
+    """A FrameNet frame as stored in the compiled store. Offers the attributes ID and name like the nltk reader."""
+    __slots__ = ('ID', 'name')
+
+    def __init__(self, frame_id: int, name: str):
+        self.ID = frame_id
+        self.name = name
+
+
+class FrameAnnotation:
+    """The frame annotation of an exemplar. FE looks like in the nltk reader: ([(start, end, 'FE name')], {})"""
+    __slots__ = ('FE',)
+
+    def __init__(self, fes: list):
+        self.FE = ([tuple(fe) for fe in fes], {})
+
+
+class Exemplar:
+    """An exemplar sentence with its text, target spans [(start, end)] and frame annotation."""
+    __slots__ = ('ID', 'text', 'Target', 'frameAnnotation')
+
+    def __init__(self, exemplar_id: int, text: str, targets: list, fes: list):
+        self.ID = exemplar_id
+        self.text = text
+        self.Target = [tuple(target) for target in targets]
+        self.frameAnnotation = FrameAnnotation(fes)
+
+
+class LexicalUnit:
+    """A Lexical Unit with the attributes ID, name, POS, frame and exemplars. Exemplars are loaded on first access."""
+    __slots__ = ('ID', 'name', 'POS', 'frame', '_exemplars')
+
+    def __init__(self, lu_id: int, name: str, pos: str, frame: Frame):
+        self.ID = lu_id
+        self.name = name
+        self.POS = pos
+        self.frame = frame
+        self._exemplars = None
+
+    @property
+    def exemplars(self) -> list:
+        if self._exemplars is None:
+            self._exemplars = exemplars(self.ID)
+        return self._exemplars
+
+
+def set_store_path(path: str) -> None:
+    """Sets the path of the compiled store and closes an already opened store.
+
+    :param path: String. Path to the SQLite file.
+    :return: None.
+    """
+    global STORE_PATH, _connection, _lu_names
+    STORE_PATH = path
+    if _connection is not None:
+        _connection.close()
+    _connection = None
+    _lu_names = None
+
+
+def compile_store(path: str = None) -> dict:
+    """Exports all frames, LUs, exemplar texts, target spans and Frame Element spans from nltk's FrameNet reader.
+
+    This only has to be done once. Afterwards, all lookups can be answered from the store without XML parsing.
+    The store is written to a temporary file first which is renamed afterwards.
+
+    :param path: String. Path to the SQLite file. Default: STORE_PATH.
+    :return: Dictionary. Amount of exported frames, LUs and exemplars.
+    """
+    from nltk.corpus import framenet as nltk_fn
+
+    path = path if path is not None else STORE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    connection = sqlite3.connect(temp_path)
+    connection.executescript('''
+        CREATE TABLE frames (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+        CREATE TABLE lus (id INTEGER PRIMARY KEY, name TEXT NOT NULL, pos TEXT, frame_id INTEGER NOT NULL);
+        CREATE TABLE exemplars (lu_id INTEGER NOT NULL, position INTEGER NOT NULL, sentence_id INTEGER NOT NULL,
+                                text TEXT NOT NULL, targets TEXT NOT NULL, fes TEXT NOT NULL,
+                                PRIMARY KEY (lu_id, position));
+    ''')
+    connection.execute('PRAGMA user_version = {}'.format(STORE_VERSION))
+
+    counts = {'frames': 0, 'lus': 0, 'exemplars': 0}
+
+    for frame in nltk_fn.frames():
+        connection.execute('INSERT INTO frames VALUES (?, ?)', (frame.ID, frame.name))
+        counts['frames'] += 1
+
+    for lu in nltk_fn.lus():
+        connection.execute('INSERT INTO lus VALUES (?, ?, ?, ?)', (lu.ID, lu.name, lu.POS, lu.frame.ID))
+        counts['lus'] += 1
+
+        rows = []
+        for position, example in enumerate(lu.exemplars):
+            fes = example.frameAnnotation.FE[0]
+            targets = [list(target) for target in example.Target]
+            rows.append((lu.ID, position, example.ID, example.text, json.dumps(targets),
+                         json.dumps([list(fe) for fe in fes])))
+        # A sentence can be annotated for several LUs, so exemplars are identified by their LU and position and
+        # every exemplar is stored (a plain INSERT fails instead of silently replacing a row).
+        connection.executemany('INSERT INTO exemplars VALUES (?, ?, ?, ?, ?, ?)', rows)
+        counts['exemplars'] += len(rows)
+
+    connection.executescript('''
+        CREATE INDEX lus_name ON lus (name);
+        CREATE INDEX lus_frame ON lus (frame_id);
+        CREATE INDEX frames_name ON frames (name);
+    ''')
+    connection.commit()
+    connection.close()
+    os.replace(temp_path, path)
+
+    return counts
+
+
+def is_compiled() -> bool:
+    """Checks whether the compiled store exists.
+
+    :return: Boolean. True if the store exists.
+    """
+    return os.path.exists(STORE_PATH)
+
+
+def _store() -> object:
+    """Returns the connection to the compiled store, opening it read-only on first use."""
+    global _connection
+    if _connection is None:
+        connection = sqlite3.connect('file:{}?mode=ro'.format(STORE_PATH), uri=True, check_same_thread=False)
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != STORE_VERSION:
+            connection.close()
+            raise ValueError('{} has version {}, but version {} is required. Compile it again with '
+                             'python preprocessing/framenet_store.py'.format(STORE_PATH, version, STORE_VERSION))
+        _connection = connection
+    return _connection
+
+
+def _frame(frame_id: int) -> Frame:
+    """Returns the frame with the given ID from the compiled store."""
+    row = _store().execute('SELECT id, name FROM frames WHERE id = ?', (frame_id,)).fetchone()
+    return Frame(row[0], row[1])
+
+
+def exemplars(lu_id: int) -> list:
+    """Retrieves all exemplars of a Lexical Unit in their FrameNet order.
+
+    :param lu_id: Integer. The LU ID.
+    :return: List. Exemplar objects with text, Target and frameAnnotation.FE.
+    """
+    if not is_compiled():
+        from nltk.corpus import framenet as nltk_fn
+        return nltk_fn.lu(lu_id).exemplars
+
+    rows = _store().execute('SELECT sentence_id, text, targets, fes FROM exemplars WHERE lu_id = ? ORDER BY position',
+                            (lu_id,)).fetchall()
+    return [Exemplar(row[0], row[1], json.loads(row[2]), json.loads(row[3])) for row in rows]
+
+
+def lu(lu_id: int) -> object:
+    """Retrieves a Lexical Unit by its ID. Falls back to nltk's reader if the store was not compiled.
+
+    :param lu_id: Integer. The LU ID.
+    :return: Object. Lexical Unit with the attributes ID, name, POS, frame.name and exemplars.
+    """
+    if not is_compiled():
+        from nltk.corpus import framenet as nltk_fn
+        return nltk_fn.lu(lu_id)
+
+    row = _store().execute('SELECT id, name, pos, frame_id FROM lus WHERE id = ?', (int(lu_id),)).fetchone()
+    if row is None:
+        raise ValueError('Unknown LU ID: {}'.format(lu_id))
+    return LexicalUnit(row[0], row[1], row[2], _frame(row[3]))
+
+
+def lus(name: str = None) -> list:
+    """Retrieves all Lexical Units whose name matches a regular expression (like nltk's fn.lus(name)).
+
+    Falls back to nltk's reader if the store was not compiled.
+
+    :param name: String. Regular expression, e.g. 'hate\\.v'. None returns all LUs.
+    :return: List. Lexical Units (exemplars are only loaded when accessed).
+    """
+    global _lu_names
+    if not is_compiled():
+        from nltk.corpus import framenet as nltk_fn
+        return nltk_fn.lus(name)
+
+    if _lu_names is None:
+        _lu_names = _store().execute('SELECT id, name FROM lus ORDER BY id').fetchall()
+
+    pattern = re.compile(name) if name is not None else None
+    return [lu(lu_id) for lu_id, lu_name in _lu_names if pattern is None or pattern.search(lu_name) is not None]
+
+
+def frame_lus(frame_name: str) -> list:
+    """Retrieves all Lexical Units of a frame.
+
+    :param frame_name: String. Name of the frame.
+    :return: List. Lexical Units of the frame.
+    """
+    if not is_compiled():
+        from nltk.corpus import framenet as nltk_fn
+        return list(nltk_fn.frame(frame_name).lexUnit.values())
+
+    rows = _store().execute('SELECT lus.id FROM lus JOIN frames ON lus.frame_id = frames.id WHERE frames.name = ?',
+                            (frame_name,)).fetchall()
+    return [lu(row[0]) for row in rows]
+
+
+if __name__ == '__main__':
+    print(compile_store())
@@ -1,31 +1,293 @@
 # -*- coding: utf-8 -*-
-import pickle
+import hashlib
+import json
 import os
+import pickle
+import shutil
+import struct
+import tempfile
+import profiling
+
+
+# Version of the file layout written by save_obj. Files with a higher version can not be read by this module.
+# Version 2 added files which consist of several parts (see save_parts).
+SCHEMA_VERSION = 2
+
+# Every file written by save_obj starts with this magic string, followed by the length of the JSON header (4 bytes),
+# the JSON header itself and the (possibly compressed) payload. Files without it are read as plain pickles.
+MAGIC = b'CFOBJ\x00'
+
+# Both formats stay readable across Python versions (unlike marshal, whose format may change with every version):
+# 'pickle' stores any object, 'json' is a typed JSON encoding of the built-in types the artifacts consist of (role
+# mappings, lexica, frame counts). It can be read without Python, but does not support other classes.
+FORMATS = ('pickle', 'json')
+COMPRESSIONS = (None, 'zstd', 'lz4')
+
+# Directory where all artifacts are stored. Can be configured with the environment variable CF_ARTIFACT_ROOT or with
+# set_artifact_root(). By default, it is the obj/ directory of the repository - independent of the working directory.
+ARTIFACT_ROOT = os.environ.get('CF_ARTIFACT_ROOT',
+                               os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'obj'))
+
+# The names of the serialized role mappings of each approach
+ROLE_MAPPING_FILES = {'naive': 'role_mapping_nonamb_naive_all_sents',
+                      'short': 'role_mapping_nonamb_lus_short_phrases_all_sents',
+                      'long': 'role_mapping_nonamb_lus_long_phrases_all_sents'}
+
+# Permissions of new files (read once, as os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def set_artifact_root(path: str) -> None:
+    """Sets the directory where all artifacts are saved to and loaded from.
+
+    :param path: String. Path to the artifact directory.
+    :return: None
+    """
+    global ARTIFACT_ROOT
+    ARTIFACT_ROOT = os.path.abspath(path)
+
+
+def artifact_path(name: str, root: str = None) -> str:
+    """Resolves the path of an artifact.
+
+    :param name: Filename of the object (without .pkl)
+    :param root: Artifact directory. Default: the configured artifact root
+    :return: Absolute path to name.pkl
+    """
+    return os.path.join(root if root is not None else ARTIFACT_ROOT, name + '.pkl')
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    """Compresses bytes with zstd or lz4. Both are optional dependencies which are only imported when used."""
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    if compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    """Decompresses bytes which were compressed with _compress."""
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.decompress(data)
+    return data
+
+
+def _to_json(obj):
+    """Encodes an object as JSON-compatible structure which keeps the Python types.
+
+    Lists and the scalar types are stored as they are. Tuples, sets and dictionaries (which may have non-string
+    keys) are stored as objects with a single key: {'t': [...]}, {'s': [...]} and {'m': [[key, value], ...]}.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, list):
+        return [_to_json(item) for item in obj]
+    if isinstance(obj, tuple):
+        return {'t': [_to_json(item) for item in obj]}
+    if isinstance(obj, (set, frozenset)):
+        return {'s': [_to_json(item) for item in obj]}
+    if isinstance(obj, dict):
+        return {'m': [[_to_json(key), _to_json(value)] for key, value in obj.items()]}
+    raise TypeError("Objects of type '{}' can not be saved with format 'json'. Use format 'pickle'".format(
+        type(obj).__name__))
+
+
+def _from_json(obj):
+    """Decodes a structure which was encoded with _to_json."""
+    if isinstance(obj, list):
+        return [_from_json(item) for item in obj]
+    if isinstance(obj, dict):
+        (tag, items), = obj.items()
+        if tag == 't':
+            return tuple(_from_json(item) for item in items)
+        if tag == 's':
+            return {_from_json(item) for item in items}
+        return {_from_json(key): _from_json(value) for key, value in items}
+    return obj
+
+
+def _dumps(obj, fmt: str) -> bytes:
+    """Serializes an object in the given format."""
+    if fmt == 'json':
+        return json.dumps(_to_json(obj), ensure_ascii=False, separators=(',', ':')).encode('UTF-8')
+    return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data: bytes, fmt: str):
+    """Deserializes an object which was serialized with _dumps."""
+    if fmt == 'json':
+        return _from_json(json.loads(str(data, 'UTF-8')))
+    return pickle.loads(data)
 
 
-def save_obj(obj, name: str, up=False) -> None:
-    """Saves an object as name.pkl file in the obj/ directory.
-    This function requires obj/ to exist prior to its use.
-    :param up: If file shall be saved in one directory up
+class _HashingWriter:
+    """File wrapper which computes the sha256 checksum and the size of everything written to it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.f.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+
+def _save(name: str, root: str, fmt: str, compression: str, write_payload) -> None:
+    """Writes an artifact atomically (see save_obj). write_payload(writer) writes the payload and returns the amount of
+    parts (see save_parts), None for a single object."""
+    if fmt not in FORMATS:
+        raise ValueError("Unknown format '{}'. Use one of {}".format(fmt, FORMATS))
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression '{}'. Use one of {}".format(compression, COMPRESSIONS))
+
+    path = artifact_path(name, root)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + name + '.', suffix='.tmp')
+    try:
+        # The payload is written to an anonymous temporary file first, as the header needs its checksum, so it is
+        # never held in memory as one bytes object.
+        with tempfile.TemporaryFile(dir=directory) as payload_file:
+            writer = _HashingWriter(payload_file)
+            parts = write_payload(writer)
+            header = {'schema': SCHEMA_VERSION, 'format': fmt, 'compression': compression}
+            if parts is not None:
+                header['parts'] = parts
+            header.update({'sha256': writer.sha256.hexdigest(), 'size': writer.size})
+            header = json.dumps(header).encode('UTF-8')
+
+            payload_file.seek(0)
+            with os.fdopen(file_descriptor, 'wb') as f:
+                f.write(MAGIC)
+                f.write(struct.pack('>I', len(header)))
+                f.write(header)
+                shutil.copyfileobj(payload_file, f)
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(temp_path, 0o666 & ~_UMASK)  # mkstemp creates the file with mode 0600
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@profiling.profiled('serialization')
+def save_obj(obj, name: str, up=False, fmt: str = 'pickle', compression: str = None, root: str = None) -> None:
+    """Saves an object as name.pkl file in the artifact directory (obj/ by default).
+
+    The file is written to a temporary file first which is renamed afterwards, so an artifact is never half-written.
+    It contains a header with the schema version, the format, the compression and a sha256 checksum of the payload.
+    :param up: Obsolete since paths are resolved from the artifact root. Kept for compatibility
     :param obj: Object to be serialized
     :param name: Filename for the object
+    :param fmt: 'pickle' (default, any object) or 'json' (typed JSON, only built-in types)
+    :param compression: None (default), 'zstd' or 'lz4'
+    :param root: Artifact directory. Default: the configured artifact root
     :return: None
     """
-    #print("import of save_obj worked!")
-    if up:
-        with open(os.path.abspath(os.path.join('obj', name + '.pkl')), 'wb') as f:
-            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
-    else:
-        with open(os.path.join('obj', name + '.pkl'), 'wb') as f:
-            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
-
-
-def load_obj(name: str) -> object:
-    """Loads an object from the obj/ directory.
-    Loads and returns the object named name.pkl from the obj/ directory.
+    def write_payload(writer):
+        if compression is None and fmt == 'pickle':
+            pickle.dump(obj, writer, pickle.HIGHEST_PROTOCOL)
+        else:
+            writer.write(_compress(_dumps(obj, fmt), compression))
+
+    _save(name, root, fmt, compression, write_payload)
+
+
+@profiling.profiled('serialization')
+def save_parts(parts, name: str, fmt: str = 'pickle', compression: str = None, root: str = None) -> None:
+    """Saves a dictionary which is given in parts (e.g. the shards of a spilled role mapping, see memory_budget).
+
+    Every part is serialized on its own and written as one frame (its length and its data), so only one part is held
+    in memory at a time. load_obj merges the parts into one dictionary again. Otherwise like save_obj.
+    :param parts: Iterable of dictionaries with distinct keys
+    :param name: Filename for the object
+    :param fmt: 'pickle' (default) or 'json'
+    :param compression: None (default), 'zstd' or 'lz4'. Every part is compressed on its own
+    :param root: Artifact directory. Default: the configured artifact root
+    :return: None
+    """
+    def write_payload(writer):
+        count = 0
+        for part in parts:
+            data = _compress(_dumps(part, fmt), compression)
+            writer.write(struct.pack('>Q', len(data)))
+            writer.write(data)
+            count += 1
+            part = data = None  # Released before the next part is read
+        return count
+
+    _save(name, root, fmt, compression, write_payload)
+
+
+def read_header(name: str, root: str = None) -> dict:
+    """Reads the header of an artifact without loading the object.
+
     :param name: Name of the object
+    :param root: Artifact directory. Default: the configured artifact root
+    :return: Header dictionary. None for plain pickle files
+    """
+    with open(artifact_path(name, root), 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        header_length = struct.unpack('>I', f.read(4))[0]
+        return json.loads(f.read(header_length).decode('UTF-8'))
+
+
+@profiling.profiled('serialization')
+def load_obj(name: str, root: str = None) -> object:
+    """Loads an object from the artifact directory (obj/ by default).
+
+    Loads and returns the object named name.pkl. Files written by save_obj or save_parts (whose parts are merged into
+    one dictionary) and plain pickle files are supported.
+    The checksum and the schema version of files written by save_obj are verified.
+    :param name: Name of the object
+    :param root: Artifact directory. Default: the configured artifact root
     :return: Loaded object
     """
-    #print("import of load_obj worked!")
-    with open(os.path.join('obj', name + '.pkl'), 'rb') as f:
-        return pickle.load(f)
+    path = artifact_path(name, root)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if not data.startswith(MAGIC):
+        return pickle.loads(data)
+
+    header_start = len(MAGIC) + 4
+    header_length = struct.unpack('>I', data[len(MAGIC):header_start])[0]
+    header = json.loads(data[header_start:header_start + header_length].decode('UTF-8'))
+    payload = memoryview(data)[header_start + header_length:]  # Without copying the data
+
+    if header['schema'] > SCHEMA_VERSION:
+        raise ValueError('{} has schema version {}, but only versions up to {} are supported'.format(
+            path, header['schema'], SCHEMA_VERSION))
+    if header['format'] not in FORMATS:
+        raise ValueError("{} was written in the unsupported format '{}'. Save it again with one of {}".format(
+            path, header['format'], FORMATS))
+    if len(payload) != header['size'] or hashlib.sha256(payload).hexdigest() != header['sha256']:
+        raise ValueError('{} is corrupted: checksum mismatch'.format(path))
+
+    if header.get('parts') is not None:
+        obj = {}
+        position = 0
+        for _ in range(header['parts']):
+            length = struct.unpack('>Q', payload[position:position + 8])[0]
+            obj.update(_loads(_decompress(payload[position + 8:position + 8 + length], header['compression']),
+                              header['format']))
+            position += 8 + length
+        return obj
+
+    payload = _decompress(payload, header['compression'])
+    return _loads(payload, header['format'])
@@ -0,0 +1,280 @@
+from collections import Counter
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+
+
+# Stages used by the entry points. Time spent outside of all stages is recorded as 'other'.
+STAGES = ('lexicon_load', 'framenet_lookup', 'parsing', 'detection', 'fe_alignment', 'serialization')
+OTHER = 'other'
+
+# Profiling is switched on with environment variables, so it is inherited by subprocesses (e.g. pipeline stages):
+# CF_PROFILE: Directory the profiles are written to. CF_PROFILE_SAMPLE: Interval of the sampling profiler in seconds.
+# CF_PROFILE_TOP: Amount of hot functions printed at exit.
+PROFILE_ENV = 'CF_PROFILE'
+SAMPLE_ENV = 'CF_PROFILE_SAMPLE'
+TOP_ENV = 'CF_PROFILE_TOP'
+
+_session = None  # The running profiling session (see start), None if profiling is switched off
+
+
+def start(entry_point: str, directory: str = None, sample_interval: float = None, top: int = None) -> bool:
+    """Starts profiling an entry point if profiling is switched on (arguments or environment variables).
+
+    One cProfile profile is recorded per stage (see stage and profiled). When the session is stopped (at the latest at
+    exit), the following files are written to <directory>/<entry_point>/:
+    - <stage>.prof: cProfile stats of each stage (readable with pstats or snakeviz)
+    - cprofile.collapsed: collapsed stacks derived from the cProfile stats, with the stage as root frame (microseconds)
+    - sampled.collapsed: collapsed stacks of the sampling profiler (amount of samples), if it is switched on
+    - stages.json: wall clock seconds spent in each stage (excluding nested stages) and how often it was entered
+    The collapsed stack files can be turned into flame graphs, e.g. with flamegraph.pl or speedscope.
+
+    :param entry_point: String. Name of the entry point, e.g. 'mapping'.
+    :param directory: String. Output directory. Default: environment variable CF_PROFILE.
+    :param sample_interval: Float. Interval of the sampling profiler in seconds. Default: CF_PROFILE_SAMPLE (off).
+    :param top: Integer. Amount of hot functions printed at exit. Default: CF_PROFILE_TOP (off).
+    :return: Boolean. True if profiling was started.
+    """
+    global _session
+    directory = directory or os.environ.get(PROFILE_ENV) or None
+    sample_interval = sample_interval or float(os.environ.get(SAMPLE_ENV) or 0) or None
+    top = top or int(os.environ.get(TOP_ENV) or 0) or None
+    if (directory is None and top is None) or threading.current_thread() is not threading.main_thread():
+        return False
+
+    stop()
+    _session = {'entry_point': entry_point, 'directory': directory, 'top': top, 'sample_interval': sample_interval,
+                'profiles': {}, 'stack': [], 'seconds': Counter(), 'entries': Counter(), 'samples': Counter(),
+                'switched': time.perf_counter()}
+
+    if sample_interval is not None and hasattr(signal, 'setitimer'):
+        signal.signal(signal.SIGPROF, _sample)
+        signal.setitimer(signal.ITIMER_PROF, sample_interval, sample_interval)
+
+    _enter(OTHER)
+    if not getattr(start, 'registered', False):
+        atexit.register(stop)
+        start.registered = True
+    return True
+
+
+def is_active() -> bool:
+    """Returns True if a profiling session is running."""
+    return _session is not None
+
+
+def _profile(name: str) -> object:
+    """Returns the cProfile profile of a stage, creating it on first use."""
+    if name not in _session['profiles']:
+        _session['profiles'][name] = cProfile.Profile()
+    return _session['profiles'][name]
+
+
+def _enter(name: str) -> None:
+    """Switches the recording to a stage. Only one profile is enabled at a time."""
+    stack = _session['stack']
+    _session['entries'][name] += 1
+    if len(stack) > 0 and stack[-1] == name:
+        stack.append(name)  # Nested call of the same stage, e.g. a recursion
+        return
+    now = time.perf_counter()
+    if len(stack) > 0:
+        _profile(stack[-1]).disable()
+        _session['seconds'][stack[-1]] += now - _session['switched']
+    _session['switched'] = now
+    stack.append(name)
+    _profile(name).enable()
+
+
+def _exit() -> None:
+    """Switches the recording back to the enclosing stage."""
+    stack = _session['stack']
+    name = stack.pop()
+    if len(stack) > 0 and stack[-1] == name:
+        return
+    _profile(name).disable()
+    now = time.perf_counter()
+    _session['seconds'][name] += now - _session['switched']
+    _session['switched'] = now
+    if len(stack) > 0:
+        _profile(stack[-1]).enable()
+
+
+@contextlib.contextmanager
+def stage(name: str) -> object:
+    """Context manager recording everything inside of it as a stage (see STAGES) if profiling is switched on.
+
+    :param name: String. Name of the stage.
+    :return: Context manager.
+    """
+    if _session is None or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    _enter(name)
+    try:
+        yield
+    finally:
+        if _session is not None:
+            _exit()
+
+
+def profiled(name: str) -> object:
+    """Decorator recording every call of a function as a stage (see stage). Costs one check if profiling is off.
+
+    :param name: String. Name of the stage.
+    :return: Function. The decorator.
+    """
+    def decorator(function: object) -> object:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _session is None or threading.current_thread() is not threading.main_thread():
+                return function(*args, **kwargs)
+            _enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if _session is not None:
+                    _exit()
+        return wrapper
+    return decorator
+
+
+def frame_label(function: tuple) -> str:
+    """Returns a readable label of a pstats function key (filename, line, name), e.g. 'detection_cache.py:detect'."""
+    filename, _, name = function
+    if filename == '~':
+        return name.replace(';', ':')
+    return '{}:{}'.format(os.path.basename(filename), name).replace(';', ':')
+
+
+def collapsed_stacks(profile: object, root: str, min_seconds: float = 1e-5, max_depth: int = 64) -> Counter:
+    """Derives collapsed stacks from cProfile stats.
+
+    cProfile only records caller -> callee edges, so the time of a function is split among its stacks in proportion
+    to the time spent in it per caller. Recursive calls are cut off.
+
+    :param profile: Object. A (disabled) cProfile profile.
+    :param root: String. Name of the root frame, e.g. the stage.
+    :param min_seconds: Float. Stacks below this time are left out.
+    :param max_depth: Integer. Maximum depth of the stacks.
+    :return: Counter. Keys are stacks ('root;a.py:f;b.py:g'), values are microseconds spent in the last function.
+    """
+    try:
+        stats = pstats.Stats(profile).stats
+    except TypeError:  # Nothing was recorded
+        return Counter()
+
+    callees = {}
+    todo = []
+    for function, (_, calls, _, total_seconds, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+        # Calls without a recorded caller started before the profile was enabled, i.e. at the root of the stage
+        unrecorded_calls = calls - sum(edge[0] for edge in callers.values())
+        if len(callers) == 0 or unrecorded_calls > 0:
+            share = 1.0 if len(callers) == 0 or total_seconds <= 0 else min(1.0, max(
+                unrecorded_calls / calls, (total_seconds - sum(edge[3] for edge in callers.values())) / total_seconds))
+            todo.append((function, [root, frame_label(function)], {function}, share))
+
+    stacks = Counter()
+    while len(todo) > 0:
+        function, labels, on_stack, share = todo.pop()
+        own_seconds = stats[function][2] * share
+        if own_seconds >= min_seconds:
+            stacks[';'.join(labels)] += int(round(own_seconds * 1e6))
+        if len(labels) > max_depth:
+            continue
+        for callee, edge_seconds in callees.get(function, ()):
+            total_seconds = stats[callee][3]
+            if callee in on_stack or total_seconds <= 0 or edge_seconds * share < min_seconds:
+                continue
+            todo.append((callee, labels + [frame_label(callee)], on_stack | {callee},
+                         share * min(1.0, edge_seconds / total_seconds)))
+    return stacks
+
+
+def _sample(signum: int, frame: object) -> None:
+    """Signal handler of the sampling profiler: records the current stack below the current stage."""
+    if _session is None:
+        return
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name).replace(';', ':'))
+        frame = frame.f_back
+    stage_name = _session['stack'][-1] if len(_session['stack']) > 0 else OTHER
+    _session['samples'][';'.join([stage_name] + labels[::-1])] += 1
+
+
+def stop() -> dict:
+    """Stops the profiling session, writes the profiles and prints the hot functions (see start).
+
+    :return: Dictionary. Wall clock seconds per stage; empty if no session was running.
+    """
+    global _session
+    if _session is None:
+        return {}
+    session = _session
+    while len(session['stack']) > 0:
+        _exit()
+    _session = None
+    if session['sample_interval'] is not None and hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    summary = {name: {'seconds': session['seconds'][name], 'entries': session['entries'][name]}
+               for name in session['profiles']}
+
+    if session['directory'] is not None:
+        directory = os.path.join(session['directory'], session['entry_point'])
+        os.makedirs(directory, exist_ok=True)
+        stacks = Counter()
+        for name, profile in session['profiles'].items():
+            profile.dump_stats(os.path.join(directory, name + '.prof'))
+            stacks.update(collapsed_stacks(profile, name))
+        write_collapsed(stacks, os.path.join(directory, 'cprofile.collapsed'))
+        if session['sample_interval'] is not None:
+            write_collapsed(session['samples'], os.path.join(directory, 'sampled.collapsed'))
+        with open(os.path.join(directory, 'stages.json'), 'w', encoding='UTF-8') as f:
+            json.dump(summary, f, indent=1, sort_keys=True)
+
+    if session['top'] is not None:
+        print_summary(session['entry_point'], session['profiles'], summary, session['top'])
+
+    return summary
+
+
+def write_collapsed(stacks: Counter, path: str) -> None:
+    """Writes collapsed stacks, one 'frame;frame;frame count' line per stack."""
+    with open(path, 'w', encoding='UTF-8') as f:
+        for stack, count in sorted(stacks.items()):
+            if count > 0:
+                f.write('{} {}\n'.format(stack, count))
+
+
+def print_summary(entry_point: str, profiles: dict, summary: dict, top: int, stream: object = None) -> None:
+    """Prints the time spent per stage and the top functions by own time over all stages (to stderr by default)."""
+    stream = stream or sys.stderr
+    print('Profile of {}:'.format(entry_point), file=stream)
+    for name, values in sorted(summary.items(), key=lambda item: -item[1]['seconds']):
+        print('  {:<16} {:>10.3f} s {:>10} entries'.format(name, values['seconds'], values['entries']), file=stream)
+    recorded = []
+    for profile in profiles.values():
+        try:
+            recorded.append(pstats.Stats(profile))
+        except TypeError:
+            continue
+    if len(recorded) > 0:
+        combined = recorded[0]
+        for stats in recorded[1:]:
+            combined.add(stats)
+        combined.stream = stream
+        combined.sort_stats('tottime').print_stats(top)
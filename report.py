@@ -0,0 +1,222 @@
+import os
+os.environ.setdefault('MPLBACKEND', 'Agg')  # Never opens a window, also not in the worker processes
+
+from preprocessing.serialization import load_obj
+import preprocessing.serialization as serialization
+from pipeline import file_hash, repository_file
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import base64
+import contextlib
+import hashlib
+import html
+import io
+import json
+import pickle
+import time
+
+
+# Source files whose changes invalidate all cached outputs
+CODE = ['report.py', 'statistics.py', 'cf_ratings.py']
+
+ANNOTATORS = ('sina', 'lschmidt')
+
+
+def load_pickle(path: str) -> object:
+    """Loads a pickled evaluation file."""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def render_frame_amount(inputs: list, path: str) -> None:
+    """Plot: Amount of verbs evoking a certain number of frames (input: cf_verb_frame_count_dict)."""
+    import statistics
+    statistics.plot_verb_frame_amount(statistics.frames_per_verb(load_obj('cf_verb_frame_count_dict',
+                                                                          os.path.dirname(inputs[0]))), path, False)
+
+
+def render_map_kappa(inputs: list) -> dict:
+    """Table: Cohens Kappa of the role mapping evaluation per approach and role (inputs: the map eval files of both
+    annotators, ordered like ANNOTATORS and approach)."""
+    import statistics
+    rows = []
+    for number, approach in enumerate(('naive', 'short', 'long')):
+        eval_r1, eval_r2 = load_pickle(inputs[2 * number]), load_pickle(inputs[2 * number + 1])
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows.append([approach] + [round(statistics.cohens_kappa(eval_r1, eval_r2, role), 3)
+                                      for role in ('agent', 'theme')])
+    return {'columns': ['Approach', 'Kappa Agent', 'Kappa Theme'], 'rows': rows}
+
+
+def render_cf_statistics(inputs: list) -> dict:
+    """Table: Statistics and Cohens Kappa values of the CF evaluation (inputs: the cf eval files of both annotators)."""
+    import statistics
+    eval_r1, eval_r2 = load_pickle(inputs[0]), load_pickle(inputs[1])
+    rows = [line.split(': ', 1) for line in statistics.read_cf_eval(eval_r1, eval_r2)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows.append(['Kappa annotators', round(statistics.cf_kappa(eval_r1, eval_r2), 3)])
+        for conditions in ('all', 'context', 'context_free'):
+            rows.append(['Kappa original lexicon ({})'.format(conditions),
+                         round(statistics.cf_kappa_with_original(eval_r1, eval_r2, conditions), 3)])
+    return {'columns': ['Statistic', 'Value'], 'rows': rows}
+
+
+def render_cf_features(inputs: list) -> dict:
+    """Table: Missing connotations and context shift per CF feature (inputs: the cf eval files of both annotators)."""
+    import cf_ratings
+    ratings = cf_ratings.load_ratings([load_pickle(path) for path in inputs])
+    missing = cf_ratings.missing_connotations(ratings)['per_feature']
+    shift = cf_ratings.context_shift(ratings)
+    return {'columns': ['Feature', 'No Connotation', 'Mean absolute shift in context', 'Share of changed ratings'],
+            'rows': [[feature, missing[feature], round(shift['mean_absolute_shift'][feature], 3),
+                      round(shift['changed_share'][feature], 3)] for feature in ratings['features']]}
+
+
+def declare_items() -> dict:
+    """Declares all plots and tables of the report with their input files.
+
+    One declaration looks like this: {'title': 'Title', 'kind': 'plot' or 'table', 'inputs': [paths],
+    'render': function}. Plots are rendered to a .png file (render(inputs, path)), tables are returned as
+    {'columns': [...], 'rows': [[...]]} (render(inputs)).
+
+    :return: Dictionary. Keys are item names, values are the declarations. The report keeps this order.
+    """
+    map_evals = [repository_file('eval', '{}_map_{}_eval.pkl'.format(annotator, approach))
+                 for approach in ('naive', 'short', 'long') for annotator in ANNOTATORS]
+    cf_evals = [repository_file('eval', '{}_cf_eval.pkl'.format(annotator)) for annotator in reversed(ANNOTATORS)]
+
+    return {
+        'frame_amount': {'title': 'Amount of verbs evoking a certain number of frames', 'kind': 'plot',
+                         'inputs': [serialization.artifact_path('cf_verb_frame_count_dict')],
+                         'render': render_frame_amount},
+        'map_kappa': {'title': 'Role mapping evaluation: Cohens Kappa', 'kind': 'table', 'inputs': map_evals,
+                      'render': render_map_kappa},
+        'cf_statistics': {'title': 'Connotation Frame evaluation', 'kind': 'table', 'inputs': cf_evals,
+                          'render': render_cf_statistics},
+        'cf_features': {'title': 'Connotation Frame evaluation per feature', 'kind': 'table', 'inputs': cf_evals,
+                        'render': render_cf_features},
+    }
+
+
+def cache_key(name: str, item: dict) -> str:
+    """Hashes the item name, the content of its inputs and the source code. None if an input does not exist."""
+    input_hashes = [file_hash(path) for path in item['inputs']]
+    if None in input_hashes:
+        return None
+    digest = hashlib.sha256(name.encode('UTF-8'))
+    for value in input_hashes + [file_hash(repository_file(source)) or '' for source in CODE]:
+        digest.update(value.encode('ascii'))
+    return digest.hexdigest()[:16]
+
+
+def build_item(item: dict, path: str) -> str:
+    """Renders one plot or table (in a worker process) and writes it atomically to its cache path."""
+    temp_path = '{}.{}.tmp{}'.format(path, os.getpid(), os.path.splitext(path)[1])
+    if item['kind'] == 'plot':
+        item['render'](item['inputs'], temp_path)
+    else:
+        with open(temp_path, 'w', encoding='UTF-8') as f:
+            json.dump(item['render'](item['inputs']), f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+    return path
+
+
+def build_report(output_dir: str, names: list = None, jobs: int = 4, force: bool = False) -> dict:
+    """Renders all plots and tables whose inputs or code changed and bundles them into report.html and report.md.
+
+    The rendered outputs are cached in <output_dir>/cache/ under the hash of their inputs and the source code, so
+    unchanged items are not rendered again.
+
+    :param output_dir: String. Directory of the report.
+    :param names: List. Names of the items (see declare_items). Default: all.
+    :param jobs: Integer. Amount of processes rendering the items.
+    :param force: Boolean. If True, all items are rendered again.
+    :return: Dictionary. Keys are item names, values are 'cached', 'rendered' or 'missing input'.
+    """
+    items = {name: item for name, item in declare_items().items() if names is None or name in names}
+    cache_dir = os.path.join(output_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+
+    paths = {}
+    status = {}
+    for name, item in items.items():
+        key = cache_key(name, item)
+        if key is None:
+            status[name] = 'missing input'
+            continue
+        paths[name] = os.path.join(cache_dir, '{}-{}.{}'.format(name, key, 'png' if item['kind'] == 'plot' else 'json'))
+        status[name] = 'cached' if os.path.exists(paths[name]) and not force else 'rendered'
+
+    to_render = [name for name in paths if status[name] == 'rendered']
+    if len(to_render) > 0:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(to_render))) as executor:
+            for future in [executor.submit(build_item, items[name], paths[name]) for name in to_render]:
+                future.result()
+        for filename in os.listdir(cache_dir):  # Outputs of older inputs are not needed anymore
+            name = filename.rsplit('-', 1)[0]
+            if name in to_render and os.path.join(cache_dir, filename) != paths[name]:
+                os.remove(os.path.join(cache_dir, filename))
+
+    write_bundle(output_dir, items, paths, status)
+    return status
+
+
+def table_markdown(table: dict) -> str:
+    """Renders a table as Markdown."""
+    lines = ['| ' + ' | '.join(table['columns']) + ' |', '|' + '---|' * len(table['columns'])]
+    lines += ['| ' + ' | '.join(str(value) for value in row) + ' |' for row in table['rows']]
+    return '\n'.join(lines)
+
+
+def table_html(table: dict) -> str:
+    """Renders a table as HTML."""
+    lines = ['<table>', '<tr>' + ''.join('<th>{}</th>'.format(html.escape(column)) for column in table['columns'])
+             + '</tr>']
+    lines += ['<tr>' + ''.join('<td>{}</td>'.format(html.escape(str(value))) for value in row) + '</tr>'
+              for row in table['rows']]
+    return '\n'.join(lines + ['</table>'])
+
+
+def write_bundle(output_dir: str, items: dict, paths: dict, status: dict) -> None:
+    """Writes report.md (plots linked from cache/) and a self-contained report.html (plots embedded)."""
+    created = time.strftime('%Y-%m-%d %H:%M:%S')
+    markdown = ['# Connotation Frames report', '', 'Created: {}'.format(created), '']
+    page = ['<!DOCTYPE html>', '<html><head><meta charset="UTF-8"><title>Connotation Frames report</title>',
+            '<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px}</style></head><body>',
+            '<h1>Connotation Frames report</h1>', '<p>Created: {}</p>'.format(created)]
+
+    for name, item in items.items():
+        markdown += ['## ' + item['title'], '']
+        page.append('<h2>{}</h2>'.format(html.escape(item['title'])))
+        if name not in paths:
+            markdown += ['Not available: missing input ({}).'.format(', '.join(item['inputs'])), '']
+            page.append('<p>Not available: missing input.</p>')
+        elif item['kind'] == 'plot':
+            with open(paths[name], 'rb') as f:
+                image = base64.b64encode(f.read()).decode('ascii')
+            markdown += ['![{}]({})'.format(item['title'], os.path.relpath(paths[name], output_dir)), '']
+            page.append('<img alt="{}" src="data:image/png;base64,{}">'.format(html.escape(item['title']), image))
+        else:
+            with open(paths[name], 'r', encoding='UTF-8') as f:
+                table = json.load(f)
+            markdown += [table_markdown(table), '']
+            page.append(table_html(table))
+
+    page.append('</body></html>')
+    with open(os.path.join(output_dir, 'report.md'), 'w', encoding='UTF-8') as f:
+        f.write('\n'.join(markdown) + '\n')
+    with open(os.path.join(output_dir, 'report.html'), 'w', encoding='UTF-8') as f:
+        f.write('\n'.join(page) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the static report of all statistics plots and tables.')
+    parser.add_argument('-o', '--output', default='report', help='Output directory (default: report)')
+    parser.add_argument('--items', nargs='+', choices=sorted(declare_items()), help='Items to build (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, default=4)
+    parser.add_argument('--force', action='store_true', help='Renders all items again, ignoring the cache')
+    args = parser.parse_args()
+
+    for item_name, item_status in build_report(args.output, args.items, args.jobs, args.force).items():
+        print('[{}] {}'.format(item_status, item_name))
+    print('Report written to', os.path.join(args.output, 'report.html'))
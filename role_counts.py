@@ -0,0 +1,114 @@
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+
+def count_information(agent_mapping: list, theme_mapping: list, sentence_count: int, hit_count: int,
+                      passive_count: int) -> dict:
+    """Counts how often each Frame Element was mapped to the agent and theme role of one LU.
+
+    The mapping lists contain one entry per hit (and the 'CF_Agent'/'CF_Theme' marker as first element), so they still
+    contain the frequency information which gets lost when they are converted into sets.
+
+    The returned dictionary looks like this:
+    {'agent': {'FE': 12, ...}, 'theme': {'FE': 3, ...}, 'sentences': 40, 'hits': 15, 'passive': 2}
+
+    :param agent_mapping: List. All Frame Elements mapped to the agent role, one entry per hit.
+    :param theme_mapping: List. All Frame Elements mapped to the theme role, one entry per hit.
+    :param sentence_count: Integer. Amount of processed sentences.
+    :param hit_count: Integer. Amount of sentences in which at least one Frame Element was mapped.
+    :param passive_count: Integer. Amount of passive cases.
+    :return: Dictionary. Frame Element counts per role and the totals.
+    """
+    return {'agent': dict(Counter(fe for fe in agent_mapping if fe != 'CF_Agent')),
+            'theme': dict(Counter(fe for fe in theme_mapping if fe != 'CF_Theme')),
+            'sentences': sentence_count,
+            'hits': hit_count,
+            'passive': passive_count}
+
+
+def count_matrices(role_mapping: dict) -> dict:
+    """Builds sparse LU x Frame Element count matrices for the agent and the theme role from a role mapping.
+
+    Only LUs whose mapping contains the counts (see count_information) are considered. The returned dictionary looks
+    like this:
+    {'lu_ids': [123, ...], 'fes': ['Agent', ...], 'agent': csr_matrix, 'theme': csr_matrix,
+     'sentences': array, 'hits': array, 'passive': array}
+    Row i of the matrices and arrays belongs to lu_ids[i], column j of the matrices to fes[j].
+
+    :param role_mapping: Dictionary. The finished dictionary with all LUs, role mappings, connotation frames etc.
+    :return: Dictionary. The count matrices, their row and column labels and the totals per LU.
+    """
+    lu_ids = [lu_id for lu_id, information in role_mapping.items()
+              if len(information) > 7 and isinstance(information[7], dict)]
+    fes = sorted({fe for lu_id in lu_ids for role in ('agent', 'theme') for fe in role_mapping[lu_id][7][role]})
+    fe_index = {fe: column for column, fe in enumerate(fes)}
+
+    matrices = {'lu_ids': lu_ids, 'fes': fes}
+
+    for role in ('agent', 'theme'):
+        rows, columns, counts = [], [], []
+        for row, lu_id in enumerate(lu_ids):
+            for fe, count in role_mapping[lu_id][7][role].items():
+                rows.append(row)
+                columns.append(fe_index[fe])
+                counts.append(count)
+        matrices[role] = sparse.csr_matrix((counts, (rows, columns)), shape=(len(lu_ids), len(fes)), dtype=np.int32)
+
+    for total in ('sentences', 'hits', 'passive'):
+        matrices[total] = np.array([role_mapping[lu_id][7][total] for lu_id in lu_ids], dtype=np.int32)
+
+    return matrices
+
+
+def shares(matrices: dict, role: str) -> object:
+    """Normalizes the counts of a role per LU, so each entry is the share of the LU's hits for this role.
+
+    :param matrices: Dictionary. Output of count_matrices.
+    :param role: String. 'agent' or 'theme'.
+    :return: Sparse matrix. Shares between 0 and 1 (rows without any hit stay 0).
+    """
+    counts = matrices[role]
+    row_sums = np.asarray(counts.sum(axis=1)).ravel().astype(np.float64)
+    row_sums[row_sums == 0] = 1
+    return sparse.diags(1 / row_sums) @ counts
+
+
+def threshold_mapping(matrices: dict, role: str, min_count: int = 1, min_share: float = 0.0) -> dict:
+    """Derives a role mapping from the count matrices with a confidence threshold.
+
+    A Frame Element is mapped to the role if it was mapped at least min_count times and its share of all hits of this
+    role is at least min_share. With the default values, the result equals the sets of the original role mapping
+    without the 'CF_Agent'/'CF_Theme' marker (which is not counted, see count_information).
+
+    :param matrices: Dictionary. Output of count_matrices.
+    :param role: String. 'agent' or 'theme'.
+    :param min_count: Integer. Minimum amount of hits of a Frame Element.
+    :param min_share: Float. Minimum share of a Frame Element of all hits of the role.
+    :return: Dictionary. Keys are LU IDs, values are sets of mapped Frame Elements.
+    """
+    counts = matrices[role].tocoo()
+    row_sums = np.asarray(matrices[role].sum(axis=1)).ravel()
+    keep = (counts.data >= min_count) & (counts.data >= min_share * row_sums[counts.row])
+
+    mapping = {lu_id: set() for lu_id in matrices['lu_ids']}
+    for row, column in zip(counts.row[keep], counts.col[keep]):
+        mapping[matrices['lu_ids'][row]].add(matrices['fes'][column])
+    return mapping
+
+
+def top_k_mapping(matrices: dict, role: str, k: int = 1) -> dict:
+    """Derives a role mapping from the count matrices which contains only the k most frequent Frame Elements per LU.
+
+    :param matrices: Dictionary. Output of count_matrices.
+    :param role: String. 'agent' or 'theme'.
+    :param k: Integer. Amount of Frame Elements per LU.
+    :return: Dictionary. Keys are LU IDs, values are lists of the k most frequent Frame Elements (most frequent first).
+    """
+    counts = matrices[role]
+    mapping = {}
+    for row, lu_id in enumerate(matrices['lu_ids']):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        order = np.argsort(-counts.data[start:end], kind='stable')[:k]
+        mapping[lu_id] = [matrices['fes'][column] for column in counts.indices[start:end][order]]
+    return mapping
@@ -7,6 +7,8 @@ import spacy
 from spacy import displacy
 from preprocessing.serialization import save_obj
 import pickle
+import cf_ratings
+import profiling
 
 
 def frames_per_verb(verb_dictionary: dict) -> dict:
@@ -29,11 +31,13 @@ def frames_per_verb(verb_dictionary: dict) -> dict:
     return statistics
 
 
-def plot_verb_frame_amount(verb_frame_amount_dict: dict) -> None:
+def plot_verb_frame_amount(verb_frame_amount_dict: dict, path: str = None, show: bool = True) -> None:
     """Plots the statistics for evoked frames per Verb/Lexical Unit and saves the plot as a .png file.
 
-    :param verb_frame_amount_dict:
-    :return:
+    :param verb_frame_amount_dict: Dictionary. Output of frames_per_verb.
+    :param path: String. Path of the .png file. Default: plots/lus_frames_amount_updated.png
+    :param show: Boolean. Whether the plot is shown in a window. Should be False in batch runs.
+    :return: None.
     """
     labels = []
     means = []
@@ -72,23 +76,32 @@ def plot_verb_frame_amount(verb_frame_amount_dict: dict) -> None:
 
     fig.tight_layout()
 
-    plt.savefig(os.path.join('plots', 'lus_frames_amount_updated'))
-    plt.show()
-    plt.close()
+    plt.savefig(path or os.path.join('plots', 'lus_frames_amount_updated'))
+    if show:
+        plt.show()
+    plt.close(fig)
 
 
-def show_dependency_parse(sentence: str) -> None:
-    """
+_nlp = None  # Language Model shared by all calls of show_dependency_parse
+
+
+def show_dependency_parse(sentence: str, serve: bool = False) -> str:
+    """Renders the dependency parse of one sentence. The Language Model is only loaded on the first call.
 
-    :param sentence:
-    :return:
+    For many sentences (e.g. all example sentences of some LUs), parse_renderer.py renders the parses in batches and
+    writes them to files.
+
+    :param sentence: String. The sentence to be parsed.
+    :param serve: Boolean. If True, the parse is also shown in the browser via displacy.serve (blocks until stopped).
+    :return: String. The rendered parse (SVG).
     """
-    nlp = spacy.load("en_core_web_sm")
-    doc = nlp(sentence)
-    # sentence_spans = list(doc.sents)
-    rendered = displacy.render(doc, style='dep', jupyter=True)
-    # print(rendered)
-    displacy.serve(doc, style="dep")
+    global _nlp
+    if _nlp is None:
+        _nlp = spacy.load("en_core_web_sm")
+    doc = _nlp(sentence)
+    rendered = displacy.render(doc, style='dep', jupyter=False)
+    if serve:
+        displacy.serve(doc, style="dep")
     return rendered
 
 
@@ -240,167 +253,47 @@ def cohens_kappa(eval_r1: list, eval_r2: list, role: str) -> int:
 def read_cf_eval(eval_r1: dict, eval_r2: dict) -> list:
     """ Reads and calculates statistics of both CF evaluations.
 
+    The evaluations are converted into a ratings tensor (see cf_ratings.load_ratings), so evaluations of any size and
+    with any amount of sentences per LU can be read.
+
     :param eval_r2: Dictionary. Evaluation of the Connotation Frames of annotator 2.
     :param eval_r1: Dictionary. Evaluation of the Connotation Frames of annotator 1.
     :return: List. Contains statistical values for getting the result of the evaluation.
     """
-    cf_eval = []
-
-    eval_dict_r1 = eval_r1[1]
-    eval_dict_r2 = eval_r2[1]
-
-    equal_connotations = 0
-    unequal_connotations = 0
-
-    verb_count_no_connotation = 0
-    feature_count_no_connotation = 0
-    feature_count = 0
-
-    connotation_ratings_r1 = []
-    connotation_ratings_r2 = []
-
-    for key, value in eval_dict_r1.items():
-        no_connotation_intermediate = feature_count_no_connotation
-        for rating in value[3][0:5]:
-            for e in rating[1:]:
-                connotation_ratings_r1.append(float(e) if e != '?' else 0)
-                if e == '?':
-                    feature_count_no_connotation += 1
-                feature_count += 1
-        if no_connotation_intermediate != feature_count_no_connotation:
-            verb_count_no_connotation += 1
-
-    for key, value in eval_dict_r2.items():
-        no_connotation_intermediate = feature_count_no_connotation
-        for rating in value[3][0:5]:
-            for e in rating[1:]:
-                connotation_ratings_r2.append(float(e) if e != '?' else 0)
-                if e == '?':
-                    feature_count_no_connotation += 1
-                feature_count += 1
-        if no_connotation_intermediate != feature_count_no_connotation:
-            verb_count_no_connotation += 1
-
-    mean_ratings = []
-
-    for r1, r2 in zip(connotation_ratings_r1, connotation_ratings_r2):
-        mean = (r1 + r2) / 2
-        mean_ratings.append(mean)
-
-    gold = 0
-    no_context = 1
-    sent1 = 2
-    sent2 = 3
-
-    feature_iterator = 0
-
-    while feature_iterator < 130:
-        gold_standard = mean_ratings[gold]
-        rating_no_context = mean_ratings[no_context]
-        rating_sent1 = mean_ratings[sent1]
-        rating_sent2 = mean_ratings[sent2]
-
-        mean_no_gold = (rating_no_context + rating_sent1 + rating_sent2) / 3
-        fitted_mean = mean_no_gold / 2
-
-        if gold_standard - 0.2 <= fitted_mean <= gold_standard + 0.2:
-            equal_connotations += 1
-        else:
-            unequal_connotations += 1
-
-        feature_iterator += 1
-        gold += 4
-        no_context += 4
-        sent1 += 4
-        sent2 += 4
+    ratings = cf_ratings.load_ratings([eval_r1, eval_r2])
+    agreement = cf_ratings.agreement_with_original(ratings)
+    missing = cf_ratings.missing_connotations(ratings)
 
-    verb_count_no_connotation = verb_count_no_connotation / 2
-    feature_count_no_connotation = feature_count_no_connotation / 2
-    feature_count = feature_count / 2 - 130
-
-    cf_eval.append('Equal Connotations: ' + str(equal_connotations))
-    cf_eval.append('Unequal Connotations: ' + str(unequal_connotations))
-    cf_eval.append('Verbs where at least one feature has no Connotation: ' + str(verb_count_no_connotation))
-    cf_eval.append('Feature count with no Connotation: ' + str(feature_count_no_connotation))
-    cf_eval.append('Feature count total: ' + str(feature_count))
+    cf_eval = []
+    cf_eval.append('Equal Connotations: ' + str(agreement['equal']))
+    cf_eval.append('Unequal Connotations: ' + str(agreement['unequal']))
+    cf_eval.append('Verbs where at least one feature has no Connotation: ' + str(missing['verbs']))
+    cf_eval.append('Feature count with no Connotation: ' + str(missing['features']))
+    cf_eval.append('Feature count total: ' + str(missing['total']))
 
     return cf_eval
 
 
-def cf_kappa(eval_r1: dict, eval_r2: dict) -> int:
+def cf_kappa(eval_r1: dict, eval_r2: dict, corrected: bool = False) -> int:
     """ Calculates the Cohens Kappa for the CF evaluation.
 
+    All ratings (without context and in each sentence) are compared; '?' is a category of its own.
+
     :param eval_r2: Dictionary. Evaluation of the Connotation Frames of annotator 2.
     :param eval_r1: Dictionary. Evaluation of the Connotation Frames of annotator 1.
-    :return: Integer. Cohens Kappa value.
+    :param corrected: Boolean. Whether the chance agreement is computed from the marginals instead of the constant
+    used in the thesis (see cf_ratings.LEGACY_CHANCE_DENOMINATORS). Default: False.
+    :return: Float. Cohens Kappa value.
     """
-    eval_dict_r1 = eval_r1[1]
-    eval_dict_r2 = eval_r2[1]
-
-    connotation_ratings_r1 = []
-    connotation_ratings_r2 = []
-
-    for key, value in eval_dict_r1.items():
-        for rating in value[3][0:5]:
-            for e in rating[2:]:
-                connotation_ratings_r1.append(e)
-
-    for key, value in eval_dict_r2.items():
-        for rating in value[3][0:5]:
-            for e in rating[2:]:
-                connotation_ratings_r2.append(e)
-
-    result_dict = {'-2-2': 0, '-2-1': 0, '-20': 0, '-21': 0, '-22': 0, '-2?': 0,
-                   '-1-2': 0, '-1-1': 0, '-10': 0, '-11': 0, '-12': 0, '-1?': 0,
-                   '0-2': 0, '0-1': 0, '00': 0, '01': 0, '02': 0, '0?': 0,
-                   '1-2': 0, '1-1': 0, '10': 0, '11': 0, '12': 0, '1?': 0,
-                   '2-2': 0, '2-1': 0, '20': 0, '21': 0, '22': 0, '2?': 0,
-                   '?-2': 0, '?-1': 0, '?0': 0, '?1': 0, '?2': 0, '??': 0,
-                   }
-
-    total_amount_ratings = len(connotation_ratings_r1)
+    kappa, total_amount_ratings, total_agreements = cf_ratings.annotator_kappa(
+        cf_ratings.load_ratings([eval_r1, eval_r2]), corrected=corrected)
     print('Anzahl der Ratings: ' + str(total_amount_ratings))
-
-    for r1, r2 in zip(connotation_ratings_r1, connotation_ratings_r2):
-        result_dict['{}{}'.format(r1, r2)] += 1
-
-    # row totals:
-    r1_minus_2 = result_dict['-2-2'] + result_dict['-2-1'] + result_dict['-20'] + result_dict['-21'] + result_dict['-22'] + result_dict['-2?']
-    r1_minus_1 = result_dict['-1-2'] + result_dict['-1-1'] + result_dict['-10'] + result_dict['-11'] + result_dict['-12'] + result_dict['-1?']
-    r1_0 = result_dict['0-2'] + result_dict['0-1'] + result_dict['00'] + result_dict['01'] + result_dict['02'] + result_dict['0?']
-    r1_1 = result_dict['1-2'] + result_dict['1-1'] + result_dict['10'] + result_dict['11'] + result_dict['12'] + result_dict['1?']
-    r1_2 = result_dict['2-2'] + result_dict['2-1'] + result_dict['20'] + result_dict['21'] + result_dict['22'] + result_dict['2?']
-    r1_question = result_dict['?-2'] + result_dict['?-1'] + result_dict['?0'] + result_dict['?1'] + result_dict['?2'] + result_dict['??']
-
-    # column totals:
-    r2_minus_2 = result_dict['-2-2'] + result_dict['-1-2'] + result_dict['0-2'] + result_dict['1-2'] + result_dict['2-2'] + result_dict['?-2']
-    r2_minus_1 = result_dict['-2-1'] + result_dict['-1-1'] + result_dict['0-1'] + result_dict['1-1'] + result_dict['2-1'] + result_dict['?-1']
-    r2_0 = result_dict['-20'] + result_dict['-10'] + result_dict['00'] + result_dict['10'] + result_dict['20'] + result_dict['?0']
-    r2_1 = result_dict['-21'] + result_dict['-11'] + result_dict['01'] + result_dict['11'] + result_dict['21'] + result_dict['?1']
-    r2_2 = result_dict['-22'] + result_dict['-12'] + result_dict['02'] + result_dict['12'] + result_dict['22'] + result_dict['?2']
-    r2_question = result_dict['-2?'] + result_dict['-1?'] + result_dict['0?'] + result_dict['1?'] + result_dict['2?'] + result_dict['??']
-
-    total_agreements = result_dict['-2-2'] + result_dict['-1-1'] + result_dict['00'] + result_dict['11'] + result_dict['22'] + result_dict['??']
-
     print('TOTAL AGREEMENTS: ' + str(total_agreements))
 
-    minus2_product = (r1_minus_2 * r2_minus_2)
-    minus1_product = (r1_minus_1 * r2_minus_1)
-    zero_product = (r1_0 * r2_0)
-    one_product = (r1_1 * r2_1)
-    two_product = (r1_2 * r2_2)
-    question_product =(r1_question * r2_question)
-
-    sum_of_products = minus1_product + minus2_product + zero_product + one_product + two_product + question_product
-
-    real_expt_by_chance = sum_of_products * (1 / (78 * 78 * 78 * 78 * 78 * 78))
-
-    kappa = ((total_agreements / total_amount_ratings) - real_expt_by_chance) / (1 - real_expt_by_chance)
-
     return kappa
 
 
-def cf_kappa_with_original(eval_r1: dict, eval_r2: dict, type: str) -> int:
+def cf_kappa_with_original(eval_r1: dict, eval_r2: dict, type: str, corrected: bool = False) -> int:
     """Calculates the Cohens Kappa between the original CF values and the evaluated CF values of this work.
 
     All CF values (integer of each CF feature) of this work are calculated as one value (mean) which is being computed
@@ -409,118 +302,24 @@ def cf_kappa_with_original(eval_r1: dict, eval_r2: dict, type: str) -> int:
     values. As the Connotation Frames for each LU were evaluated without context and in two different sentences (-> two
     different contexts), different values were retrieved and safed and should be compared to the original values.
 
-    :param type: String. The type of CF values that shall be compared to original values. E.G. 'context_free'.
+    :param type: String. The type of CF values that shall be compared to original values: 'context_free', 'context'
+    or 'all'.
     :param eval_r2: Dictionary. Evaluation of the Connotation Frames of annotator 2.
     :param eval_r1: Dictionary. Evaluation of the Connotation Frames of annotator 1.
-    :return:
+    :param corrected: Boolean. Whether the chance agreement is computed from the marginals instead of the constant
+    used in the thesis (see cf_ratings.LEGACY_CHANCE_DENOMINATORS). Default: False.
+    :return: Float. Cohens Kappa value.
     """
-
-    if type == 'context_free':
-        start = 2
-        end = 3
-        amount = 1
-
-    elif type == 'context':
-        start = 3
-        end = 5
-        amount = 2
-
-    elif type == 'all':
-        start = 2
-        end = 5
-        amount = 3
-
-    eval_dict_r1 = eval_r1[1]
-    eval_dict_r2 = eval_r2[1]
-
-    connotation_ratings_r1 = []
-    connotation_ratings_r2 = []
-
-    connotation_ratings_r1_mean = []
-    connotation_ratings_r2_mean = []
-
-    for key, value in eval_dict_r1.items():
-        for rating in value[3][0:5]:
-            sum = 0
-            for e in rating[start:end]:
-                connotation_ratings_r1.append(e)
-                sum += float(e) if e != '?' else 0
-            mean = sum/amount
-            connotation_ratings_r1_mean.append(mean)
-
-    for key, value in eval_dict_r2.items():
-        for rating in value[3][0:5]:
-            sum = 0
-            for e in rating[start:end]:
-                connotation_ratings_r2.append(e)
-                sum += float(e) if e != '?' else 0
-            mean = sum/amount
-            connotation_ratings_r2_mean.append(mean)
-
-    connotation_ratings_original = []
-
-    # To get also the original values:
-    for key, value in eval_dict_r1.items():
-        for rating in value[3][0:5]:
-            original_rating = float(rating[1])
-            if -1 <= original_rating <= -0.35:
-                modified_rating = -1
-            elif -0.35 < original_rating <= 0.35:
-                modified_rating = 0
-            elif 0.35 < original_rating <= 1:
-                modified_rating = 1
-
-            connotation_ratings_original.append(modified_rating)
-
-    connotation_ratings_thesis_mean = []
-
-    for value1, value2 in zip(connotation_ratings_r1_mean, connotation_ratings_r2_mean):
-        mean_value = (float(value1) + float(value2)) / 2
-        if -2 <= mean_value <= -0.65:
-            modified_rating = -1
-        elif -0.65 < mean_value <= 0.65:
-            modified_rating = 0
-        elif 0.65 < mean_value <= 2:
-            modified_rating = 1
-        connotation_ratings_thesis_mean.append(modified_rating)
-
-    result_dict = {'-1-1': 0, '-10': 0, '-11': 0, '0-1': 0, '00': 0, '01': 0, '1-1': 0, '10': 0, '11': 0}
-
-    total_amount_ratings = len(connotation_ratings_thesis_mean)
+    kappa, total_amount_ratings, total_agreements = cf_ratings.kappa_with_original(
+        cf_ratings.load_ratings([eval_r1, eval_r2]), type, corrected)
     print('Anzahl der Ratings: ' + str(total_amount_ratings))
-
-    for r1, r2 in zip(connotation_ratings_thesis_mean, connotation_ratings_original):
-        result_dict['{}{}'.format(r1, r2)] += 1
-
-    # row totals:
-    r1_negative = result_dict['-1-1'] + result_dict['-10'] + result_dict['-11']
-    r1_neutral = result_dict['0-1'] + result_dict['00'] + result_dict['01']
-    r1_positive = result_dict['1-1'] + result_dict['10'] + result_dict['11']
-
-    # column totals:
-    r2_negative = result_dict['-1-1'] + result_dict['0-1'] + result_dict['1-1']
-    r2_neutral = result_dict['-10'] + result_dict['00'] + result_dict['10']
-    r2_positive = result_dict['-11'] + result_dict['01'] + result_dict['11']
-
-    total_agreements = result_dict['-1-1'] + result_dict['00'] + result_dict['11']
-
     print('TOTAL AGREEMENTS: ' + str(total_agreements))
 
-    negative_product = (r1_negative * r2_negative)
-    neutral_product = (r1_neutral * r2_neutral)
-    positive_product = (r1_positive * r2_positive)
-
-    sum_of_products = negative_product + neutral_product + positive_product
-
-    real_expt_by_chance = sum_of_products * (1 / (26*26*26))  # 26 is the amount of annotations. It is 26^3 because
-    # there were 3 possible answers (modified: -1, 0, 1)
-
-    kappa = ((total_agreements / total_amount_ratings) - real_expt_by_chance) / (1 - real_expt_by_chance)
-
     return kappa
 
 
 if __name__ == '__main__':
+    profiling.start('statistics')
     cf_verb_frame_count_dict = load_obj('cf_verb_frame_count_dict')
     frame_amount_per_lexical_unit = frames_per_verb(cf_verb_frame_count_dict)
     plot_verb_frame_amount(frame_amount_per_lexical_unit)